@@ -2,6 +2,7 @@ import numpy as np
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import pandas as pd
+from X_dataset_catalog import load_dataset
 import seaborn as sns
 from X_my_functions import fm_to_d14c, two_tail_paired_t_test
 from scipy import stats
@@ -13,7 +14,8 @@ mpl.rcParams['pdf.fonttype'] = 42
 mpl.rcParams['font.size'] = 10
 size1 = 5
 
-df = pd.read_excel(r'H:\The Science\Datasets\Ansto_intercomparison.xlsx', skiprows=28)
+df = load_dataset('ansto_intercomparison', columns=['Site', 'Year of Growth', 'FM', 'error', 'D14C', 'D14C_err'],
+                  canonical=False)
 ansto = df.loc[(df['Site'] == 'ANSTO')]
 ansto_x = ansto['Year of Growth']
 rrl = df.loc[(df['Site'] == 'RRL')]
@@ -1,10 +1,9 @@
 import matplotlib as mpl
 import numpy as np
 import pandas as pd
+from X_dataset_catalog import load_dataset
 import datetime
 import seaborn as sns
-from B_CGO_BHD_harmonization import harmonized
-from B_CGO_BHD_harmonization import harmonized_summer
 import matplotlib.pyplot as plt
 from scipy import stats
 
@@ -17,7 +16,8 @@ size1 = 5
 
 
 # read in our data for the SOAR Tree Rings
-df = pd.read_excel(r'C:\Users\clewis\IdeaProjects\GNS\radiocarbon_intercomparison\Interlab_comparison\SOARTreeRingData_CBL_cleaned.xlsx')  # read in the Tree Ring data that already has flagged data removed
+df = load_dataset('soar_tree_rings_cleaned', columns=['Site', 'DecimalDate', 'F14C', 'F14Cerr', '∆14C', '∆14Cerr'],
+                  canonical=False)  # read in the Tree Ring data that already has flagged data removed
 
 df = df.dropna(subset='∆14C').reset_index(drop=True)  # drop any data rows that doesn't have 14C data.
 df = df.loc[(df['Site'] == 'Monte Tarn, Punta Arenas')]
@@ -35,11 +35,12 @@ for i in range(0, len(df)):
 df['MergeDate'] = array
 
 # Read in de Pol Holz data
-df2 = pd.read_excel(r'H:\The Science\Datasets\Jocelyn Chile tree data 1980-2016.xlsx')
+df2 = load_dataset('chile_tree_rings', columns=['Sheet', 'Year of Growth', 'FM', 'Fmerr', 'D14C', 'D14Cerr'],
+                   canonical=False)
 df2 = df2.loc[(df2['Sheet']) == 4]  # grab the data from Monte Tarn ONLY
 df2['MergeDate'] = np.float64(df2['Year of Growth'])  # add a new date column in the form of float.
 
-combine = df.merge(df2)
+combine = df.merge(df2, on='MergeDate')
 # combine.to_excel('testing.xlsx')
 
 # Rename columns to avoid confusion
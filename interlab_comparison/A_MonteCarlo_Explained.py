@@ -2,13 +2,13 @@ import numpy as np
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import pandas as pd
+from X_dataset_catalog import load_dataset
 from X_my_functions import monte_carlo_randomization_smooth
 from X_my_functions import monte_carlo_randomization_trend
 import seaborn as sns
 
 # Baring Head data excel file
-baringhead = pd.read_excel(r'H:\The Science\Datasets'
-                           r'\BHD_14CO2_datasets_20211013.xlsx')
+baringhead = load_dataset('bhd_14co2', columns=['DEC_DECAY_CORR', 'DELTA14C', 'DELTA14C_ERR'], canonical=False)
 baringhead = baringhead.dropna(subset=['DELTA14C'])            # drop bad 14C values
 baringhead = baringhead.loc[(baringhead['DELTA14C_ERR'] > 0)]  # get rid of data where the error flag is -1000
 xtot_bhd = baringhead['DEC_DECAY_CORR']                        # extract entire dataset x-values
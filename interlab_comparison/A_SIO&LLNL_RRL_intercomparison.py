@@ -22,6 +22,7 @@ In the end, we are going to leave this data out anyway beacuse it is too funny,
 using the Heidelberg and RRL data anyway
 """
 import pandas as pd
+from X_dataset_catalog import load_dataset
 import matplotlib.pyplot as plt
 import matplotlib as mpl
 import numpy as np
@@ -36,9 +37,10 @@ from scipy import stats
 # read in the data from the spreadsheets
 # llnl = pd.read_excel(r'H:\The Science\Datasets\LLNL_NWT3and4.xlsx',
 #                      sheet_name='NWT3.tab_clean')
-llnl = pd.read_excel(r'H:\The Science\Datasets\LLNLwheelcomparisons.xlsx',
-                     sheet_name='Data', skiprows=24)
-rrl = pd.read_excel(r'H:\The Science\Datasets\NWT_FARI_RRL_2022-02-15.xlsx')
+llnl = load_dataset('llnl_wheel_comparisons', columns=['Wheel', 'Comment', 'D14C', 'D14C_Err'], canonical=False)
+rrl = load_dataset('rrl_nwt_fari', columns=['Samples::Sample ID', 'AMS Submission Results Complete::Date Run',
+                                            'AMS Submission Results Complete::DELTA14C',
+                                            'AMS Submission Results Complete::DELTA14C_Error'], canonical=False)
 rrl = rrl.dropna(subset=['AMS Submission Results Complete::DELTA14C'])
 
 # immediately slice off the following values from RRL data, Jocelyn deemed them not good, see excel sheet
@@ -17,21 +17,43 @@ https://gml.noaa.gov/ccgg/mbl/crvfit/crvfit.html: NOAA details about the CCGCRV
 A Monte Carlo simulation is used to determine errors on the CCGCRV smoothing data. These errors are important because
 we will need them for comparison with other carbon cycle datasets, of course.
 
-The file outputs a text file with the t-test results. However, it will keep adding to the file, so if you want a fresh
-one, delete the remaining text file from the directory.
+The t-test results are printed, and saved with the run's settings and timings in results.sqlite (see
+X_results_store.py), so runs can be compared with "python X_results_store.py diff <run> <run>" instead of searching
+old output.txt files. Set RADIOCARBON_SEED to make the Monte Carlo runs repeatable.
 """
 
+import os
+import time
 import numpy as np
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
 import pandas as pd
+from X_dataset_catalog import load_datasets
 import seaborn as sns
 from X_my_functions import long_date_to_decimal_date
 from X_my_functions import monte_carlo_randomization_smooth
 from X_my_functions import monte_carlo_randomization_trend
+from X_smoothed_offset import smoothed_offset
+from X_heidelberg_offsets import n, cutoff, offset_points
+from X_heidelberg_offsets import offset1, offset2, offset3, offset4, offset5, offset6
+from X_heidelberg_offsets import error1, error2, error3, error4, error5, error6
+from X_miller_curve_algorithm import TimingCollector, addTimingHook
+from X_results_store import ResultsStore
+from X_rolling_offsets import rolling_offsets
+from X_change_points import SegmentCost, change_points, penalty_sweep
+from X_outputs import save_output
+from X_exclusions import BHD_AMS_ANOMALY
 from scipy import stats
 
+script_start = time.perf_counter()
+filter_timings = TimingCollector()  # sums the ccgFilter stage timings of all the Monte Carlo fits below
+addTimingHook(filter_timings)
+seed = os.environ.get('RADIOCARBON_SEED')
+seed = None if seed is None else int(seed)
+if seed is not None:
+    np.random.seed(seed)
+
 # general plot parameters
 colors = sns.color_palette("rocket", 6)
 colors2 = sns.color_palette("mako", 6)
@@ -39,10 +61,17 @@ mpl.rcParams['pdf.fonttype'] = 42
 mpl.rcParams['font.size'] = 10
 size1 = 5
 
-heidelberg = pd.read_excel(r'H:\The Science\Datasets\heidelberg_cape_grim.xlsx', skiprows=40)  # import heidelberg data
-baringhead = pd.read_excel(r'H:\The Science\Datasets\BHD_14CO2_datasets_20211013.xlsx')  # import Baring Head data
-df2_dates = pd.read_excel(r'H:\The Science\Datasets\BHD_MeasurementDates.xlsx')  # CO2 measure date
-extraction_dates = pd.read_excel(r'H:\The Science\Datasets\BHDFlasks_WithExtractionDates.xlsx')  # CO2 extract date
+# the workbooks are independent, so they are read at the same time, and only the columns used below.
+# The measurement and extraction date workbooks (bhd_measurement_dates, bhd_extraction_dates) are only needed by the
+# commented-out flask storage time analysis at the end of this file; add them here again to run it.
+data = load_datasets({'heidelberg': 'heidelberg_cape_grim',  # import heidelberg data
+                      'baringhead': 'bhd_14co2'},  # import Baring Head data
+                     columns={'heidelberg_cape_grim': ['Average pf Start-date and enddate', 'D14C',
+                                                       'weightedstderr_D14C'],
+                              'bhd_14co2': ['DEC_DECAY_CORR', 'DELTA14C', 'DELTA14C_ERR']},
+                     canonical=False)
+heidelberg = data['heidelberg']
+baringhead = data['baringhead']
 
 """ TIDY UP THE DATA FILES"""
 """ 
@@ -76,14 +105,9 @@ Entire Baring Head File > 1980, without 1995 - 2005.
 There is precedent for this indexing as well. In this period of time, GNS RRL switched to AMS measurements, and there 
 was a significant period of anomalously high values. 
 This was also highlighted in Section 3.3 of (Turnbull et al., 2017)
-To accomplish this, I have to split the data into two, before 1994, and after 2006, and re-merge them. 
+The window (1994 - 2006) is BHD_AMS_ANOMALY in X_exclusions.py, the same one the harmonization cuts out.
  """
-snipmin = 1994  # was previously 1994
-snipmax = 2006  # was previously 2006
-snip = baringhead.loc[(baringhead['DEC_DECAY_CORR'] < snipmin)]  # index 1980 - 1994
-snip2 = baringhead.loc[(baringhead['DEC_DECAY_CORR'] > snipmax)]  # index 2006 - end
-snip = pd.merge(snip, snip2, how='outer')  # merge the files back together
-snip = snip.reset_index(drop=True)  # reset the index to avoid gnarly errors
+snip = BHD_AMS_ANOMALY.drop(baringhead, 'DEC_DECAY_CORR')  # 1980 - 1994 and 2006 - end, see X_exclusions.py
 
 """
 RECORDS SPLIT UP INTO 5 PARTS (1987 - 1991, 1991 - 1994, 2006 - 2016, 2006 - 2009, 2012 - 2016)
@@ -252,8 +276,7 @@ ESSENTIALLY WHAT WE ARE DOING:
 
 I'm going to run it once below as a proof of concept with this dataset, and run a plot to show its working. 
 """
-n = 1000  # set the amount of times the code will iterate (set to 10,000 once everything is final)
-cutoff = 667  # FFT filter cutoff
+# n (how many Monte Carlo iterations) and cutoff (FFT filter cutoff) are set in X_heidelberg_offsets.py
 
 bhd_1986_1991_results_smooth = monte_carlo_randomization_smooth(x1_bhd, my_x_1986_1991, y1_bhd, z1_bhd, cutoff, n)
 
@@ -555,6 +578,61 @@ print('Paired t-test result and difference in means for 2012 - 2016')
 print(period10)
 print(period10_d_means)
 
+# save the same results, so that runs can be compared later (python X_results_store.py runs / diff / period)
+tests = [('1986 - 1991', 'smooth', period1, period1_d_means, bhd_1986_1991_mean_smooth),
+         ('1991 - 1994', 'smooth', period2, period2_d_means, bhd_1991_1994_mean_smooth),
+         ('2006 - 2016', 'smooth', period3, period3_d_means, bhd_2006_2016_mean_smooth),
+         ('2006 - 2009', 'smooth', period4, period4_d_means, bhd_2006_2009_mean_smooth),
+         ('2012 - 2016', 'smooth', period5, period5_d_means, bhd_2012_2016_mean_smooth),
+         ('1986 - 1991', 'trend', period6, period6_d_means, bhd_1986_1991_mean_trend),
+         ('1991 - 1994', 'trend', period7, period7_d_means, bhd_1991_1994_mean_trend),
+         ('2006 - 2016', 'trend', period8, period8_d_means, bhd_2006_2016_mean_trend),
+         ('2006 - 2009', 'trend', period9, period9_d_means, bhd_2006_2009_mean_trend),
+         ('2012 - 2016', 'trend', period10, period10_d_means, bhd_2012_2016_mean_trend)]
+with ResultsStore() as store:
+    with store.run('A_heidelberg_intercomparison.py', n=n, cutoff=cutoff, seed=seed,
+                   periods=sorted(set(t[0] for t in tests))) as run:
+        for period, fit, ttest, d_means, values in tests:
+            run.add_ttest(period, fit, ttest, d_means, len(values))
+        run.add_filter_timings(filter_timings)
+        run.add_timing('until t-tests', time.perf_counter() - script_start)
+    print('Results saved as run {} in {}'.format(run.run_id, store.path))
+
+"""
+ROLLING-WINDOW OFFSETS
+The five periods above were picked by hand. To see what any other period would give, both whole records are smoothed
+once on the common grid (Baring Head without 1994 - 2006, as above), and the offset, its errors and the paired t-test
+are worked out for every window of 1 - 15 years at every start on the grid in one go (see X_rolling_offsets.py).
+The whole surface is saved as rolling_offsets.parquet, one row per window.
+"""
+overlap = (fake_x_temp >= max(min(xtot_heid), min(x_combined))) & (fake_x_temp <= min(max(xtot_heid), max(x_combined)))
+rolling_x = pd.Series(fake_x_temp[overlap])
+heidelberg_all_trend = monte_carlo_randomization_trend(xtot_heid, rolling_x, ytot_heid, ztot_heid, cutoff, n)[2]
+bhd_all_trend = monte_carlo_randomization_trend(x_combined, rolling_x, y_combined, z_combined, cutoff, n)[2]
+bhd_all_trend.loc[BHD_AMS_ANOMALY.contains(rolling_x)] = np.nan  # no BHD data to compare there
+rolling = rolling_offsets(rolling_x, bhd_all_trend['Means'], bhd_all_trend['stdevs'], heidelberg_all_trend['Means'],
+                          heidelberg_all_trend['stdevs'], windows=np.arange(1, 15.5, 0.5))
+print('The hand-picked periods, read off the rolling-window offsets (CCGCRV Trend of the whole records):')
+print(pd.DataFrame({name: rolling.period(start, end) for name, start, end in
+                    [('1987 - 1991', 1987, 1991), ('1991 - 1994', 1991, 1994), ('2006 - 2016', 2006, 2016),
+                     ('2006 - 2009', 2006, 2009), ('2012 - 2016', 2012, 2016)]}).T)
+save_output(rolling.frame(), 'rolling_offsets.xlsx')  # rolling_offsets.parquet, plus Excel if RADIOCARBON_EXCEL_EXPORT=1
+
+"""
+CHANGE POINTS
+Where does the offset change, according to the data rather than our choice of periods? The difference of the two
+smoothed records is split into segments of constant mean offset, weighted by the Monte Carlo stdevs (see
+X_change_points.py). Compare the dates below with the windows in X_exclusions.py, 2009 - 2012 and the periods in
+X_heidelberg_offsets.py. The penalty sweep shows which breaks stay when splitting is made more expensive.
+"""
+offset_difference = bhd_all_trend['Means'] - heidelberg_all_trend['Means']
+offset_difference_err = np.sqrt(bhd_all_trend['stdevs']**2 + heidelberg_all_trend['stdevs']**2)
+offset_breaks = change_points(rolling_x, offset_difference, offset_difference_err, min_years=1)
+print('Change points in the BHD - CGO offset:')
+print(offset_breaks)
+offset_cost = SegmentCost(rolling_x, offset_difference, offset_difference_err)
+print(penalty_sweep(offset_cost, np.logspace(0, 4, 9), min_size=12)[['penalty', 'n_breaks', 'breaks']])
+
 """
 The following block of code is VERY Important (aren't they all???)...
 I've listed below a series of offsets. There are the offsets that are found for Heidelberg data during different time intervals. 
@@ -569,39 +647,21 @@ you'll also need to create a desired group of x-values to output
 """
 PRE v POST AMS OFFSET SETTINGS
 """
-# PRE-AMS AT RRL
-offset1 = 1.80  # 1986 - 1991
-offset2 = 1.88  # 1991 - 1994
-offset3 = (offset2 + offset1) / 2  # 1994-2006. In this time period, we have removed data where RRL AMS
-# measurements were high. But, it's likely reasonable to say that we can prescribe the PRE-AMS offset to this data,
-# otherwise if we do not apply anything, there will be a "step" in the harmonized dataset.
-offset4 = 0.49  # 2006 - 2016
-offset5 = 0   # 2006 - 2009
-offset6 = -.52  # 2012 - 2016.
-# One can see that if we seperate the data in from 06 - 09 and 12 - 16, the sign in the difference changes.
-# Initially, I would think to apply a broad "post-AMS" offset to both two time periods (06-09, 12-16); however,
-# since we know there is a sign change, it may be better to leave the intermedite time period at 0.
-error1 = .18
-error2 = .16
-error3 = np.sqrt(error2**2 + error1) / 2  # propagating the error from the average of offset1 and offset2 above.
-error4 = 0.07
-error5 = 0
-error6 = 0.06
+# The offsets for each period, and their errors, are kept in X_heidelberg_offsets.py (imported at the top of this
+# file) so that the cleanup scripts can use them without re-running this whole script:
+# PRE-AMS AT RRL: offset1 (1986 - 1991), offset2 (1991 - 1994), offset3 (1994 - 2006, mean of offset1 and offset2)
+# POST-AMS: offset4 (2006 - 2016), offset5 (2006 - 2009, left at 0), offset6 (2012 - 2016)
 
 """
 SMOOTHED OFFSET SETTINGS
 """
-y = [offset1, offset1, offset1, offset3, offset3, offset3, offset4, offset4, offset4, offset6, offset6, offset6]  # I'm leaving out 3 beacuse it only comes from offsets 1 and 2.
-y_err = [error1, error1, error1, error3, error3, error3, error4, error4, error4, error6, error6, error6]
-x =[1986, (1986 + 1991)/2, 1992, 1994, (1994 + 2005)/2, 2005, 2006, (2006 + 2009)/2, 2009, 2012, (2012 + 2016)/2, 2016]  # find the middle of each time- chunk.
 # create arbitrary set of x-values to control output
 # WHEN APPLYING THIS OFFSET TO A NEW DATASET, REPLACE "desired_output" WITH THAT DATASET'S X values!
 desired_output = np.linspace(min(x_init_heid), max(x_init_heid), 480)
 
 
-dff = pd.DataFrame({"offset_xs": x, "offset_ys": y, "offset_errs": y_err})
-offset_trend = monte_carlo_randomization_trend(dff['offset_xs'], desired_output, dff['offset_ys'], dff['offset_errs'], cutoff, n)
-offset_trend_summary = offset_trend[2]
+dff = offset_points()  # the offsets at the start, middle and end of each time-chunk, see X_heidelberg_offsets.py
+offset_trend_summary = smoothed_offset(dff, cutoff, n).summary(desired_output)  # saved curve, shared with C_CapeGrim_cleanup.py
 offset_trend_mean = offset_trend_summary['Means']
 plt.scatter(fake_x_temp, offset_trend_mean)
 # plt.show()
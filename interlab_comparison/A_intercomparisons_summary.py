@@ -37,6 +37,7 @@ import numpy as np
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import pandas as pd
+from X_dataset_catalog import load_dataset
 import seaborn as sns
 
 colors = sns.color_palette("rocket", 6)
@@ -50,7 +51,8 @@ To keep the speed high, I'm going to avoid pulling variables from previous codes
 monte carlo simulations.
 """
 
-cgo = pd.read_excel(r'C:\Users\clewis\IdeaProjects\GNS\radiocarbon_intercomparison\Interlab_comparison\CapeGrim_offset.xlsx')
+cgo = load_dataset('capegrim_offset', columns=['Decimal_date', 'offset1', 'offset1_err', 'offset2', 'offset2_err'],
+                   canonical=False)
 cgo = cgo.iloc[::5, :]
 cgo_x = cgo['Decimal_date']
 cgo_offset1 = cgo['offset1']           # Pre and post AMS offset ( Will be set to zero but still plotting as is for now)
@@ -9,6 +9,10 @@ import numpy as np
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import pandas as pd
+from X_dataset_catalog import dataset, load_dataset
+from X_outputs import save_output
+from X_harmonization import BHD_COLUMNS, CAPEGRIM_COLUMNS, build_harmonized
+from X_seasons import seasonal_stats
 import seaborn as sns
 
 
@@ -27,101 +31,26 @@ run it later and get the answer.
 
 """
 
-capegrim = pd.read_excel(r'C:\Users\clewis\IdeaProjects\GNS\radiocarbon_intercomparison\Interlab_comparison\CapeGrim_offset.xlsx')
-neumayer = pd.read_excel(r'C:\Users\clewis\IdeaProjects\GNS\radiocarbon_intercomparison\Interlab_comparison\Neumayer_offset.xlsx')
-mcq      = pd.read_excel(r'C:\Users\clewis\IdeaProjects\GNS\radiocarbon_intercomparison\Interlab_comparison\MCQ_offset.xlsx')
+# only the columns used below and by the harmonization; Neumayer and MCQ aren't part of it (yet), so they aren't read
+capegrim = load_dataset('capegrim_offset', columns=CAPEGRIM_COLUMNS + ['offset1', 'offset2'], canonical=False)
 
-baringhead = pd.read_excel(r'H:\The Science\Datasets'
-                           r'\BHD_14CO2_datasets_20211013.xlsx')
-baringhead = baringhead.dropna(subset=['DELTA14C'])
-# snip out 1995 - 2005, and 2009 - 2012 from Baring Head Record
-snip = baringhead.loc[(baringhead['DEC_DECAY_CORR'] < 1994)]
-snip2 = baringhead.loc[(baringhead['DEC_DECAY_CORR'] > 2006) & (baringhead['DEC_DECAY_CORR'] < 2009)]
-snip3 = baringhead.loc[(baringhead['DEC_DECAY_CORR'] > 2012)]
-snip = pd.merge(snip, snip2, how='outer')
-snip = pd.merge(snip, snip3, how='outer')
-baringhead = snip.reset_index(drop=True)
-baringhead = baringhead.drop(columns=['SITE', 'NZPREFIX', 'NZ', 'DATE_ST', 'DATE_END', 'DAYS_EXP',
-                                      'DATE_COLL', 'date_as_number', 'DELTA13C_IRMS',
-                                      'FLAG', 'METH_VESSEL',
-                                      'METH_COLL'])
-baringhead = baringhead.rename(columns={"DEC_DECAY_CORR": "Decimal_date"})
-baringhead = baringhead.rename(columns={"DELTA14C": "D14C"})
-baringhead = baringhead.rename(columns={"DELTA14C_ERR": "D14C_err"})
-baringhead = baringhead.rename(columns={"F14C_ERR": "F14C_err"})
-capegrim['key'] = np.ones(len(capegrim))
-baringhead['key'] = np.zeros(len(baringhead))
-
-"""Add FM values to Cape Grim by back-calculating"""
-# I realized that I was missing FM from the Heidelberg dataset, so I'm going to add that here...
-# age_corr = exp((1950 - sample year)/8267)
-# D14C = 1000*(FM-1)
-# Del14C = 1000*(FM*age_corr-1)
-capegrim['D14C_offsetcorrected'] = capegrim['D14C_1']
-capegrim['D14C_offsetcorrected_err'] = capegrim['D14C_1_err']
-baringhead['D14C_offsetcorrected'] = baringhead['D14C']
-baringhead['D14C_offsetcorrected_err'] = baringhead['D14C_err']
-
-x = capegrim['Decimal_date']
-y = capegrim['D14C_offsetcorrected_err']                  # make sure to use the correct / offset corrected data for this!
-age_corr = np.exp((1950 - x) / 8267)
-fm = ((y / 1000) + 1) / age_corr
-fm_err = capegrim['D14C_1_err'] / 1000
-x = np.float_(x)                                         # in order to create dictionary, first change briefly to array
-fm = np.float_(fm)
-new_frame = pd.DataFrame({"Decimal_date": x, "F14C": fm, "F14C_err": fm_err})  # create dictionary with common column to merge on.
-
-capegrim = pd.merge(capegrim, new_frame, how = 'outer')  # merge the dataframes.
-
-harmonized = pd.merge(baringhead, capegrim, how='outer')  # have to merge in stages but it's all good.
-harmonized.sort_values(by=['Decimal_date'], inplace=True)
-harmonized = harmonized[['key','Decimal_date', 'D14C_offsetcorrected', 'D14C_offsetcorrected_err', 'F14C','F14C_err']]
-harmonized = harmonized.reset_index(drop=True)
-harmonized.to_excel('harmonized_dataset.xlsx')
+baringhead = load_dataset('bhd_14co2', columns=BHD_COLUMNS, canonical=False)
 
 """
+The harmonization itself (snip the Baring Head record, back-calculate FM for Cape Grim, merge) and the
+growing-season slicing now live in X_harmonization.py, so that other scripts can load the saved result with
+load_harmonized() instead of importing (and re-running) this file.
+
 In Rachel's thesis, she talks about comparing the tree-ring values to the BHD data, but only using the data from the
-growing season, which is November to February. The following code slices the harmonized data to ONLY INCLUDE data from
-during the growing season. While this code took ~ 1 hour to write, I don't know how to get from here to a yearly
-average because the SH summer crosses the year-line (January). Can come back to this later.
-The following code retains only the summer months.
+growing season, which is November to February. harmonized_summer retains only the summer months.
 """
-
-L = np.linspace(0, 1, 365)
-# add the number that is 1/2 of the previous month plus the current month
-Jan = 31 / 365
-Feb = ((28 / 2) + 31) / 365
-Mar = ((31 / 2) + 31 + 28) / 365
-Apr = ((30 / 2) + 31 + 28 + 31)/ 365
-May = ((31 / 2) + 31 + 28 + 31 + 30)/ 365
-June = ((30 / 2) + 31 + 28 + 31 + 30 + 31)/ 365
-July = ((31 / 2) + 31 + 28 + 31 + 30 + 31 + 30)/ 365
-August = ((31 / 2) + 31 + 28 + 31 + 30 + 31 + 30 + 31)/ 365
-Sep = ((30 / 2) + 31 + 28 + 31 + 30 + 31 + 30 + 31 + 31)/ 365
-Oct = ((31 / 2) + 31 + 28 + 31 + 30 + 31 + 30 + 31 + 31 + 30)/ 365
-Nov = ((30 / 2) + 31 + 28 + 31 + 30 + 31 + 30 + 31 + 31 + 30 + 30)/ 365
-Dec = ((31 / 2) + 31 + 28 + 31 + 30 + 31 + 30 + 31 + 31 + 30 + 30 + 30)/ 365
-# print(Nov)
-# print(Dec)
-# print(Jan)
-# print(Feb)
-# harmonized['Summer_index'] = harmonized['Decimal_date']  # makes a copy of the DecimalDate column
-mt_array = []                                    # initialize an empty array to dump sliced date-data
-harmonized = harmonized.reset_index(drop=True)   # re-index the harmonized dataset to avoid confusion
-for i in range(0, len(harmonized)):
-    row = harmonized.iloc[i]                     # grab i'th row
-    element = row['Decimal_date']                # extract the date
-    element = str(element)                       # convert to a string so it is indexable
-    element = element[4:9:1]                     # index the decimal portion
-    element = np.float_(element)                 # convert back to float for indexing a few lines later
-    mt_array.append(element)                     # append to the new array
-indexed = pd.DataFrame({"decimals": mt_array, "Decimal_date": harmonized['Decimal_date']})                 # put the array into a DataFrame format
-
-harmonized_summer = pd.merge(harmonized, indexed)   # merge the datasets
-
-# print(harmonized_summer)
-harmonized_summer = harmonized_summer.loc[((harmonized_summer['decimals']) < .124) | ((harmonized_summer['decimals']) > .870)]   # grab data only in the months that I want
-harmonized_summer.to_excel('harmonized_summer.xlsx')
+# also saves harmonized_dataset.parquet and harmonized_summer.parquet (plus .xlsx copies if RADIOCARBON_EXCEL_EXPORT=1)
+harmonized, harmonized_summer = build_harmonized(capegrim, baringhead)
+# growing-season (Nov - Feb) mean, stdev and count for each season, named after the year it ends in, so the
+# averages no longer stop at the January year-line; see X_seasons.py. Saved for the comparison with the tree rings of
+# the same years (harmonized_season_means.parquet, indexed by season_year).
+harmonized_season_means = seasonal_stats(harmonized, ['D14C_offsetcorrected', 'F14C'])
+save_output(harmonized_season_means, dataset('harmonized_season_means').path)
 # print(harmonized.columns)
 # print(harmonized_summer.columns)
 # test the dates fall into the bounds that I want using a histogram
@@ -15,16 +15,18 @@ import numpy as np
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import pandas as pd
+from X_dataset_catalog import load_dataset
+from X_outputs import save_output
 import seaborn as sns
 from X_my_functions import long_date_to_decimal_date
-from A_heidelberg_intercomparison import offset1, offset2, offset3, offset4, offset5, offset6
-from A_heidelberg_intercomparison import error1, error2, error3, error4, error5, error6
-from A_heidelberg_intercomparison import dff  # import the dataframe to produce the smoothed offset calcs
-from A_heidelberg_intercomparison import cutoff
+from X_heidelberg_offsets import OFFSET_TABLE
+from X_heidelberg_offsets import offset_points  # the dataframe to produce the smoothed offset calcs
+from X_heidelberg_offsets import cutoff
 from X_miller_curve_algorithm import ccgFilter
-from X_my_functions import monte_carlo_randomization_trend
+from X_smoothed_offset import smoothed_offset
+from X_radiocarbon import add_offset
 from scipy import stats
-from A_heidelberg_intercomparison import n
+from X_heidelberg_offsets import n
 
 colors = sns.color_palette("rocket", 6)
 colors2 = sns.color_palette("mako", 6)
@@ -36,11 +38,9 @@ size1 = 5
 """
 
 """ STEP 1: LOAD UP AND TIDY THE DATA"""
-heidelberg = pd.read_excel(r'H:\The Science\Datasets'
-                           r'\heidelberg_cape_grim.xlsx', skiprows=40)
+heidelberg = load_dataset('heidelberg_cape_grim', columns=['#location', 'Average pf Start-date and enddate', 'D14C',
+                                                           'weightedstderr_D14C'], canonical=False)
 
-# remove some of the columns that I dont want/need, to simplify the later merge
-heidelberg['key'] = np.ones(len(heidelberg))
 # add decimal dates to DataFrame if not there already
 x_init_heid = heidelberg['Average pf Start-date and enddate']  # x-values from heidelberg dataset
 x_init_heid = long_date_to_decimal_date(x_init_heid)
@@ -49,76 +49,32 @@ heidelberg['Decimal_date'] = x_init_heid  # add these decimal dates onto the dat
 # drop NaN's in the column I'm most interested in
 heidelberg = heidelberg.dropna(subset=['D14C'])
 heidelberg = heidelberg.loc[(heidelberg['D14C'] > 10)]  # remove an outlier
-heidelberg = heidelberg.drop(columns=['sampler_id', 'samplingheight', 'startdate', 'enddate',
-                                      'Average pf Start-date and enddate', 'date_d_mm_yr', 'date_as_number',
-                                      'samplingpattern',
-                                      'wheightedanalyticalstdev_D14C', 'nbanalysis_D14C', 'd13C', 'flag_D14C',
-                                      ], axis=1)
-""" 
-STEP 2: INDEX THE DATA ACCORDING TO TIMES LISTED ABOVE
-index 1 = "h1" for heidelberg-1, and so on. 
-h1 = 1986 - 1991
+heidelberg = heidelberg.drop(columns=['Average pf Start-date and enddate'])  # the other unused columns aren't read
+"""
+STEP 2: APPLY THE PRE- AND POST-AMS OFFSETS OF THE TIME PERIODS IN X_heidelberg_offsets.py
+h1 = before 1991 (the record starts in 1986)
 h2 = 1991 - 1994
 h3 = 1994 - 2006
 h4 = 2006 - 2009
 h5 = 2009 - 2012
 h6 = 2012 - 2016
+Each period includes its start date and not its end date, so a point dated exactly 1991.0 is corrected with h2 (the
+old slices with strict inequalities dropped it). Data from 2016 on are in no period and are dropped, as before.
+The offset and its error are deposited in their own columns for future reference, and the corrected values are
+put in new columns rather than changing the original ones.
 """
-h1 = heidelberg.loc[(heidelberg['Decimal_date'] < 1991)].reset_index()
-h2 = heidelberg.loc[(heidelberg['Decimal_date'] > 1991) & (heidelberg['Decimal_date'] < 1994)].reset_index()
-h3 = heidelberg.loc[(heidelberg['Decimal_date'] > 1994) & (heidelberg['Decimal_date'] < 2006)].reset_index()
-h4 = heidelberg.loc[(heidelberg['Decimal_date'] > 2006) & (heidelberg['Decimal_date'] < 2009)].reset_index()
-h5 = heidelberg.loc[(heidelberg['Decimal_date'] > 2009) & (heidelberg['Decimal_date'] < 2012)].reset_index()
-h6 = heidelberg.loc[(heidelberg['Decimal_date'] > 2012) & (heidelberg['Decimal_date'] < 2016)].reset_index()
-
-"""
-In order to apply the offsets, I'm going to add a new column with the new value, rather than try
-to change to original value
-"""
-# apply offsets using Pre and POst AMS OFFset
-h1['pre-postAMS_offset'] = h1['key'] * offset1  # first, deposit the offset into the excel sheet for future reference.
-h2['pre-postAMS_offset'] = h2['key'] * offset2  # the way i'm doing this is a bit of a hack, by multiplying it by the "key"
-h3['pre-postAMS_offset'] = h3['key'] * offset3  # which is set to 1 for data from heidelberg (0's  are for baring head)
-h4['pre-postAMS_offset'] = h4['key'] * offset4
-h5['pre-postAMS_offset'] = h5['key'] * offset5
-h6['pre-postAMS_offset'] = h6['key'] * offset6
-h1['pre-postAMS_offset_err'] = h1['key'] * error1  # first, deposit the offset into the excel sheet for future reference.
-h2['pre-postAMS_offset_err'] = h2['key'] * error2  # the way i'm doing this is a bit of a hack, by multiplying it by the "key"
-h3['pre-postAMS_offset_err'] = h3['key'] * error3  # which is set to 1 for data from heidelberg (0's  are for baring head)
-h4['pre-postAMS_offset_err'] = h4['key'] * error4
-h5['pre-postAMS_offset_err'] = h5['key'] * error5
-h6['pre-postAMS_offset_err'] = h6['key'] * error6
-
-h1['D14C_1'] = h1['D14C'] + offset1  # store offset values in new column
-h2['D14C_1'] = h2['D14C'] + offset2
-h3['D14C_1'] = h3['D14C'] + offset3
-h4['D14C_1'] = h4['D14C'] + offset4
-h5['D14C_1'] = h5['D14C'] + offset5
-h6['D14C_1'] = h6['D14C'] + offset6
-
-h1['weightedstderr_D14C_1'] = np.sqrt(h1['weightedstderr_D14C']**2 + error1**2)  # propogate the error and REPLACE original
-h2['weightedstderr_D14C_1'] = np.sqrt(h2['weightedstderr_D14C']**2 + error2**2)
-h3['weightedstderr_D14C_1'] = np.sqrt(h3['weightedstderr_D14C']**2 + error3**2)
-h4['weightedstderr_D14C_1'] = np.sqrt(h4['weightedstderr_D14C']**2 + error4**2)
-h5['weightedstderr_D14C_1'] = np.sqrt(h5['weightedstderr_D14C']**2 + error5**2)
-h6['weightedstderr_D14C_1'] = np.sqrt(h6['weightedstderr_D14C']**2 + error6**2)
-
-# merge heidelberg file back onto itself, after adding the first TYPE of offset...
-heidelberg = pd.merge(h1, h2, how='outer')
-heidelberg = pd.merge(heidelberg, h3, how='outer')
-heidelberg = pd.merge(heidelberg, h4, how='outer')
-heidelberg = pd.merge(heidelberg, h5, how='outer')
-heidelberg = pd.merge(heidelberg, h6, how='outer')
+heidelberg = OFFSET_TABLE.open_ended(start=True).apply(heidelberg, 'D14C', 'weightedstderr_D14C', 'D14C_1',
+                                                       'weightedstderr_D14C_1', offset_column='pre-postAMS_offset',
+                                                       offset_error_column='pre-postAMS_offset_err')
 
 # APPLY OFFSET USING SMOOTHED OFFSET
-offset_smoothed = monte_carlo_randomization_trend(dff['offset_xs'], heidelberg['Decimal_date'], dff['offset_ys'], dff['offset_errs'], cutoff, n)  # use the offset values to create an offset smoothing curve
-offset_smoothed_summary = offset_smoothed[2]  # extract summary file
+dff = offset_points()
+offset_smoothed_summary = smoothed_offset(dff, cutoff, n).summary(heidelberg['Decimal_date'])  # the offset smoothing curve (Monte Carlo run once and saved, see X_smoothed_offset.py) at our dates
 offset_smoothed_mean = offset_smoothed_summary['Means']  # grab means
 offset_smoothed_stdevs = offset_smoothed_summary['stdevs']  # grab stdevs
 heidelberg['smoothed_offset'] = offset_smoothed_mean # deposit the number for the smoothed offset in the excel sheet
-heidelberg['D14C_2'] = heidelberg['D14C'] + heidelberg['smoothed_offset']  # add it to the original data (correct the offset)
 heidelberg['smoothed_offset_error'] = offset_smoothed_stdevs
-heidelberg['weightedstderr_D14C_2'] = np.sqrt(heidelberg['weightedstderr_D14C']**2 + offset_smoothed_stdevs**2)
+heidelberg['D14C_2'], heidelberg['weightedstderr_D14C_2'] = add_offset(heidelberg['D14C'], heidelberg['weightedstderr_D14C'], heidelberg['smoothed_offset'], heidelberg['smoothed_offset_error'])  # correct the offset, propagate the error
 # is there a meaningful difference between the smoothed offset and the Pre and Post offset?
 
 """
@@ -137,5 +93,5 @@ heidelberg = heidelberg.rename(columns={"weightedstderr_D14C_2": "D14C_2_err"})
 heidelberg = heidelberg.rename(columns={"weightedstderr_D14C_1": "D14C_1_err"})
 # Reorder the columns in an order that makes more sense
 heidelberg = heidelberg[['#location', 'Decimal_date', 'D14C', 'D14C_err', 'offset1', 'offset1_err', 'D14C_1', 'D14C_1_err', 'offset2', 'offset2_err', 'D14C_2', 'D14C_2_err']]
-heidelberg.to_excel('CapeGrim_offset.xlsx')
+save_output(heidelberg, 'CapeGrim_offset.xlsx')  # CapeGrim_offset.parquet, plus Excel if RADIOCARBON_EXCEL_EXPORT=1
 
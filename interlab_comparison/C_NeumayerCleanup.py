@@ -7,12 +7,17 @@ which is the Neumayer dataset.
 import matplotlib as mpl
 import numpy as np
 import pandas as pd
+from X_dataset_catalog import load_dataset
+from X_outputs import save_output
 import seaborn as sns
 from X_my_functions import long_date_to_decimal_date
-from A_heidelberg_intercomparison import offset1, offset2, offset3, offset4, offset5, offset6
-from A_heidelberg_intercomparison import error1, error2, error3, error4, error5, error6
-from X_my_functions import monte_carlo_randomization_trend
-from A_heidelberg_intercomparison import cutoff, n
+from X_heidelberg_offsets import offset1, offset3, offset4, offset6
+from X_heidelberg_offsets import error1, error3, error4, error6
+from X_heidelberg_offsets import PERIODS
+from X_offset_table import OffsetTable
+from X_smoothed_offset import smoothed_offset
+from X_radiocarbon import add_offset
+from X_heidelberg_offsets import cutoff, n
 
 # general plot parameters
 colors = sns.color_palette("rocket", 6)
@@ -21,7 +26,8 @@ mpl.rcParams['pdf.fonttype'] = 42
 mpl.rcParams['font.size'] = 10
 size1 = 5
 
-neumayer = pd.read_excel(r'H:\The Science\Datasets\heidelberg_neumayer.xlsx', skiprows=40)  # import heidelberg data
+neumayer = load_dataset('heidelberg_neumayer', columns=['#location', 'Average', 'D14C', 'weightedstderr_D14C'],
+                        canonical=False)  # import heidelberg data
 neumayer = neumayer.dropna(subset=['D14C']).reset_index(drop=True)
 
 # This file contains data from 1983 to 2021.
@@ -31,58 +37,28 @@ neumayer['Decimal_date'] = x_init  # add these decimal dates onto the dataframe
 # print(len(neumayer))
 
 """
-Break up the Neumayer dataset into the same time-periods that I used for the Heidelberg Intercomparison and offset
-calculation:
-Any data prior to 1986 (the minimum X value in the Heidelberg dataset) gets 0 offset correction.
-
+Apply the offsets of the same time-periods that I used for the Heidelberg Intercomparison and offset calculation.
+There is some data before the CGO dataset begins (1986, the first interval is 1986 - 1991). That is outside the bounds
+of my intercomparison, but it is in the PRE-AMS range, so it gets the 1986 - 1991 offset (h0).
+All data after 2012 are in h6 (POST-AMS range), if I chop off at 2016, there is some data removed.
 """
-
-h0 = neumayer.loc[(neumayer['Decimal_date'] < 1986)].reset_index() # there is some data before the CGO dataset begins, I cannot correct for these because it is outside the bounds of my intercomparison (1986 - 1991 is first interval)
-h1 = neumayer.loc[(neumayer['Decimal_date'] > 1986) & (neumayer['Decimal_date'] < 1991)].reset_index()
-h2 = neumayer.loc[(neumayer['Decimal_date'] > 1991) & (neumayer['Decimal_date'] < 1994)].reset_index()
-h3 = neumayer.loc[(neumayer['Decimal_date'] > 1994) & (neumayer['Decimal_date'] < 2006)].reset_index()
-h4 = neumayer.loc[(neumayer['Decimal_date'] > 2006) & (neumayer['Decimal_date'] < 2009)].reset_index()
-h5 = neumayer.loc[(neumayer['Decimal_date'] > 2009) & (neumayer['Decimal_date'] < 2012)].reset_index()
-h6 = neumayer.loc[(neumayer['Decimal_date'] > 2012)].reset_index()  # allow all data after 2012, if I chop off at 2016, and there is some data removed. Here it is in POST-AMS range.
-
-h0['D14C_1'] = h0['D14C'] + offset1  # apply the 1986 - 1991 offset to data before 1986, as this is the PRE-AMS range.
-h1['D14C_1'] = h1['D14C'] + offset1
-h2['D14C_1'] = h2['D14C'] + offset2
-h3['D14C_1'] = h3['D14C'] + offset3
-h4['D14C_1'] = h4['D14C'] + offset4
-h5['D14C_1'] = h5['D14C'] + offset5
-h6['D14C_1'] = h6['D14C'] + offset6
-h0['weightedstderr_D14C_1'] = np.sqrt(h0['weightedstderr_D14C']**2 + error1**2)
-h1['weightedstderr_D14C_1'] = np.sqrt(h1['weightedstderr_D14C']**2 + error1**2)  # propagate the error and REPLACE original
-h2['weightedstderr_D14C_1'] = np.sqrt(h2['weightedstderr_D14C']**2 + error2**2)
-h3['weightedstderr_D14C_1'] = np.sqrt(h3['weightedstderr_D14C']**2 + error3**2)
-h4['weightedstderr_D14C_1'] = np.sqrt(h4['weightedstderr_D14C']**2 + error4**2)
-h5['weightedstderr_D14C_1'] = np.sqrt(h5['weightedstderr_D14C']**2 + error5**2)
-h6['weightedstderr_D14C_1'] = np.sqrt(h6['weightedstderr_D14C']**2 + error6**2)
-
-neu = pd.merge(h0, h1, how='outer')
-neu = pd.merge(neu, h2, how='outer')
-neu = pd.merge(neu, h3, how='outer')
-neu = pd.merge(neu, h4, how='outer')
-neu = pd.merge(neu, h5, how='outer')
-neu = pd.merge(neu, h6, how='outer')
+neumayer_offsets = OffsetTable([('h0', -np.inf, 1986, offset1, error1)] + PERIODS).open_ended(end=True)
+neu = neumayer_offsets.apply(neumayer, 'D14C', 'weightedstderr_D14C', 'D14C_1', 'weightedstderr_D14C_1')
 
 print(len(neu))
 
-y = [offset1, offset1, offset1, offset3, offset3, offset3, offset4, offset4, offset4, offset6, offset6, offset6]  # pulled from A_heidelberg Intercomparison.
+y = [offset1, offset1, offset1, offset3, offset3, offset3, offset4, offset4, offset4, offset6, offset6, offset6]  # pulled from X_heidelberg_offsets.py
 y_err = [error1, error1, error1, error3, error3, error3, error4, error4, error4, error6, error6, error6]
 x =[min(neu['Decimal_date']), (1986 + 1991)/2, 1992, 1994, (1994 + 2005)/2, 2005, 2006, (2006 + 2009)/2, 2009, 2012, (2012 + 2016)/2, max(neu['Decimal_date'])]  # find the middle of each time- chunk.
 
 dff = pd.DataFrame({"offset_xs": x, "offset_ys": y, "offset_errs": y_err})  # my function works best when data are pulled from pandas DF
 
-offset_smoothed = monte_carlo_randomization_trend(dff['offset_xs'], neu['Decimal_date'], dff['offset_ys'], dff['offset_errs'], cutoff, n)  # use the offset values to create an offset smoothing curve
-offset_smoothed_summary = offset_smoothed[2]  # extract summary file
+offset_smoothed_summary = smoothed_offset(dff, cutoff, n).summary(neu['Decimal_date'])  # the offset smoothing curve (Monte Carlo run once and saved, see X_smoothed_offset.py) at our dates
 offset_smoothed_mean = offset_smoothed_summary['Means']  # grab means
 offset_smoothed_stdevs = offset_smoothed_summary['stdevs']  # grab stdevs
 neu['smoothed_offset'] = offset_smoothed_mean  # deposit the number for the smoothed offset in the excel sheet
-neu['D14C_2'] = neu['D14C'] + neu['smoothed_offset']  # add it to the original data (correct the offset)
 neu['smoothed_offset_error'] = offset_smoothed_stdevs
-neu['weightedstderr_D14C_2'] = np.sqrt(neu['weightedstderr_D14C']**2 + offset_smoothed_stdevs**2)
+neu['D14C_2'], neu['weightedstderr_D14C_2'] = add_offset(neu['D14C'], neu['weightedstderr_D14C'], neu['smoothed_offset'], neu['smoothed_offset_error'])  # correct the offset, propagate the error
 # is there a meaningful difference between the smoothed offset and the Pre and Post offset?
 
 neu = neu.rename(columns={"weightedstderr_D14C": "D14C_err"})
@@ -95,5 +71,5 @@ print(neu.columns)
 
 # Reorder the columns in an order that makes more sense
 neu = neu[['#location', 'Decimal_date', 'D14C', 'D14C_err', 'D14C_1', 'D14C_1_err', 'offset2', 'offset2_err', 'D14C_2', 'D14C_2_err']]
-neu.to_excel('Neumayer_offset.xlsx')
+save_output(neu, 'Neumayer_offset.xlsx')  # Neumayer_offset.parquet, plus Excel if RADIOCARBON_EXCEL_EXPORT=1
 
@@ -20,9 +20,11 @@ ask them for it, or just push ahead in D14C…
 import matplotlib as mpl
 import numpy as np
 import pandas as pd
+from X_dataset_catalog import load_dataset
+from X_outputs import OutputBatch
 import seaborn as sns
-from B_CGO_BHD_harmonization import harmonized
-from B_CGO_BHD_harmonization import harmonized_summer
+from X_harmonization import load_harmonized
+from X_tree_rings import tree_ring_count_verification, postbomb_offset_validation
 import matplotlib.pyplot as plt
 
 pd.options.mode.chained_assignment = None  # default='warn'  # https://stackoverflow.com/questions/20625582/how-to-deal-with-settingwithcopywarning-in-pandas
@@ -37,12 +39,13 @@ colors2 = sns.color_palette("mako", 6)  # import sns color pallet mako.
 mpl.rcParams['pdf.fonttype'] = 42
 mpl.rcParams['font.size'] = 10
 
-df = pd.read_excel(r'H:\The Science\Datasets'
-                   r'\SOARTreeRingData2022-02-01.xlsx')  # read in the Tree Ring data.
+df = load_dataset('soar_tree_rings', columns=['Site', 'Lat', 'Lon', 'Ring code', 'DecimalDate', 'F14C', 'F14Cerr', '∆14C',
+                                              '∆14Cerr', 'C14Flag'], canonical=False)  # read in the Tree Ring data.
 df = df.dropna(subset='∆14C').reset_index(drop=True)  # drop any data rows that doesn't have 14C data.
 # df = df.loc[(df['C14Flag']) != 'A..']
 print(df.columns)
-# importing harmonized southern hemisphere dataset from the previous python file.
+# importing harmonized southern hemisphere dataset, saved by B_CGO_BHD_harmonization.py (rebuilt only if out of date)
+harmonized, harmonized_summer = load_harmonized()
 harm_xs = harmonized['Decimal_date']  # see dataset_harmonization.py
 harm_ys = harmonized['D14C_offsetcorrected']  # see dataset_harmonization.py
 harm_fm = harmonized['F14C']
@@ -284,63 +287,7 @@ This can be found in my Data Science notebook. May 30, 2022, second page from th
 """
 
 
-def tree_ring_count_verification(data, element):
-    data = data.reset_index(drop=True)  # reset the index or you get type-setting errors
-    empty_array = []  # create an empty array. We will dump our sorted data in here
-    for i in range(0, len(data)):  # initialize a for-loop the length of the site's dataset
-        row = data.iloc[i]  # grab the i'th row
-        cell = row['Ring code']  # grab the column of data from that row
-        if element in cell:  # if what we're looking for is in there, append it to the array
-            empty_array.append(row)
-    data_new = pd.DataFrame(empty_array)  # take the array and put into a Pandas Dataframe.
-    return data_new
-
-# this function formats the datasets and produces a plot to check offsets that can't be validated with the bomb peak
-def postbomb_offset_validation(df1, df2, name):
-    merged = pd.merge(df1, df2, on='DecimalDate')
-    # initialize some empty arrays for later:
-    means = []
-    means_err = []
-    stdev = []
-    residual1 = []
-    residual2 = []
-
-    for i in range(0, len(merged)):
-        row = merged.iloc[i]  # grab the i'th row
-        averages = (row['F14C_x'] + row['F14C_y']) / 2  # find the average of the two ring cores
-        averages_err = np.sqrt((row['F14Cerr_x']) ** 2 + (row['F14Cerr_y']) ** 2) / 2  # find the error of the average
-        means.append(averages)  # append the average to its array
-        means_err.append(averages_err)  # append the propogated averages errors to their array
-
-        res1 = row['F14C_x'] - averages
-        residual1.append(res1)
-        res1_error = np.sqrt(row['F14Cerr_x'] ** 2 + averages_err ** 2)
-
-        res2 = row['F14C_y'] - averages
-        residual2.append(res2)
-        res2_error = np.sqrt(row['F14Cerr_y'] ** 2 + averages_err ** 2)
-
-    newdf = pd.DataFrame({"residual1": residual1, "res1_err": res1_error,
-                          "residual2": residual2, "res2_err": res2_error,
-                          "means": means, "means_err": means_err})
-
-    plt.errorbar(merged['DecimalDate'], newdf['residual1'], label='residual 1', yerr=newdf['res1_err'], fmt='o',
-                 color=colors2[1], ecolor=colors2[1], elinewidth=1, capsize=2)
-    plt.errorbar(merged['DecimalDate'], newdf['residual2'], label='residual 2', yerr=newdf['res2_err'], fmt='D',
-                 color=colors2[3], ecolor=colors2[3], elinewidth=1, capsize=2)
-    # plt.errorbar(merged['DecimalDate'], newdf['means'], label='mean', yerr=newdf['means_err'], fmt='o',
-    #              color=colors[3], ecolor=colors[3], elinewidth=1, capsize=2)
-    plt.legend(fontsize=7.5)
-    plt.title('')
-    plt.xlabel('Date', fontsize=14)
-    plt.ylabel('Residual', fontsize=14)  # label the y axis
-    plt.savefig(
-        'C:/Users/clewis/IdeaProjects/GNS/radiocarbon_intercomparison/interlab_comparison/plots/SOAR_tree_rings/{0}.png'.format(
-            name),
-        dpi=300, bbox_inches="tight")
-    plt.close()
-
-    return newdf
+# tree_ring_count_verification and postbomb_offset_validation are now in X_tree_rings.py (imported at the top)
 
 
 CH_41_S_core1 = tree_ring_count_verification(CH_41_S, 'T1')
@@ -493,7 +440,7 @@ plt.close()
 """
 Another thing to see is how Ricardo's Monte Tarn data matches with ours, so i'm going to briefly look at those as well.
 """
-df2 = pd.read_excel(r'H:\The Science\Datasets\Jocelyn Chile tree data 1980-2016.xlsx')
+df2 = load_dataset('chile_tree_rings', columns=['Sheet', 'Year of Growth', 'FM', 'Fmerr'], canonical=False)
 df2_1 = df2.loc[(df2['Sheet']) == 1]
 df2_2 = df2.loc[(df2['Sheet']) == 2]
 df2_3 = df2.loc[(df2['Sheet']) == 3]
@@ -864,14 +811,16 @@ They check out!
 """
 # print(len(df)) == 648
 # print(len(combined2)) == 648
-combined.to_excel('SOARTreeRingData_CBL_flags.xlsx')
+outputs = OutputBatch()  # both outputs of this file are written together, below
+outputs.save(combined, 'SOARTreeRingData_CBL_flags.xlsx')
 
 """
 Finally, I want to remove all the flagged data so I'm only left with things I HAVEN'T Flagged.
 """
 df_cleaned = combined.loc[(combined['CBL_flag']) == '...']
 # print(len(df_cleaned))
-df_cleaned.to_excel('SOARTreeRingData_CBL_cleaned.xlsx')
+outputs.save(df_cleaned, 'SOARTreeRingData_CBL_cleaned.xlsx')
+outputs.flush()  # .parquet files, plus Excel if RADIOCARBON_EXCEL_EXPORT=1
 
 """
 Do my cleaned data / plots / conclusions match rachel's?
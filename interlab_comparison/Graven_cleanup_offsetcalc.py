@@ -2,8 +2,11 @@ import numpy as np
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import pandas as pd
+from X_dataset_catalog import load_datasets
+from X_outputs import save_output
 import seaborn as sns
 from X_my_functions import long_date_to_decimal_date
+from X_radiocarbon import add_offset
 
 colors = sns.color_palette("rocket", 6)
 colors2 = sns.color_palette("mako", 6)
@@ -12,12 +15,16 @@ mpl.rcParams['font.size'] = 10
 size1 = 5
 
 """ STEP 1: LOAD UP THE DATA"""
-southpole = pd.read_excel(r'H:\The Science\Datasets\Graven_etal_2012_SouthPole.xlsx')
-Palmerstation = pd.read_excel(r'H:\The Science\Datasets\Graven_etal_2012_PalmerStation.xlsx')
-ManuaLoa = pd.read_excel(r'H:\The Science\Datasets\Graven_etal_2012_ManuaLoa.xlsx')
-KumukahiHawaii = pd.read_excel(r'H:\The Science\Datasets\Graven_etal_2012_KumukahiHawaii.xlsx')
-barrow = pd.read_excel(r'H:\The Science\Datasets\Graven_etal_2012_BarrowAlaska.xlsx')
-samoa = pd.read_excel(r'H:\The Science\Datasets\Graven_etal_2012_AmericanSamoa.xlsx')
+# the six station files don't depend on each other, so they are read at the same time
+stations = load_datasets(['graven_southpole', 'graven_palmer', 'graven_maunaloa',
+                          'graven_kumukahi', 'graven_barrow', 'graven_samoa'],
+                         columns=['Site', 'SIO ID', 'Sample Date', 'Δ14C (‰)', 'σTot\xa0(‰)'], canonical=False)
+southpole = stations['graven_southpole']
+Palmerstation = stations['graven_palmer']
+ManuaLoa = stations['graven_maunaloa']
+KumukahiHawaii = stations['graven_kumukahi']
+barrow = stations['graven_barrow']
+samoa = stations['graven_samoa']
 
 combine = pd.concat([southpole,
                      Palmerstation,
@@ -53,11 +60,10 @@ The OFFSET FOR LLNL is -2.5789633251115838 ± 1.258654216869433 , which is an av
 I'm going to ADD this offset to all Graven's data. 
 """
 
-combine['D14C_offset_corrected'] = combine['Δ14C (‰)'] + 2.58
+combine['D14C_offset_corrected'], combine['D14C_offset_corrected_error'] = add_offset(combine['Δ14C (‰)'], combine['σTot (‰)'], 2.58, 1.26)
 print(combine.columns)
-combine['D14C_offset_corrected_error'] = np.sqrt(combine['σTot (‰)']**2 + 1.26**2)
 
-combine.to_excel('Graven_OffsetCorrections.xlsx')
+save_output(combine, 'Graven_OffsetCorrections.xlsx')  # Graven_OffsetCorrections.parquet, plus Excel if RADIOCARBON_EXCEL_EXPORT=1
 
 
 
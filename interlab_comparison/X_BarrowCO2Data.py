@@ -19,19 +19,16 @@ import seaborn as sns
 from scipy import optimize
 from cbl_curve_fitting_algorithm import cbl_curve_fit
 from miller_curve_algorithm import ccgFilter
+from X_noaa_gml import read_gml_insitu
 # from my_functions import year_month_todecimaldate
 warnings.simplefilter('ignore', np.RankWarning)
 # Source:
 # IMPORT DATA INTO PYTHON
-df = pd.read_csv(r'H:\The Science\Datasets'
-                 r'\co2_brw_surface-insitu_1_ccgg_DailyData.csv')
-
-# print(df.columns)  # Shows the column names in imported data
-df = df.loc[(df['year'].between(2000, 2011))]  # filter values from 2000-2011
-df = df.loc[(df['value'] > 0)]  # filter out all flag values (-1000)
-df = df.reset_index()
-date = (df['time_decimal'])
-co2 = (df['value'])
+# streamed in chunks, keeping 2000-2011 and filtering out all flag values (-1000) while reading (see X_noaa_gml.py)
+data = read_gml_insitu(r'H:\The Science\Datasets'
+                       r'\co2_brw_surface-insitu_1_ccgg_DailyData.csv', years=(2000, 2011), min_value=0)
+date = data[:, 0]
+co2 = data[:, 1]
 
 # call in the curve fitting programs
 cbl_smooth = cbl_curve_fit(date, co2)
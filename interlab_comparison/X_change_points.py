@@ -0,0 +1,280 @@
+"""
+Finding where the Baring Head - Cape Grim offset changes (the pre/post AMS transitions and so on) from the data.
+
+The offset periods (snipmin = 1994, snipmax = 2006, the 2009 - 2012 issue, pre and post XCAMS) were chosen by hand,
+and offset1 ... offset6 follow from those choices. This module looks for the dates where the mean of the difference
+series changes, so that the choices can be checked, and checked again when new data come in.
+
+The difference series d (e.g. the smoothed BHD record minus the smoothed CGO record on a common grid) is split into
+segments of constant mean. The cost of a segment is its weighted sum of squares about its weighted mean,
+sum(w * (d - mean)**2) with w = 1 / err**2 (err: the Monte Carlo stdevs), which is -2 log likelihood of normal errors.
+SegmentCost keeps the cumulative sums of w, w * d and w * d**2, so the cost of any segment is a few subtractions.
+A split is kept when it lowers the total cost by more than penalty:
+    pelt()                  the best segmentation for a penalty, exactly (PELT, Killick et al. 2012), in about O(n)
+    optimal_partition()     the same segmentation without pruning, O(n**2); the reference pelt() is checked against
+    binary_segmentation()   splits the series at its best point, then each half, ..., O(n log n), not always optimal
+    penalty_sweep()         the segmentation for many penalties from the same SegmentCost, to see which breaks are
+                            there for any reasonable penalty and which only appear for small ones
+change_points() puts it together and returns a table of the breaks: date, how much each lowers the cost, a confidence
+interval for the date, and the mean offset on either side.
+
+Confidence interval: for each break, the cost is worked out with the break moved to every other point between its
+neighbouring breaks; the dates where it is within chi2(1 dof) = 3.84 of the best (for 95 %) are the interval.
+
+NOTE: points of a smoothed curve are not independent (CCGCRV smooths over ~2 years), so the weighted costs overstate
+how sure we can be. The default penalty (2 log n, BIC-like) finds every break the smoothing allows; use penalty_sweep,
+or a larger penalty, to see which are robust, and treat the intervals as lower limits.
+
+python X_change_points.py checks pelt() against optimal_partition() on random series (see check_pelt).
+
+Example:
+d = bhd_all_trend['Means'] - heidelberg_all_trend['Means']
+err = np.sqrt(bhd_all_trend['stdevs']**2 + heidelberg_all_trend['stdevs']**2)
+breaks = change_points(rolling_x, d, err, min_years=1)
+sweep = penalty_sweep(SegmentCost(rolling_x, d, err), np.logspace(0, 4, 30), min_size=12)
+"""
+
+import numpy as np
+import pandas as pd
+
+CHI2_95 = 3.841458820694124  # chi-squared, 1 degree of freedom, 95 %
+
+
+def _cumsum(y):
+    c = np.zeros(len(y) + 1)
+    np.cumsum(y, out=c[1:])
+    return c
+
+
+class SegmentCost:
+    """
+    Weighted sum-of-squares cost of any segment [start, end) of the series y (with errors err) at dates x, from
+    cumulative sums. Points where y or err is NaN (or err is not positive) are left out.
+    """
+
+    def __init__(self, x, y, err):
+        x, y, err = (np.asarray(v, dtype=np.float64) for v in (x, y, err))
+        good = np.isfinite(x) & np.isfinite(y) & np.isfinite(err) & (err > 0)
+        self.x, self.y, self.err = x[good], y[good], err[good]
+        if np.any(np.diff(self.x) < 0):
+            raise ValueError('x has to be increasing')
+        w = 1 / np.square(self.err)
+        shift = np.average(self.y, weights=w) if len(self.y) else 0  # centring keeps the sums accurate
+        self.shift = shift
+        self.cw = _cumsum(w)
+        self.cwy = _cumsum(w * (self.y - shift))
+        self.cwy2 = _cumsum(w * np.square(self.y - shift))
+
+    def __len__(self):
+        return len(self.y)
+
+    def cost(self, start, end):
+        """ Cost of the segments [start, end) (arrays broadcast) """
+        sw = self.cw[end] - self.cw[start]
+        swy = self.cwy[end] - self.cwy[start]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            c = self.cwy2[end] - self.cwy2[start] - np.where(sw > 0, np.square(swy) / sw, 0)
+        return np.maximum(c, 0)
+
+    def mean(self, start, end):
+        """ (weighted mean, its error) of the segments [start, end) """
+        sw = self.cw[end] - self.cw[start]
+        return (self.cwy[end] - self.cwy[start]) / sw + self.shift, 1 / np.sqrt(sw)
+
+
+def default_penalty(n):
+    return 2 * np.log(max(n, 2))
+
+
+def pelt(cost, penalty=None, min_size=2):
+    """
+    Optimal segmentation of a SegmentCost for penalty (default 2 log n) by PELT, segments at least min_size points.
+    Returns the sorted indices where new segments start (not including 0).
+    """
+    n = len(cost)
+    if penalty is None:
+        penalty = default_penalty(n)
+    if n < 2 * min_size:
+        return np.array([], dtype=np.int64)
+    best = np.full(n + 1, np.inf)  # best[t]: lowest total cost (with penalties) of y[:t]
+    best[0] = -penalty
+    last = np.zeros(n + 1, dtype=np.int64)  # start of the last segment of that segmentation
+    candidates = np.array([], dtype=np.int64)
+    pruned = {}  # T -> the starts found at T - min_size never to be worth it from T on
+    for t in range(min_size, n + 1):
+        if t in pruned:
+            candidates = candidates[~np.isin(candidates, pruned.pop(t))]
+        s = t - min_size
+        if s == 0 or s >= min_size:
+            candidates = np.append(candidates, s)
+        total = best[candidates] + cost.cost(candidates, t)
+        i = int(np.argmin(total + penalty))
+        best[t] = total[i] + penalty
+        last[t] = candidates[i]
+        # pruning: a start s with best[s] + cost(s, t) > best[t] is beaten by a segment starting at t for any later
+        # end T, but only once t can start a segment, i.e. from T = t + min_size on; before that s is still needed
+        if t + min_size <= n:
+            pruned[t + min_size] = candidates[total > best[t]]
+    return _backtrack(last, n)
+
+
+def _backtrack(last, n):
+    """ the break indices of the segmentation ending at n, from the start of the last segment of each y[:t] """
+    breaks = []
+    t = last[n]
+    while t > 0:
+        breaks.append(t)
+        t = last[t]
+    return np.array(breaks[::-1], dtype=np.int64)
+
+
+def optimal_partition(cost, penalty=None, min_size=2):
+    """
+    The same segmentation as pelt(), by trying every start of the last segment for every end (no pruning), O(n**2).
+    Slow, but obviously exact: the reference for check_pelt().
+    """
+    n = len(cost)
+    if penalty is None:
+        penalty = default_penalty(n)
+    if n < 2 * min_size:
+        return np.array([], dtype=np.int64)
+    best = np.full(n + 1, np.inf)
+    best[0] = -penalty
+    last = np.zeros(n + 1, dtype=np.int64)
+    for t in range(min_size, n + 1):
+        starts = np.array([s for s in range(0, t - min_size + 1) if s == 0 or s >= min_size], dtype=np.int64)
+        total = best[starts] + cost.cost(starts, t) + penalty
+        i = int(np.argmin(total))
+        best[t], last[t] = total[i], starts[i]
+    return _backtrack(last, n)
+
+
+def total_cost(cost, breaks, penalty):
+    """ Cost of the segmentation with these breaks, plus penalty per break """
+    edges = np.concatenate([[0], breaks, [len(cost)]]).astype(np.int64)
+    return float(np.sum(cost.cost(edges[:-1], edges[1:]))) + penalty * len(breaks)
+
+
+def check_pelt(trials=300, seed=0, max_n=40, tolerance=1e-9):
+    """
+    Compare pelt() with optimal_partition() on trials random series (random lengths, steps, errors, penalties and
+    min_size 1 - 5). Returns the trials where pelt's total cost is higher (a list of dicts, empty if all agree).
+    """
+    rng = np.random.default_rng(seed)
+    worse = []
+    for trial in range(trials):
+        n = int(rng.integers(4, max_n + 1))
+        y = np.cumsum(rng.normal(0, 1, n) * (rng.random(n) < 0.2)) + rng.normal(0, 0.5, n)
+        cost = SegmentCost(np.arange(n), y, rng.uniform(0.3, 1.5, n))
+        min_size = int(rng.integers(1, 6))
+        penalty = float(rng.uniform(0.5, 25))
+        fast = pelt(cost, penalty, min_size)
+        exact = optimal_partition(cost, penalty, min_size)
+        excess = total_cost(cost, fast, penalty) - total_cost(cost, exact, penalty)
+        if excess > tolerance:
+            worse.append({'trial': trial, 'n': n, 'min_size': min_size, 'penalty': penalty, 'pelt': fast.tolist(),
+                          'exact': exact.tolist(), 'excess_cost': excess})
+    return worse
+
+
+def binary_segmentation(cost, penalty=None, min_size=2, max_breaks=None):
+    """
+    Split a SegmentCost at the point that lowers the cost most, as long as that is more than penalty, then split the
+    pieces the same way (up to max_breaks splits). Returns the sorted indices where new segments start.
+    """
+    n = len(cost)
+    if penalty is None:
+        penalty = default_penalty(n)
+    segments = [(0, n)]
+    breaks = []
+    while segments and (max_breaks is None or len(breaks) < max_breaks):
+        gains = []
+        for start, end in segments:
+            split = np.arange(start + min_size, end - min_size + 1)
+            if not len(split):
+                gains.append((-np.inf, start, end, None))
+                continue
+            gain = cost.cost(start, end) - cost.cost(start, split) - cost.cost(split, end)
+            i = int(np.argmax(gain))
+            gains.append((gain[i], start, end, int(split[i])))
+        gain, start, end, split = max(gains, key=lambda g: g[0])
+        if split is None or gain <= penalty:
+            break
+        breaks.append(split)
+        segments.remove((start, end))
+        segments += [(start, split), (split, end)]
+    return np.array(sorted(breaks), dtype=np.int64)
+
+
+def _interval(cost, lo, hi, b, min_size, level):
+    """ The indices a break b (between the breaks lo and hi) could move to with the cost within level of its best """
+    split = np.arange(lo + min_size, hi - min_size + 1)
+    total = cost.cost(lo, split) + cost.cost(split, hi)
+    inside = split[total - total[split == b][0] <= level]
+    return inside.min(), inside.max()
+
+
+def describe_breaks(cost, breaks, min_size=2, level=CHI2_95):
+    """
+    Table of the breaks of a SegmentCost: date (half-way between the last point before and the first after),
+    cost_gain (how much the total cost goes up without it), ci_low / ci_high (dates of the confidence interval),
+    mean_before / mean_before_err / mean_after / mean_after_err (weighted mean offset of the neighbouring segments).
+    """
+    x = cost.x
+    edges = np.concatenate([[0], breaks, [len(cost)]]).astype(np.int64)
+    rows = []
+    for k in range(1, len(edges) - 1):
+        lo, b, hi = edges[k - 1], edges[k], edges[k + 1]
+        low, high = _interval(cost, lo, hi, b, min_size, level)
+        before, before_err = cost.mean(lo, b)
+        after, after_err = cost.mean(b, hi)
+        rows.append({'index': b, 'date': (x[b - 1] + x[b]) / 2,
+                     'cost_gain': cost.cost(lo, hi) - cost.cost(lo, b) - cost.cost(b, hi),
+                     'ci_low': (x[low - 1] + x[low]) / 2, 'ci_high': (x[high - 1] + x[high]) / 2,
+                     'mean_before': before, 'mean_before_err': before_err,
+                     'mean_after': after, 'mean_after_err': after_err})
+    return pd.DataFrame(rows, columns=['index', 'date', 'cost_gain', 'ci_low', 'ci_high', 'mean_before',
+                                       'mean_before_err', 'mean_after', 'mean_after_err'])
+
+
+def penalty_sweep(cost, penalties, min_size=2, method='pelt'):
+    """
+    The segmentation of one SegmentCost for each penalty: a DataFrame with penalty, n_breaks, total_cost (without
+    penalties) and breaks (the break dates).
+    """
+    detect = pelt if method == 'pelt' else binary_segmentation
+    rows = []
+    for penalty in penalties:
+        breaks = detect(cost, penalty, min_size)
+        total = total_cost(cost, breaks, 0)
+        dates = [(cost.x[b - 1] + cost.x[b]) / 2 for b in breaks]
+        rows.append({'penalty': penalty, 'n_breaks': len(breaks), 'total_cost': total, 'breaks': dates})
+    return pd.DataFrame(rows)
+
+
+def change_points(x, y, err, penalty=None, min_years=1.0, method='pelt', level=CHI2_95):
+    """
+    Where the mean of y (errors err, at dates x) changes: the describe_breaks table of the breaks found by method
+    ('pelt' or 'binseg') for penalty (default 2 log n), with segments at least min_years long.
+    """
+    cost = SegmentCost(x, y, err)
+    if len(cost) < 2:
+        return describe_breaks(cost, np.array([], dtype=np.int64))
+    step = np.median(np.diff(cost.x))
+    min_size = max(2, int(np.ceil(min_years / step)))
+    if method == 'pelt':
+        breaks = pelt(cost, penalty, min_size)
+    elif method == 'binseg':
+        breaks = binary_segmentation(cost, penalty, min_size)
+    else:
+        raise ValueError("method must be 'pelt' or 'binseg', not %r" % (method,))
+    return describe_breaks(cost, breaks, min_size, level)
+
+
+if __name__ == '__main__':
+    import sys
+    failures = check_pelt()
+    for f in failures:
+        print(f)
+    print('pelt vs optimal_partition: %d of 300 random series worse' % len(failures))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,218 @@
+r"""
+Columnar cache for the Excel workbooks that almost every script starts by reading.
+
+Parsing .xlsx files is by far the slowest I/O in the project, and the same workbooks (heidelberg_cape_grim.xlsx,
+BHD_14CO2_datasets_20211013.xlsx, CapeGrim_offset.xlsx, ...) are parsed again by every script, every run.
+"read_excel_cached" is a drop-in replacement for pd.read_excel for a single sheet:
+    - the first time a workbook/sheet is read, it is parsed with pd.read_excel as usual and written to an
+      uncompressed Feather (Arrow) file in a cache folder, together with a small .json file describing the source.
+    - after that, the Feather file is memory-mapped and only the columns asked for are read, which is near-instant.
+    - the cache is rebuilt when the source file changes. If the modification time and size are unchanged the cache is
+      used straight away; if they changed, the file contents are hashed, so a file that was only touched (copied,
+      re-saved without edits) keeps its cache.
+
+The cache lives in a ".dataset_cache" folder next to the source file, or in the folder given by the
+RADIOCARBON_CACHE_DIR environment variable. Deleting the folder is always safe.
+Feather needs pyarrow. Without it, read_excel_cached simply falls back to pd.read_excel.
+
+Arrow needs one type per column, but Excel columns often mix numbers and text (e.g. a note in a number column). Such a
+column is stored as its text cells plus one extra column per kind of value in it (numbers, integers, dates), and put
+back together cell by cell on reading, so [1.5, 'bad', 3] comes back as [1.5, 'bad', 3], not ['1.5', 'bad', '3'].
+
+Example:
+heidelberg = read_excel_cached(r'H:\The Science\Datasets\heidelberg_cape_grim.xlsx', skiprows=40)
+bhd = read_excel_cached(r'H:\The Science\Datasets\BHD_14CO2_datasets_20211013.xlsx',
+                        columns=['DEC_DECAY_CORR', 'DELTA14C', 'DELTA14C_ERR'])
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import warnings
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 2  # 2: mixed columns keep their numbers (version 1 stored every cell of them as text)
+CACHE_FOLDER = '.dataset_cache'
+PART = '%s\x00%s'  # name of the column holding one kind of cell of a mixed column (can't clash with an Excel header)
+
+
+def file_hash(path):
+    """ sha1 of the contents of a file, read in 1 MB blocks """
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_paths(path, sheet_name=0, cache_dir=None, **read_kwargs):
+    """ Return the (feather, json) cache file paths for a workbook/sheet and read_excel arguments """
+    path = os.path.abspath(path)
+    if cache_dir is None:
+        cache_dir = os.environ.get('RADIOCARBON_CACHE_DIR', os.path.join(os.path.dirname(path), CACHE_FOLDER))
+    key = repr((path, sheet_name, sorted(read_kwargs.items())))
+    key = hashlib.sha1(key.encode()).hexdigest()[:12]
+    stem = '%s.%s.%s' % (os.path.splitext(os.path.basename(path))[0], sheet_name, key)
+    return os.path.join(cache_dir, stem + '.feather'), os.path.join(cache_dir, stem + '.json')
+
+
+def _valid_meta(path, meta_path):
+    """
+    The metadata in meta_path if it matches the current source file, else None. Refreshes the stored mtime if only
+    that changed.
+    """
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get('version') != CACHE_VERSION:
+        return None
+
+    st = os.stat(path)
+    if meta['mtime_ns'] == st.st_mtime_ns and meta['size'] == st.st_size:
+        return meta
+    if meta['size'] != st.st_size or meta['sha1'] != file_hash(path):
+        return None
+
+    # same contents, new modification time: keep the cache
+    meta['mtime_ns'] = st.st_mtime_ns
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return meta
+
+
+def _cache_is_valid(path, meta_path):
+    """ True if the metadata in meta_path matches the current source file """
+    return _valid_meta(path, meta_path) is not None
+
+
+def _kind(value):
+    """ Which part of a mixed column a cell goes to: 'integer', 'number', 'date' or 'text' """
+    if isinstance(value, (bool, np.bool_)):
+        return 'text'
+    if isinstance(value, (int, np.integer)):
+        return 'integer'
+    if isinstance(value, (float, np.floating)):
+        return 'number'
+    if isinstance(value, (datetime.datetime, np.datetime64)):
+        return 'date'
+    return 'text'
+
+
+def split_mixed(df):
+    """
+    Arrow needs one type per column, so a column mixing numbers, text and dates is split: the column itself keeps
+    the text cells (other cells become text too), and each other kind of cell goes into its own typed column,
+    PART % (column, kind), empty elsewhere. Returns a copy of df to write (index as it was) and {column: [kinds]} of
+    the split columns, for restore_mixed; everything else keeps its dtype. Column names must be strings.
+    Also used for the Parquet outputs of X_outputs.py.
+    """
+    import pyarrow as pa
+
+    df = df.copy()
+    mixed = {}
+    for c in list(df.columns):
+        if df[c].dtype == object:
+            values = df[c]
+            kinds = values.map(_kind).where(values.notna(), None)
+            try:
+                if kinds.nunique() > 1:  # Arrow would turn some of them into the others (2.5 into a timestamp, ...)
+                    raise pa.ArrowInvalid(c)
+                pa.array(values, from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                parts = {}
+                for kind, dtype in (('integer', 'Int64'), ('number', 'float64'), ('date', 'datetime64[ns]')):
+                    if (kinds == kind).any():
+                        part = values.where(kinds == kind)
+                        parts[kind] = pd.to_datetime(part) if kind == 'date' else part.astype(dtype)
+                text = kinds.notna() & ~kinds.isin(list(parts))
+                df[c] = values.where(text).map(str, na_action='ignore').astype(object)
+                for kind, part in parts.items():
+                    df[PART % (c, kind)] = part
+                mixed[c] = list(parts)
+    return df, mixed
+
+
+def _arrow_safe(df):
+    """ split_mixed of df with a fresh 0 ... n-1 index and string column names, for the Feather cache """
+    df = df.reset_index(drop=True)
+    df.columns = [str(c) for c in df.columns]
+    return split_mixed(df)
+
+
+def mixed_read_columns(columns, mixed):
+    """
+    The columns to read from a file written with split_mixed so that restore_mixed can rebuild columns (None: all),
+    and the part of mixed that applies to them
+    """
+    if columns is None:
+        return None, mixed
+    mixed = {c: kinds for c, kinds in mixed.items() if c in columns}
+    return list(columns) + [PART % (c, kind) for c, kinds in mixed.items() for kind in kinds], mixed
+
+
+def restore_mixed(df, mixed):
+    """ Put the columns split by split_mixed back together, cell by cell (in place; returns df) """
+    for c, kinds in mixed.items():
+        if c not in df.columns:
+            continue
+        values = df[c].to_numpy(dtype=object, copy=True)
+        for kind in kinds:
+            part = df.pop(PART % (c, kind))
+            cells = part.notna().to_numpy()
+            values[cells] = part.astype(object).to_numpy()[cells]
+        df[c] = pd.Series(values, index=df.index, dtype=object)
+    return df
+
+
+def is_cached(path, sheet_name=0, cache_dir=None, **read_kwargs):
+    """ True if read_excel_cached would read this workbook/sheet from a valid cache rather than parse the workbook """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    data_path, meta_path = cache_paths(path, sheet_name, cache_dir, **read_kwargs)
+    return os.path.exists(data_path) and _cache_is_valid(path, meta_path)
+
+
+def read_excel_cached(path, sheet_name=0, columns=None, cache_dir=None, refresh=False, **read_kwargs):
+    """
+    Read one sheet of an Excel workbook, through the Feather cache.
+
+    path, sheet_name, **read_kwargs: as for pd.read_excel (e.g. skiprows=40). sheet_name must be a single sheet.
+    columns: list of columns to return. Only these are read from the cache.
+    cache_dir: folder for the cache files, see the top of this file for the default.
+    refresh: rebuild the cache even if it looks valid.
+    """
+    if sheet_name is None or isinstance(sheet_name, list):
+        raise ValueError('read_excel_cached reads one sheet at a time, got sheet_name=%r' % (sheet_name,))
+
+    try:
+        from pyarrow import feather
+    except ImportError:
+        warnings.warn('pyarrow is not installed, reading %s without the dataset cache' % path)
+        df = pd.read_excel(path, sheet_name=sheet_name, **read_kwargs)
+        return df if columns is None else df[columns]
+
+    data_path, meta_path = cache_paths(path, sheet_name, cache_dir, **read_kwargs)
+    meta = None if refresh or not os.path.exists(data_path) else _valid_meta(path, meta_path)
+    if meta is not None:
+        read, mixed = mixed_read_columns(columns, meta.get('mixed', {}))
+        df = feather.read_table(data_path, columns=read, memory_map=True).to_pandas()
+        return restore_mixed(df, mixed)
+
+    df = pd.read_excel(path, sheet_name=sheet_name, **read_kwargs)
+    cached, mixed = _arrow_safe(df)
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    feather.write_feather(cached, data_path, compression='uncompressed')
+    st = os.stat(path)
+    with open(meta_path, 'w') as f:
+        json.dump({'version': CACHE_VERSION, 'source': os.path.abspath(path), 'sheet_name': sheet_name,
+                   'read_kwargs': {k: repr(v) for k, v in read_kwargs.items()}, 'mixed': mixed,
+                   'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'sha1': file_hash(path)}, f)
+
+    df = df.reset_index(drop=True)
+    df.columns = [str(c) for c in df.columns]
+    return df if columns is None else df[columns]
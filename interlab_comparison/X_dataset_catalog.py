@@ -0,0 +1,250 @@
+r"""
+One place that knows where every dataset lives and how it should be read.
+
+Before this, every script had its own hard-coded Windows path (H:\The Science\Datasets\..., C:\Users\clewis\...),
+skiprows, sheet_name, dropna and column renames. Now all of that is declared once in datasets.json:
+    root / file / sheet / skiprows: where the workbook is and how to read it. Paths are relative to a named root.
+    columns: canonical column name -> the name in the workbook, for columns that get renamed
+             (e.g. DELTA14C -> D14C, DEC_DECAY_CORR -> Decimal_date)
+    dtypes: dtype of a column, by canonical name
+    filters: standard filters applied every time the dataset is loaded (e.g. drop rows without D14C)
+
+To run somewhere else (e.g. a Linux batch node), point a root somewhere else with an environment variable:
+RADIOCARBON_DATA_ROOT=/data/radiocarbon, or RADIOCARBON_PROJECT_ROOT=... for the intermediate files.
+
+dataset('name') returns a lazy handle; nothing is read until .load() is called, and then only the columns asked for
+(plus any the filters need) are read, through the Feather cache in X_dataset_cache.py. Intermediate results written
+by our own scripts are Parquet files (see X_outputs.py), which are read directly.
+
+load_datasets loads several independent datasets at the same time and returns a dict of DataFrames, printing how long
+each file took. Parsing a workbook with openpyxl is pure Python and holds the GIL, so workbooks that are not cached yet
+are parsed in a process pool; cached ones are memory-mapped Feather reads, which release the GIL and use a thread pool.
+Start-up then takes about as long as the slowest file rather than the sum of all of them.
+
+Example:
+bhd = load_dataset('bhd_14co2', columns=['Decimal_date', 'D14C', 'D14C_err'])
+heidelberg = load_dataset('heidelberg_cape_grim', canonical=False)  # keep the column names used in the workbook
+stations = load_datasets(['graven_southpole', 'graven_palmer', 'graven_barrow'], canonical=False)
+"""
+
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from X_dataset_cache import is_cached, read_excel_cached
+from X_outputs import PARQUET, read_parquet_output, readable_path
+
+CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datasets.json')
+
+_OPS = {
+    'notna': lambda col, value: col.notna(),
+    '>': lambda col, value: col > value,
+    '>=': lambda col, value: col >= value,
+    '<': lambda col, value: col < value,
+    '<=': lambda col, value: col <= value,
+    '==': lambda col, value: col == value,
+    '!=': lambda col, value: col != value,
+}
+
+
+class Dataset:
+    """ Lazy handle on one catalog entry. Nothing is read until load() is called. """
+
+    def __init__(self, name, path, spec):
+        self.name = name
+        self.path = path
+        self.sheet = spec.get('sheet', 0)
+        self.skiprows = spec.get('skiprows', None)
+        self.renames = spec.get('columns', {})  # canonical -> source
+        self.dtypes = spec.get('dtypes', {})
+        self.filters = spec.get('filters', [])
+
+    def __repr__(self):
+        return "Dataset(%r, %r)" % (self.name, self.path)
+
+    def read_path(self):
+        """ The file that load() reads. For a Parquet output that hasn't been written yet, the older .xlsx copy. """
+        return readable_path(self.path) if self.path.endswith(PARQUET) else self.path
+
+    def _read_kwargs(self):
+        return {} if self.skiprows is None else {'skiprows': self.skiprows}
+
+    def is_cached(self):
+        """ True if loading will not parse a workbook: a Parquet file, or a workbook already in the Feather cache """
+        path = self.read_path()
+        return path.endswith(PARQUET) or is_cached(path, sheet_name=self.sheet, **self._read_kwargs())
+
+    def source_name(self, column):
+        """ Name of a canonical column in the workbook """
+        return self.renames.get(column, column)
+
+    def canonical_name(self, column):
+        """ Canonical name of a workbook column """
+        for canonical, source in self.renames.items():
+            if source == column:
+                return canonical
+        return column
+
+    def load(self, columns=None, canonical=True, filters=True):
+        """
+        Read the dataset.
+
+        columns: list of columns to read, default all. Names are canonical names if canonical=True,
+            otherwise the names in the workbook.
+        canonical: rename the columns to their canonical names.
+        filters: apply the standard filters from the catalog. The index is reset after filtering.
+        """
+        if columns is None:
+            wanted = None
+            read = None
+        else:
+            wanted = [c if canonical else self.canonical_name(c) for c in columns]
+            need = list(wanted)
+            if filters:
+                need += [f['column'] for f in self.filters if f['column'] not in need]
+            read = [self.source_name(c) for c in need]
+
+        path = self.read_path()
+        if path.endswith(PARQUET):
+            df = read_parquet_output(path, columns=read)
+        else:
+            df = read_excel_cached(path, sheet_name=self.sheet, columns=read, **self._read_kwargs())
+        df = df.rename(columns={source: canonical for canonical, source in self.renames.items()})
+
+        for column, dtype in self.dtypes.items():
+            if column in df.columns:
+                df[column] = df[column].astype(dtype)
+
+        if filters and self.filters:
+            keep = np.ones(len(df), dtype=bool)
+            for f in self.filters:
+                keep &= _OPS[f['op']](df[f['column']], f.get('value')).to_numpy()
+            df = df.loc[keep].reset_index(drop=True)
+
+        if wanted is not None:
+            df = df[wanted]
+        if not canonical:
+            df = df.rename(columns={canonical: source for canonical, source in self.renames.items()})
+        return df
+
+
+class Catalog:
+    """ The datasets declared in a catalog file (default datasets.json next to this file) """
+
+    def __init__(self, path=CATALOG_FILE, roots=None):
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+        base = os.path.dirname(os.path.abspath(path))
+
+        self.roots = {}
+        for name, root in config['roots'].items():
+            root = os.environ.get('RADIOCARBON_%s_ROOT' % name.upper(), root)
+            if roots is not None and name in roots:
+                root = roots[name]
+            self.roots[name] = os.path.normpath(os.path.join(base, root))  # absolute roots are kept as they are by os.path.join
+        self.specs = config['datasets']
+
+    def names(self):
+        return sorted(self.specs)
+
+    def dataset(self, name):
+        if name not in self.specs:
+            raise KeyError("'%s' is not in the dataset catalog, choose from %s" % (name, self.names()))
+        spec = self.specs[name]
+        return Dataset(name, os.path.join(self.roots[spec['root']], spec['file']), spec)
+
+
+_catalog = None
+load_timings = {}  # name -> seconds, for the most recent load_datasets call
+
+
+def get_catalog():
+    """ The default catalog, read once per process """
+    global _catalog
+    if _catalog is None:
+        _catalog = Catalog()
+    return _catalog
+
+
+def dataset(name):
+    """ Lazy handle on a dataset in the default catalog """
+    return get_catalog().dataset(name)
+
+
+def load_dataset(name, columns=None, canonical=True, filters=True):
+    """ Shortcut for dataset(name).load(...) """
+    return dataset(name).load(columns=columns, canonical=canonical, filters=filters)
+
+
+def _timed_load(dset, kwargs):
+    """ Load one dataset and time it. Module level so that it can be sent to a process pool. """
+    t0 = time.perf_counter()
+    df = dset.load(**kwargs)
+    return df, time.perf_counter() - t0
+
+
+def load_datasets(names, columns=None, canonical=True, filters=True, max_workers=None, executor='auto', verbose=True):
+    """
+    Load several independent datasets concurrently.
+
+    names: list of dataset names, or a dict of key -> dataset name (the keys are then used in the result)
+    columns: list of columns for every dataset, or a dict of dataset name -> list of columns
+    canonical, filters: as for Dataset.load
+    max_workers: size of the pool, default one worker per dataset (capped at the number of CPUs)
+    executor: 'process', 'thread', or 'auto'. 'auto' uses threads if every dataset is already cached, otherwise a
+        process pool if processes can be forked (Linux). Spawned processes (Windows, macOS) re-run the calling script
+        from the top, so 'process' there is only safe from scripts whose code is under if __name__ == '__main__':,
+        and 'auto' uses threads instead.
+    verbose: print the time taken by each file, and in total.
+
+    Returns a dict of name -> DataFrame, in the order the names were given. The per-file timings (seconds) of the most
+    recent call are kept in load_timings.
+    """
+    if isinstance(names, dict):
+        keys, names = list(names), list(names.values())
+    else:
+        keys, names = list(names), list(names)
+    datasets = [dataset(name) for name in names]  # unknown names fail here, before any work is started
+
+    if executor == 'auto':
+        if all(dset.is_cached() for dset in datasets):
+            executor = 'thread'
+        elif 'fork' in multiprocessing.get_all_start_methods():
+            executor = 'process'
+        else:
+            executor = 'thread'
+    if executor == 'process':
+        context = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+        pool = ProcessPoolExecutor
+        pool_kwargs = {'mp_context': multiprocessing.get_context(context)}
+    elif executor == 'thread':
+        pool = ThreadPoolExecutor
+        pool_kwargs = {}
+    else:
+        raise ValueError("executor must be 'process', 'thread' or 'auto', got %r" % (executor,))
+    if max_workers is None:
+        max_workers = min(len(datasets), os.cpu_count() or 1)
+
+    t0 = time.perf_counter()
+    with pool(max_workers=max(max_workers, 1), **pool_kwargs) as ex:
+        futures = []
+        for dset in datasets:
+            cols = columns.get(dset.name) if isinstance(columns, dict) else columns
+            futures.append(ex.submit(_timed_load, dset, {'columns': cols, 'canonical': canonical, 'filters': filters}))
+        results = [f.result() for f in futures]
+    total = time.perf_counter() - t0
+
+    load_timings.clear()
+    out = {}
+    for key, dset, (df, seconds) in zip(keys, datasets, results):
+        out[key] = df
+        load_timings[key] = seconds
+        if verbose:
+            print('loaded %-32s %8.3f s  %7d rows  (%s)' % (dset.name, seconds, len(df), os.path.basename(dset.path)))
+    if verbose:
+        print('loaded %d datasets in %.3f s with %d %s workers (sum of files %.3f s)'
+              % (len(out), total, max_workers, executor, sum(load_timings.values())))
+    return out
+
@@ -0,0 +1,71 @@
+"""
+Conversion between dates and decimal years, for whole columns at once.
+
+long_date_to_decimal_date (X_my_functions.py) used to call PyAstronomy's pyasl.decimalYear on one date at a time in
+a python loop. That is the same sum as here:
+    decimal year = year + (seconds since the start of the year) / (seconds in the year)
+with whole seconds (fractions of a second dropped) and real leap years (1900 isn't one, 2000 is). decimal_year does
+it with numpy on the whole column, so it gives the same numbers, bit for bit, in milliseconds for 10^6 dates, and
+without needing PyAstronomy.
+One difference: pyasl counted the seconds with time.mktime, i.e. in the computer's local time, so on a computer whose
+time zone has daylight saving, dates in summer came out up to an hour (1e-4 yr) different. Here the dates are taken
+as they are written, which is what pyasl gives on a computer without daylight saving (e.g. TZ=UTC). The decimal dates
+in our saved outputs have no such shifts: those in Graven_OffsetCorrections are reproduced to the 12 digits the
+workbook keeps.
+
+calendar_date is the inverse (decimal years -> datetime64[s], to the nearest second), for whole arrays. It replaces
+ccgFilter.calendarDate, which did the same for one value (but treated every 4th year as a leap year).
+
+Example:
+heidelberg['Decimal_date'] = decimal_year(heidelberg['Average pf Start-date and enddate'])
+calendar_date([2000.5, 2001.0])  # array(['2000-07-02T00:00:00', '2001-01-01T00:00:00'], dtype='datetime64[s]')
+"""
+
+import numpy as np
+
+
+def _year_bounds(years):
+    """ datetime64[s] start of each year (int64 array), and the length of that year in seconds """
+    start = (years - 1970).astype('datetime64[Y]').astype('datetime64[s]')
+    end = (years - 1969).astype('datetime64[Y]').astype('datetime64[s]')
+    return start, (end - start).astype(np.int64)
+
+
+def decimal_year(dates):
+    """
+    Decimal years of dates: a pandas Series, numpy datetime64 array, list of datetimes or strings, or a single date.
+    Returns a float64 array (a float for a single date); missing dates (NaT) give NaN.
+    Time zone aware dates are converted at their own wall-clock time.
+    """
+    import pandas as pd  # here, so that importing calendar_date (X_miller_curve_algorithm does) doesn't load pandas
+
+    scalar = np.ndim(dates) == 0
+    values = pd.to_datetime(pd.Series([dates] if scalar else dates))
+    if values.dt.tz is not None:
+        values = values.dt.tz_localize(None)
+    seconds = values.to_numpy().astype('datetime64[s]')  # fractions of a second dropped, like timetuple()
+    missing = np.isnat(seconds)
+    seconds[missing] = np.datetime64(0, 's')
+    years = seconds.astype('datetime64[Y]').astype(np.int64) + 1970
+    start, length = _year_bounds(years)
+    elapsed = (seconds - start).astype(np.int64)
+    out = years + elapsed.astype(np.float64) / length.astype(np.float64)
+    out[missing] = np.nan
+    return float(out[0]) if scalar else out
+
+
+def calendar_date(decyear):
+    """
+    The datetime64[s] of decimal years (the inverse of decimal_year, to the nearest second; halves round to even, like
+    ccgFilter.calendarDate). Returns an array, or a numpy.datetime64 for a single value; NaN gives NaT.
+    """
+    decyear = np.asarray(decyear, dtype=np.float64)
+    scalar = decyear.ndim == 0
+    decyear = np.atleast_1d(decyear)
+    missing = ~np.isfinite(decyear)
+    whole = np.floor(np.where(missing, 1970, decyear))
+    start, length = _year_bounds(whole.astype(np.int64))
+    nsec = np.round((np.where(missing, 1970, decyear) - whole) * length)
+    out = start + nsec.astype(np.int64).astype('timedelta64[s]')
+    out[missing] = np.datetime64('NaT')
+    return out[0] if scalar else out
@@ -0,0 +1,164 @@
+"""
+Time windows taken out of a record (and why), defined once and applied the same way everywhere.
+
+The Baring Head data from the RRL AMS changeover (1994 - 2006, Turnbull et al. 2017, section 3.3) and from 2009 - 2012
+used to be cut out with chains of .loc masks glued back with pd.merge(how='outer'), written again in every script:
+A_heidelberg_intercomparison.py cut 1994 - 2006 (snip / snip2), the harmonization cut 1994 - 2006 and 2009 - 2012,
+each with its own strict inequalities. Now the windows are IntervalSets, defined below, and screening a record is one
+call, identical in every script:
+    baringhead = BHD_HARMONIZATION.drop(baringhead, 'DEC_DECAY_CORR')
+
+An IntervalSet is a set of [start, end) windows (start included, end not), each with a reason. Overlapping or
+touching windows are merged (their reasons joined). A window that includes its end too, [start, end], is
+closed(start, end, reason): its end is moved up to the next float after end, which is the same thing for float dates.
+The Baring Head windows below are closed, because the masks they replace (x < 1994 | x > 2006) dropped both ends. They can be combined like sets:
+    a | b    union          a & b    intersection          ~a    complement          a - b    difference
+Which dates are in a window is found with one np.searchsorted on the window starts, so screening n dates against k
+windows is O(n log k), and the dates don't need to be sorted. For sorted dates, segments() gives the runs of kept
+points as slices, and views() cuts numpy arrays into those runs without copying them.
+
+Example:
+keep = BHD_AMS_ANOMALY.keep_mask(x)                       # boolean mask, True outside the windows
+BHD_HARMONIZATION.reasons([1990.5, 2000.5, 2010.5])       # [None, 'RRL AMS ...', '2009 - 2012 ...']
+for x_part, y_part in zip(*BHD_HARMONIZATION.views(x, [x, y])): ...   # the kept stretches of a sorted record
+"""
+
+import numpy as np
+
+
+def closed(start, end, reason=None):
+    """ The window [start, end], end included, as an IntervalSet window """
+    return float(start), float(np.nextafter(float(end), np.inf)), reason
+
+
+def _join(*reasons):
+    """ reasons joined with '; ', each once, None left out """
+    out = []
+    for r in reasons:
+        for part in ([] if r is None else r.split('; ')):
+            if part not in out:
+                out.append(part)
+    return '; '.join(out) if out else None
+
+
+class IntervalSet:
+    """ Sorted, non-overlapping [start, end) windows with reasons. windows: (start, end) or (start, end, reason) """
+
+    def __init__(self, windows=()):
+        rows = sorted((float(w[0]), float(w[1]), w[2] if len(w) > 2 else None) for w in windows)
+        merged = []
+        for start, end, reason in rows:
+            if end < start:
+                raise ValueError('window %g - %g ends before it starts' % (start, end))
+            if start == end:
+                continue  # [a, a) is empty
+            if merged and start <= merged[-1][1]:
+                last = merged[-1]
+                merged[-1] = (last[0], max(last[1], end), _join(last[2], reason))
+            else:
+                merged.append((start, end, reason))
+        self.windows = merged
+        self.starts = np.array([w[0] for w in merged], dtype=np.float64)
+        self.ends = np.array([w[1] for w in merged], dtype=np.float64)
+        self.labels = np.array([w[2] for w in merged], dtype=object)
+
+    def __repr__(self):
+        return 'IntervalSet(%r)' % (self.windows,)
+
+    def __len__(self):
+        return len(self.windows)
+
+    def __iter__(self):
+        return iter(self.windows)
+
+    def __eq__(self, other):
+        return isinstance(other, IntervalSet) and self.windows == other.windows
+
+    # set operations
+    def union(self, other):
+        return IntervalSet(self.windows + other.windows)
+
+    def intersection(self, other):
+        out = []
+        i = j = 0
+        while i < len(self.windows) and j < len(other.windows):
+            a, b = self.windows[i], other.windows[j]
+            start, end = max(a[0], b[0]), min(a[1], b[1])
+            if start < end:
+                out.append((start, end, _join(a[2], b[2])))
+            if a[1] < b[1]:
+                i += 1
+            else:
+                j += 1
+        return IntervalSet(out)
+
+    def complement(self, lo=-np.inf, hi=np.inf, reason=None):
+        """ The windows between these ones, within [lo, hi) """
+        edges = [lo] + [x for w in self.windows for x in w[:2]] + [hi]
+        gaps = [(max(edges[k], lo), min(edges[k + 1], hi), reason) for k in range(0, len(edges), 2)]
+        return IntervalSet([g for g in gaps if g[0] < g[1]])
+
+    def difference(self, other):
+        return self.intersection(other.complement())
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    def __invert__(self):
+        return self.complement()
+
+    # screening dates
+    def locate(self, dates):
+        """ The number of the window each date is in, -1 if none (or NaN) """
+        x = np.asarray(dates, dtype=np.float64)
+        idx = np.searchsorted(self.starts, x, side='right') - 1
+        inside = (idx >= 0) & (x < self.ends[np.maximum(idx, 0)]) if len(self) else np.zeros(x.shape, dtype=bool)
+        return np.where(inside, idx, -1)
+
+    def contains(self, dates):
+        """ Boolean array: True for dates inside a window """
+        return self.locate(dates) >= 0
+
+    def keep_mask(self, dates, keep_nan=False):
+        """
+        Boolean array: True for dates outside every window. Missing (NaN) and infinite dates are dropped, like the
+        < / > masks this replaces dropped NaN, unless keep_nan=True.
+        """
+        x = np.asarray(dates, dtype=np.float64)
+        keep = ~self.contains(x)
+        return keep if keep_nan else keep & np.isfinite(x)
+
+    def reasons(self, dates):
+        """ The reason each date is excluded (object array), None for kept dates """
+        idx = self.locate(dates)
+        return np.where(idx >= 0, self.labels[np.maximum(idx, 0)] if len(self) else None, None)
+
+    def drop(self, df, date_column, keep_nan=False):
+        """
+        The rows of df whose date_column is outside every window, with a fresh 0 ... n-1 index. Rows without a date are
+        dropped too, unless keep_nan=True.
+        """
+        return df.loc[self.keep_mask(df[date_column].to_numpy(dtype=np.float64), keep_nan)].reset_index(drop=True)
+
+    def segments(self, dates):
+        """ slices of the runs of kept points in sorted dates (one per stretch between windows), empty ones left out """
+        x = np.asarray(dates, dtype=np.float64)
+        cut = np.concatenate([[0], np.ravel(np.column_stack([np.searchsorted(x, self.starts, side='left'),
+                                                               np.searchsorted(x, self.ends, side='left')])),
+                              [len(x)]])
+        return [slice(int(cut[k]), int(cut[k + 1])) for k in range(0, len(cut), 2) if cut[k] < cut[k + 1]]
+
+    def views(self, dates, arrays):
+        """
+        The kept stretches of each array in arrays (numpy arrays lined up with the sorted dates): a list per array
+        of views (no copies) into it, one per segment.
+        """
+        parts = self.segments(dates)
+        return [[np.asarray(a)[s] for s in parts] for a in arrays]
+
+
+BHD_AMS_ANOMALY = IntervalSet([closed(1994, 2006,
+                                      'RRL AMS changeover, anomalously high values (Turnbull et al. 2017, 3.3)')])
+BHD_2009_2012 = IntervalSet([closed(2009, 2012, '2009 - 2012 RRL offset issue')])
+BHD_HARMONIZATION = BHD_AMS_ANOMALY | BHD_2009_2012  # what the harmonized dataset leaves out of Baring Head
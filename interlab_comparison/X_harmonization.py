@@ -0,0 +1,133 @@
+"""
+Harmonization of the offset-corrected Cape Grim record with the Baring Head record, as a library.
+
+B_CGO_BHD_harmonization.py builds the harmonized Southern Hemisphere background dataset, and other scripts
+(C_SOAR_TreeRingCleanup.py, A_DePolHolz_intercomparison.py) need it. They used to do
+"from B_CGO_BHD_harmonization import harmonized", which re-ran that whole script, plots and all, every time.
+Now the routine lives here, and its outputs are saved as harmonized_dataset and harmonized_summer (Parquet, see
+X_outputs.py). load_harmonized() reads those files, and only rebuilds them (like "make") when they are missing or
+older than the files they are made from (CapeGrim_offset and the Baring Head workbook).
+
+Example:
+harmonized, harmonized_summer = load_harmonized()
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from X_dataset_catalog import dataset, load_dataset
+from X_exclusions import BHD_HARMONIZATION
+from X_outputs import OutputBatch, load_output
+from X_radiocarbon import delta14c_to_f14c
+from X_seasons import in_season, season_year
+
+HARMONIZED = 'harmonized_dataset'  # catalog names of the saved outputs
+HARMONIZED_SUMMER = 'harmonized_summer'
+HARMONIZED_INPUTS = ['capegrim_offset', 'bhd_14co2']  # catalog datasets the harmonized files are made from
+# the columns harmonize() uses, so that only these are read (workbook names: loaded with canonical=False)
+CAPEGRIM_COLUMNS = ['Decimal_date', 'D14C', 'D14C_err', 'D14C_1', 'D14C_1_err']
+BHD_COLUMNS = ['DEC_DECAY_CORR', 'DELTA14C', 'DELTA14C_ERR', 'F14C', 'F14C_ERR']
+
+
+def harmonize(capegrim, baringhead):
+    """
+    Merge the offset-corrected Cape Grim data (CapeGrim_offset.xlsx) with the Baring Head record
+    (BHD_14CO2_datasets_20211013.xlsx, with the workbook's column names), and return the harmonized dataset:
+    key (1 for Cape Grim, 0 for Baring Head), Decimal_date, D14C_offsetcorrected, D14C_offsetcorrected_err,
+    F14C, F14C_err; sorted by date. Only the CAPEGRIM_COLUMNS and BHD_COLUMNS are used; other columns may be there.
+    """
+    capegrim = capegrim.copy()
+    baringhead = baringhead.dropna(subset=['DELTA14C'])
+    # snip out 1994 - 2006, and 2009 - 2012 from Baring Head Record (see X_exclusions.py)
+    baringhead = BHD_HARMONIZATION.drop(baringhead, 'DEC_DECAY_CORR')
+    baringhead = baringhead[BHD_COLUMNS]  # the rest of the workbook (SITE, NZ, DATE_COLL, FLAG, ...) isn't needed
+    baringhead = baringhead.rename(columns={"DEC_DECAY_CORR": "Decimal_date"})
+    baringhead = baringhead.rename(columns={"DELTA14C": "D14C"})
+    baringhead = baringhead.rename(columns={"DELTA14C_ERR": "D14C_err"})
+    baringhead = baringhead.rename(columns={"F14C_ERR": "F14C_err"})
+    capegrim['key'] = np.ones(len(capegrim))
+    baringhead['key'] = np.zeros(len(baringhead))
+
+    capegrim['D14C_offsetcorrected'] = capegrim['D14C_1']
+    capegrim['D14C_offsetcorrected_err'] = capegrim['D14C_1_err']
+    baringhead['D14C_offsetcorrected'] = baringhead['D14C']
+    baringhead['D14C_offsetcorrected_err'] = baringhead['D14C_err']
+
+    # Heidelberg doesn't give FM, so it is back-calculated:
+    # age_corr = exp((1950 - sample year)/8267)
+    # D14C = 1000*(FM-1)
+    # Del14C = 1000*(FM*age_corr-1)
+    x = capegrim['Decimal_date']
+    y = capegrim['D14C_offsetcorrected_err']  # make sure to use the correct / offset corrected data for this!
+    fm = delta14c_to_f14c(y, x)
+    fm_err = capegrim['D14C_1_err'] / 1000
+    x = np.float64(x)  # in order to create dictionary, first change briefly to array
+    fm = np.float64(fm)
+    new_frame = pd.DataFrame({"Decimal_date": x, "F14C": fm, "F14C_err": fm_err})  # common column to merge on.
+
+    capegrim = pd.merge(capegrim, new_frame, how='outer')
+
+    harmonized = pd.merge(baringhead, capegrim, how='outer')  # have to merge in stages but it's all good.
+    harmonized.sort_values(by=['Decimal_date'], inplace=True)
+    harmonized = harmonized[['key', 'Decimal_date', 'D14C_offsetcorrected', 'D14C_offsetcorrected_err', 'F14C', 'F14C_err']]
+    return harmonized.reset_index(drop=True)
+
+
+def growing_season(harmonized, months=None):
+    """
+    Only the harmonized data from the Southern Hemisphere growing season (November to February), as used in Rachel's
+    thesis to compare with tree rings. Adds a "decimals" column with the fractional part of the date (to 4 decimals),
+    and "season_year", the year the season ends in (see X_seasons.py), so November 1990 - February 1991 is 1991.
+    By default the season is mid-November to mid-February (decimals > .870 or < .124), as it always was here;
+    months=(11, 12, 1, 2) keeps whole calendar months instead.
+    """
+    harmonized_summer = harmonized.reset_index(drop=True)  # re-index the harmonized dataset to avoid confusion
+    x = harmonized_summer['Decimal_date'].to_numpy(dtype=np.float64)
+    # the fraction of the year cut to 4 decimals, which the string slicing (str(date)[4:9]) used to give
+    harmonized_summer['decimals'] = np.floor(np.round((x - np.floor(x)) * 1e4, 6)) / 1e4
+    harmonized_summer['season_year'] = season_year(x)
+    if months is None:
+        keep = (harmonized_summer['decimals'] < .124) | (harmonized_summer['decimals'] > .870)
+    else:
+        keep = in_season(x, months)
+    return harmonized_summer.loc[keep]
+
+
+def _artifact_paths():
+    return dataset(HARMONIZED).path, dataset(HARMONIZED_SUMMER).path
+
+
+def build_harmonized(capegrim=None, baringhead=None):
+    """ Build the harmonized and growing-season datasets, save them, and return them """
+    if capegrim is None:
+        capegrim = load_dataset('capegrim_offset', columns=CAPEGRIM_COLUMNS, canonical=False)
+    if baringhead is None:
+        baringhead = load_dataset('bhd_14co2', columns=BHD_COLUMNS, canonical=False)
+    harmonized = harmonize(capegrim, baringhead)
+    harmonized_summer = growing_season(harmonized)
+
+    path, summer_path = _artifact_paths()
+    with OutputBatch(verbose=False) as out:
+        out.save(harmonized, path)
+        out.save(harmonized_summer, summer_path)
+    return harmonized, harmonized_summer
+
+
+def harmonized_is_current():
+    """ True if both harmonized files exist and are newer than every input that exists """
+    outputs = _artifact_paths()
+    if not all(os.path.exists(p) for p in outputs):
+        return False
+    inputs = [dataset(name).read_path() for name in HARMONIZED_INPUTS]
+    newest_input = max([os.path.getmtime(p) for p in inputs if os.path.exists(p)], default=0)
+    return min(os.path.getmtime(p) for p in outputs) >= newest_input
+
+
+def load_harmonized(refresh=False):
+    """
+    Return (harmonized, harmonized_summer), read from the saved files. They are rebuilt first if they are missing,
+    out of date, or refresh=True.
+    """
+    if refresh or not harmonized_is_current():
+        return build_harmonized()
+    return tuple(load_output(p) for p in _artifact_paths())
@@ -0,0 +1,66 @@
+"""
+The Heidelberg - RRL offsets found in A_heidelberg_intercomparison.py, and the time periods they belong to.
+
+These used to be imported straight out of A_heidelberg_intercomparison.py by the C_*_cleanup.py scripts, which re-ran
+that whole script (every Monte Carlo smoothing, every plot) just to get a handful of numbers. They live here now,
+so importing them is instant. A_heidelberg_intercomparison.py imports them from here too, so there is still only one
+place to change them when the intercomparison is re-done.
+
+PERIODS: the time bins used for the pre- and post-AMS offsets.
+OFFSET_TABLE: PERIODS as an OffsetTable (X_offset_table.py), periods closed on the left (1991 <= Decimal_date < 1994).
+    The C_*_cleanup.py scripts apply it (or a table made from PERIODS, with the ends their record needs) in one call.
+offset1 ... offset6, error1 ... error6: the offset for each period and its 1-sigma error (per mil)
+n, cutoff: Monte Carlo iterations and CCGCRV cutoff used for the smoothed offset
+offset_points(): the DataFrame that feeds the smoothed offset (called "dff" in the older scripts)
+"""
+
+import numpy as np
+import pandas as pd
+from X_offset_table import OffsetTable
+
+# PRE-AMS AT RRL
+offset1 = 1.80  # 1986 - 1991
+offset2 = 1.88  # 1991 - 1994
+offset3 = (offset2 + offset1) / 2  # 1994-2006. In this time period, we have removed data where RRL AMS
+# measurements were high. But, it's likely reasonable to say that we can prescribe the PRE-AMS offset to this data,
+# otherwise if we do not apply anything, there will be a "step" in the harmonized dataset.
+offset4 = 0.49  # 2006 - 2016
+offset5 = 0   # 2006 - 2009
+offset6 = -.52  # 2012 - 2016.
+# One can see that if we seperate the data in from 06 - 09 and 12 - 16, the sign in the difference changes.
+# Initially, I would think to apply a broad "post-AMS" offset to both two time periods (06-09, 12-16); however,
+# since we know there is a sign change, it may be better to leave the intermedite time period at 0.
+error1 = .18
+error2 = .16
+error3 = np.sqrt(error2**2 + error1) / 2  # propagating the error from the average of offset1 and offset2 above.
+error4 = 0.07
+error5 = 0
+error6 = 0.06
+
+n = 1000  # set the amount of times the code will iterate (set to 10,000 once everything is final)
+cutoff = 667  # FFT filter cutoff
+
+# (name, start, end, offset, error) of the time bins the offsets are applied to in the C_*_cleanup.py scripts.
+# NOTE: 2006 - 2009 gets offset4 (the broad post-AMS offset) and 2009 - 2012 gets offset5. Each cleanup script adjusts
+# the open ends to its own record (Cape Grim puts everything before 1991 in h1, Neumayer also corrects data before 1986
+# with offset1, and Neumayer and MCQ keep everything after 2012 in h6).
+PERIODS = [
+    ('h1', 1986, 1991, offset1, error1),
+    ('h2', 1991, 1994, offset2, error2),
+    ('h3', 1994, 2006, offset3, error3),
+    ('h4', 2006, 2009, offset4, error4),
+    ('h5', 2009, 2012, offset5, error5),
+    ('h6', 2012, 2016, offset6, error6),
+]
+OFFSET_TABLE = OffsetTable(PERIODS, closed='left')  # a date on a bound (e.g. 1991.0) is in the period starting there
+
+
+def offset_points():
+    """
+    The offsets placed at the start, middle and end of each time-chunk, which are smoothed with CCGCRV to make the
+    "smoothed offset". Offset 2 is left out because offset 3 only comes from offsets 1 and 2.
+    """
+    y = [offset1, offset1, offset1, offset3, offset3, offset3, offset4, offset4, offset4, offset6, offset6, offset6]
+    y_err = [error1, error1, error1, error3, error3, error3, error4, error4, error4, error6, error6, error6]
+    x = [1986, (1986 + 1991)/2, 1992, 1994, (1994 + 2005)/2, 2005, 2006, (2006 + 2009)/2, 2009, 2012, (2012 + 2016)/2, 2016]  # find the middle of each time- chunk.
+    return pd.DataFrame({"offset_xs": x, "offset_ys": y, "offset_errs": y_err})
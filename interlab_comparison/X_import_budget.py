@@ -0,0 +1,89 @@
+"""
+A check that importing the numerical core stays fast.
+
+X_miller_curve_algorithm.py used to import scipy.optimize, scipy.stats, scipy.interpolate, scipy.fftpack and pandas
+up front, and X_my_functions.py imported PyAstronomy and tabulate, so every script (and every worker process of
+load_datasets and X_pipeline.py) paid 1.2 s or more before doing anything. Those imports are now deferred to where
+they are used, which brought "import X_miller_curve_algorithm" down from 1.24 s to about 0.15 s. Nothing stops a new
+top-level import from quietly undoing that, so this runs
+    python -X importtime -c "import X_my_functions, X_miller_curve_algorithm"
+in a fresh python process (in this folder, so our own modules are found) and fails if
+    - the import takes longer than the budget (BUDGET seconds by default; the fastest of a few runs counts, because
+      the first run after a change also pays for writing .pyc files), or
+    - any of the DEFERRED modules was imported at all. This doesn't depend on how fast the computer is.
+On failure, the modules that took the most time are listed, which is usually enough to find the culprit.
+pandas is not in DEFERRED: X_my_functions uses it at the top level, and it is most of what is left (~0.35 s).
+
+From the command line (exit code 1 if over budget):
+python X_import_budget.py
+python X_import_budget.py --budget 1.5 --runs 5     # e.g. on a slow network drive
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODULES = ['X_my_functions', 'X_miller_curve_algorithm']
+BUDGET = 0.75  # seconds
+DEFERRED = ['scipy.optimize', 'scipy.stats', 'scipy.interpolate', 'scipy.fftpack', 'matplotlib', 'seaborn',
+            'PyAstronomy', 'tabulate']
+
+
+def import_times(modules=MODULES, python=sys.executable):
+    """
+    Import modules in a fresh python with -X importtime. Returns a dict of every module imported ->
+    (self, cumulative) seconds, and the total seconds the import of modules took.
+    """
+    code = 'import %s' % ', '.join(modules)
+    result = subprocess.run([python, '-X', 'importtime', '-c', code], cwd=HERE, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError('%s failed:\n%s' % (code, result.stderr))
+    times = {}
+    total = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or line.endswith('imported package'):
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        own, cumulative = int(own) / 1e6, int(cumulative) / 1e6
+        if not name.startswith('   ') and name.strip() in modules:  # a top-level import of the -c line
+            total += cumulative
+        times[name.strip()] = (own, cumulative)
+    return times, total
+
+
+def check(budget=BUDGET, runs=3, modules=MODULES, deferred=DEFERRED):
+    """ Run import_times runs times; returns (ok, message) for the fastest run """
+    best = None
+    for i in range(runs):
+        times, total = import_times(modules)
+        if best is None or total < best[1]:
+            best = (times, total)
+    times, total = best
+    problems = []
+    if total > budget:
+        problems.append('import took %.3f s, over the budget of %.3f s' % (total, budget))
+    loaded = [m for m in deferred if m in times]
+    if loaded:
+        problems.append('these should only be imported where they are used: %s' % ', '.join(loaded))
+    if not problems:
+        return True, 'import %s: %.3f s (budget %.3f s)' % (', '.join(modules), total, budget)
+    slowest = sorted(times.items(), key=lambda item: item[1][0], reverse=True)[:10]
+    lines = ['%-40s %8.3f s  (%.3f s with what it imports)' % (name, own, cumulative)
+             for name, (own, cumulative) in slowest]
+    return False, '\n'.join(problems + ['slowest modules:'] + lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check that importing the numerical core stays within its budget')
+    parser.add_argument('--budget', type=float, default=BUDGET, help='seconds (default: %(default)s)')
+    parser.add_argument('--runs', type=int, default=3, help='imports to time; the fastest counts (default: %(default)s)')
+    args = parser.parse_args(argv)
+    ok, message = check(args.budget, max(args.runs, 1))
+    print(message)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""
+All the atmospheric and tree-ring radiocarbon measurements in one indexed SQLite table.
+
+Every analysis picks its data out of whole DataFrames with boolean masks: df.loc[df['Site'] == 'Tortel island'],
+heidelberg.loc[(heidelberg['Decimal_date'] >= 1987) & (heidelberg['Decimal_date'] <= 1991)], #location == 'CGO', ...
+Each of those scans every row. Here the records from the catalog datasets (see SOURCES) are stored once, in the same
+columns whatever workbook they came from:
+    source                  catalog dataset the row came from
+    site, lab, method       e.g. 'CGO', 'Heidelberg', 'gas counting'; 'Tortel island', 'RRL', 'tree ring'
+    date                    decimal year used in the analyses; date_start / date_end: the sampling window, if known
+    F14C, F14C_err, D14C, D14C_err                  as reported (missing ones are NULL)
+    D14C_corr, D14C_corr_err                        offset-corrected D14C, for the records we corrected
+    flag, comment           the lab's quality flag and any note on the row (e.g. the CBL_flag of the tree rings)
+    ring_code               tree-ring code, e.g. BSP-T1-C2-R13
+with indexes on (site, date) and (lab, date), so a site or lab and a time period is an index lookup.
+
+The database is a cache: measurements.sqlite next to the scripts (or RADIOCARBON_MEASUREMENT_DB), not kept in git.
+update() imports any source whose file has changed since it was last imported (or wasn't imported yet), and
+sources whose files aren't available are skipped with a warning.
+
+Example:
+db = MeasurementDB()
+db.update()
+cgo = db.select(['date', 'D14C', 'D14C_err'], site='CGO', start=1987, end=1991)  # dict of numpy arrays
+tortel = db.frame(site='Tortel island')  # or as a DataFrame
+python X_measurement_db.py update / sites
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import warnings
+import numpy as np
+import pandas as pd
+from X_dataset_cache import file_hash
+from X_dataset_catalog import dataset, load_datasets
+from X_dates import decimal_year
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+COLUMNS = ['source', 'site', 'lab', 'method', 'date', 'date_start', 'date_end', 'F14C', 'F14C_err', 'D14C', 'D14C_err',
+           'D14C_corr', 'D14C_corr_err', 'flag', 'comment', 'ring_code']
+TEXT_COLUMNS = ['source', 'site', 'lab', 'method', 'flag', 'comment', 'ring_code']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    site TEXT NOT NULL,
+    lab TEXT NOT NULL,
+    method TEXT,
+    date REAL NOT NULL,
+    date_start REAL,
+    date_end REAL,
+    F14C REAL,
+    F14C_err REAL,
+    D14C REAL,
+    D14C_err REAL,
+    D14C_corr REAL,
+    D14C_corr_err REAL,
+    flag TEXT,
+    comment TEXT,
+    ring_code TEXT
+);
+CREATE INDEX IF NOT EXISTS measurements_site_date ON measurements (site, date);
+CREATE INDEX IF NOT EXISTS measurements_lab_date ON measurements (lab, date);
+CREATE INDEX IF NOT EXISTS measurements_source ON measurements (source);
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY,
+    path TEXT,
+    sha1 TEXT,
+    rows INTEGER
+);
+"""
+
+
+def _heidelberg(df):
+    """ the offset-corrected Heidelberg records written by the C_*_cleanup.py scripts """
+    return pd.DataFrame({'site': df['#location'], 'lab': 'Heidelberg', 'method': 'gas counting',
+                         'date': df['Decimal_date'], 'D14C': df['D14C'], 'D14C_err': df['D14C_err'],
+                         'D14C_corr': df['D14C_2'], 'D14C_corr_err': df['D14C_2_err']})
+
+
+def _baring_head(df):
+    return pd.DataFrame({'site': 'BHD', 'lab': 'RRL', 'method': df['METH_COLL'],
+                         'date': df['Decimal_date'],
+                         'date_start': decimal_year(pd.to_datetime(df['DATE_ST'], errors='coerce')),
+                         'date_end': decimal_year(pd.to_datetime(df['DATE_END'], errors='coerce')),
+                         'F14C': df['F14C'], 'F14C_err': df['F14C_ERR'], 'D14C': df['D14C'], 'D14C_err': df['D14C_err'],
+                         'flag': df['FLAG']})
+
+
+def _soar_tree_rings(df):
+    """ every SOAR ring, including the ones C_SOAR_TreeRingCleanup.py removed; the reason is in comment """
+    return pd.DataFrame({'site': df['Site'], 'lab': 'RRL', 'method': 'tree ring', 'date': df['DecimalDate'],
+                         'F14C': df['F14C'], 'F14C_err': df['F14Cerr'],
+                         'D14C': df['∆14C'], 'D14C_err': df['∆14Cerr'],
+                         'flag': df['C14Flag'], 'comment': df['CBL_flag'], 'ring_code': df['Ring code']})
+
+
+def _graven(df):
+    """ the Scripps flask records of Graven et al. 2012, with the offset correction from Graven_cleanup_offsetcalc.py """
+    return pd.DataFrame({'site': df['Site'], 'lab': 'SIO/LLNL', 'method': 'flask', 'date': df['Decimal_date'],
+                         'D14C': df['Δ14C (‰)'], 'D14C_err': df['σTot\xa0(‰)'],
+                         'D14C_corr': df['D14C_offset_corrected'],
+                         'D14C_corr_err': df['D14C_offset_corrected_error'], 'comment': df['SIO ID']})
+
+
+# catalog dataset -> function making the rows of the measurements table from it (loaded with canonical=True)
+SOURCES = {
+    'capegrim_offset': _heidelberg,
+    'neumayer_offset': _heidelberg,
+    'mcq_offset': _heidelberg,
+    'bhd_14co2': _baring_head,
+    'soar_tree_rings_flags': _soar_tree_rings,
+    'graven_offset_corrections': _graven,
+}
+
+
+def default_db_path():
+    return os.environ.get('RADIOCARBON_MEASUREMENT_DB', os.path.join(HERE, 'measurements.sqlite'))
+
+
+def to_rows(source, df):
+    """ The rows of the measurements table for a DataFrame of the catalog dataset source, with every column in order """
+    rows = SOURCES[source](df).reset_index(drop=True)
+    rows['source'] = source
+    rows = rows.reindex(columns=COLUMNS)
+    for c in COLUMNS:
+        if c in TEXT_COLUMNS:
+            rows[c] = rows[c].astype(object).where(rows[c].notna(), None).map(lambda v: v if v is None else str(v))
+        else:
+            rows[c] = pd.to_numeric(rows[c], errors='coerce').astype(float)
+    return rows.loc[rows['date'].notna()]
+
+
+class MeasurementDB:
+    """ The measurements database. path: the SQLite file (default: measurements.sqlite, or RADIOCARBON_MEASUREMENT_DB) """
+
+    def __init__(self, path=None):
+        self.path = path or default_db_path()
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def stale_sources(self, sources=None):
+        """ {source: (file, sha1)} of the sources whose file exists and differs from the one last imported """
+        stored = dict((s, h) for s, h in self.conn.execute('SELECT source, sha1 FROM sources'))
+        stale = {}
+        for source in sources or SOURCES:
+            path = dataset(source).read_path()
+            if not os.path.exists(path):
+                warnings.warn('%s: %s not found, not imported' % (source, path))
+                continue
+            sha1 = file_hash(path)
+            if stored.get(source) != sha1:
+                stale[source] = (path, sha1)
+        return stale
+
+    def import_frame(self, source, df, path=None, sha1=None):
+        """ Replace the rows of source with those made from df (the catalog dataset, canonical column names) """
+        rows = to_rows(source, df)
+        with self.conn:
+            self.conn.execute('DELETE FROM measurements WHERE source = ?', (source,))
+            self.conn.executemany('INSERT INTO measurements (%s) VALUES (%s)' % (', '.join(COLUMNS),
+                                                                                 ', '.join('?' * len(COLUMNS))),
+                                  rows.itertuples(index=False, name=None))
+            self.conn.execute('INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)', (source, path, sha1, len(rows)))
+        return len(rows)
+
+    def update(self, sources=None, force=False, verbose=True):
+        """ Import the sources (default: all of SOURCES) that changed since their last import, or all with force=True """
+        stale = self.stale_sources(sources)
+        if force:
+            stale.update((s, (dataset(s).read_path(), None)) for s in sources or SOURCES
+                         if s not in stale and os.path.exists(dataset(s).read_path()))
+        if not stale:
+            return {}
+        frames = load_datasets(list(stale), verbose=verbose)
+        counts = {}
+        for source, (path, sha1) in stale.items():
+            counts[source] = self.import_frame(source, frames[source], path, sha1 or file_hash(path))
+            if verbose:
+                print('imported %-28s %6d rows' % (source, counts[source]))
+        return counts
+
+    def _where(self, site=None, lab=None, source=None, method=None, flag=None, start=None, end=None):
+        clauses, args = [], []
+        for column, value in (('site', site), ('lab', lab), ('source', source), ('method', method), ('flag', flag)):
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple, set)):
+                clauses.append('%s IN (%s)' % (column, ', '.join('?' * len(value))))
+                args.extend(value)
+            else:
+                clauses.append(column + ' = ?')
+                args.append(value)
+        if start is not None:
+            clauses.append('date >= ?')
+            args.append(float(start))
+        if end is not None:
+            clauses.append('date <= ?')
+            args.append(float(end))
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), args
+
+    def select(self, columns=('date', 'D14C', 'D14C_err'), **where):
+        """
+        The measurements matching where, sorted by date, as {column: numpy array}; number columns are float64 arrays
+        (NaN for missing values) and text columns are object arrays.
+        where: site, lab, source, method, flag (a value, or a list of values), start, end (decimal years, inclusive)
+        """
+        columns = list(columns)
+        unknown = set(columns) - set(COLUMNS) - {'id'}
+        if unknown:
+            raise KeyError('not columns of the measurements table: %s' % ', '.join(sorted(unknown)))
+        clause, args = self._where(**where)
+        rows = self.conn.execute('SELECT %s FROM measurements%s ORDER BY date, id' % (', '.join(columns), clause),
+                                 args).fetchall()
+        values = list(zip(*rows)) if rows else [()] * len(columns)
+        out = {}
+        for c, v in zip(columns, values):
+            if c in TEXT_COLUMNS:
+                out[c] = np.array(v, dtype=object)
+            else:
+                out[c] = np.array([np.nan if x is None else x for x in v], dtype=np.float64)
+        return out
+
+    def frame(self, columns=None, **where):
+        """ Like select, but as a DataFrame, with every column by default """
+        return pd.DataFrame(self.select(columns or COLUMNS, **where))
+
+    def sites(self):
+        """ Number of measurements and date range for each site and lab """
+        return pd.read_sql_query('SELECT site, lab, COUNT(*) AS n, MIN(date) AS first, MAX(date) AS last '
+                                 'FROM measurements GROUP BY site, lab ORDER BY site, lab', self.conn)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build and look at the radiocarbon measurements database')
+    parser.add_argument('--db', default=None, help='database file (default: %s)' % default_db_path())
+    parser.add_argument('command', choices=['update', 'rebuild', 'sites'])
+    parser.add_argument('sources', nargs='*', help='catalog datasets to import (default: all in SOURCES)')
+    args = parser.parse_args(argv)
+
+    with MeasurementDB(args.db) as db:
+        if args.command == 'sites':
+            with pd.option_context('display.width', 200, 'display.max_rows', None):
+                print(db.sites().to_string(index=False))
+        else:
+            db.update(args.sources or None, force=args.command == 'rebuild')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -19,13 +19,28 @@ The function to be fit to the data is specified in the routines 'fitFunc' and 'h
 from __future__ import print_function
 
 import datetime
+import hashlib
+import inspect
+import time
+from collections import OrderedDict
 from math import pi, sqrt, atan2, sin, cos, pow, ceil, log
-from scipy import optimize
-from scipy import stats
-from scipy import interpolate
-from scipy import fftpack
+# scipy loads its subpackages (optimize, stats, interpolate, fftpack) the first time they are used, and pandas is only
+# needed for the tables some methods return, so importing this module (e.g. in a worker process, or for ccgCurve)
+# costs little more than numpy.
+import scipy
 import numpy
-import pandas as pd
+from X_dates import calendar_date
+
+# version of the file layout written by ccgFilter.save and read by ccgCurve
+CURVE_FILE_VERSION = 1
+
+# in-process LRU cache of fitted filters used by cachedFilter, resized (or turned off with 0) by setFilterCache
+FILTER_CACHE_SIZE = 32
+_filter_cache = OrderedDict()
+_filter_cache_info = {"maxsize": FILTER_CACHE_SIZE, "hits": 0, "misses": 0}
+
+# callbacks run with each ccgFilter after it is fit, see addTimingHook
+_timing_hooks = []
 
 # --------------------------------------------------
 # Define the function we are trying to fit
@@ -103,6 +118,74 @@ def partial(n, x, numpoly):
     return p
 
 
+# --------------------------------------------------
+def designMatrix(x, numpoly, numharm):
+    """ Build the matrix of basis functions of the fit function at times x.
+    Column n is the partial derivative of the function with respect to parameter n,
+    so that fitFunc(params, x, numpoly, numharm) == designMatrix(x, numpoly, numharm) @ params
+    when no amplitude gain factor is used.
+    """
+
+    x = numpy.asarray(x, dtype=float)
+    a = numpy.empty((x.size, numpoly + 2 * numharm))
+    for i in range(numpoly):
+        a[:, i] = numpy.power(x, i)
+    pi2 = 2 * pi * x
+    for i in range(numharm):
+        ix = 2 * i + numpoly
+        a[:, ix] = numpy.sin((i + 1) * pi2)
+        a[:, ix + 1] = numpy.cos((i + 1) * pi2)
+
+    return a
+
+
+# --------------------------------------------------
+def windowMeans(xgrid, values, start, end):
+    """ Average of a piecewise linear curve over windows [start, end].
+
+    xgrid is the sorted x values of the curve, values are the curve values at xgrid;
+    values can be 2d (one curve per row, e.g. a Monte Carlo ensemble evaluated on xgrid),
+    in which case one row of window means is returned per curve.
+    The integral of the curve is accumulated once with the trapezoid rule (exact for a
+    piecewise linear curve), so k windows cost O(n + k) instead of one integration each.
+    Windows with start == end return the curve value at that time, windows reaching
+    outside xgrid return nan.
+    """
+
+    xgrid = numpy.asarray(xgrid, dtype=float)
+    values = numpy.asarray(values, dtype=float)
+    start = numpy.atleast_1d(numpy.asarray(start, dtype=float))
+    end = numpy.atleast_1d(numpy.asarray(end, dtype=float))
+
+    dx = numpy.diff(xgrid)
+    slope = numpy.diff(values, axis=-1) / dx
+    cum = numpy.zeros(values.shape)
+    cum[..., 1:] = numpy.cumsum(0.5 * (values[..., 1:] + values[..., :-1]) * dx, axis=-1)
+
+    def integral(x):
+        """ integral of the curve from xgrid[0] to x """
+        j = numpy.clip(numpy.searchsorted(xgrid, x, side="right") - 1, 0, xgrid.size - 2)
+        h = x - xgrid[j]
+        return cum[..., j] + values[..., j] * h + 0.5 * slope[..., j] * h * h
+
+    lo = numpy.minimum(start, end)
+    hi = numpy.maximum(start, end)
+    width = hi - lo
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        means = (integral(hi) - integral(lo)) / width
+
+    # zero width windows are point values
+    point = width == 0
+    if numpy.any(point):
+        j = numpy.clip(numpy.searchsorted(xgrid, lo[point], side="right") - 1, 0, xgrid.size - 2)
+        means[..., point] = values[..., j] + slope[..., j] * (lo[point] - xgrid[j])
+
+    outside = (lo < xgrid[0]) | (hi > xgrid[-1])
+    means[..., outside] = numpy.nan
+
+    return means
+
+
 # --------------------------------------------------
 class ccgFilter():
     """
@@ -140,9 +223,17 @@ class ccgFilter():
         Set to True if you want to include a gain factor to the harmonic amplitude.
         This means the harmonics part of the function will have a linearly increasing
         or decreasing amplitude with time.
-    debug: boolean
-        If true, print out extra information during calculations.
-        Optional.  Default is false
+    sigmaclip : float
+        If > 0, iteratively reject outliers: points further than sigmaclip * rsd2 from
+        the smooth curve are flagged and the filter is refit without them, until the
+        flags stop changing.  Flagged points are re-tested on every pass and can be
+        re-admitted.  Optional.  Default is 0 (no rejection).
+    maxclipiter : int
+        Maximum number of refits when sigmaclip > 0.  Optional.  Default is 10
+    debug: boolean or function
+        If true, print out extra information during calculations, including the stage
+        timings.  If a function, call it with each line instead of printing, e.g.
+        debug=logging.getLogger(__name__).debug.  Optional.  Default is false
 
 
     Attributes
@@ -200,13 +291,32 @@ class ccgFilter():
     ninterp : int
         number of points in each of xinterp, smooth, trend
 
+    Outlier rejection (only meaningful when sigmaclip > 0)
+    flags : numpy array
+        Per-point flags in the order the data was passed in, 0 = used, 1 = rejected.
+        xp, yp and resid only hold the points with flag 0.
+    nclipped : int
+        Number of rejected points
+    clipiter : int
+        Number of refits done during outlier rejection
+
+    Instrumentation
+    timings : dict
+        Seconds spent in each stage of the computation, keyed by stage name:
+        'ingest', 'sampleinterval', 'leastsq', 'residuals', 'adjustend', 'lin_interp', 'fft',
+        'filter_short', 'filter_long', 'deriv', 'smooth_resid', 'sigma_clip' and 'total'.
+        Stages repeated by sigma clipping refits are summed; 'sigma_clip' is only the clipping
+        itself, so the stages other than 'total' add up to 'total'.
+    counts : dict
+        Number of times each stage in timings was run
+
     Misc.
     rsd1 : float
         Standard deviation of residuals about function
     rsd2 : float
         Standard deviation of residuals about smooth curve
-    debug : boolean
-        Flag for showing additional information during computation
+    debug : boolean or function
+        Where additional information during computation goes, see the debug input parameter
 
     Methods
     -------
@@ -234,6 +344,9 @@ class ccgFilter():
 
     Additional methods:
 
+    getWindowMeans(start, end, curve="smooth")
+      Returns the average of the smooth, trend or growth rate curve over each window [start, end].
+
     getFilterResponse(cutoff)
       Returns the value of the filter for frequencies 0 - 10 cycles/year at given cutoff
 
@@ -246,12 +359,23 @@ class ccgFilter():
       Get the dates when the smoothed curve crosses the trend curve.
       That is, when the detrended smooth seasonal cycle crosses 0.
 
+    save(filename)
+      Write the fitted curve to a .npz file that ccgCurve can read back without refitting.
+
+    select_cutoff(candidates, numharmonics=None, criterion="gcv")
+      Score short term cutoff / number of harmonics combinations by generalized and
+      leave-one-out cross validation, and return the best one with a table of scores.
+
     """
 
     def __init__(self, xp, yp, shortterm=80, longterm=667, sampleinterval=0, numpolyterms=3, numharmonics=4,
-                 timezero=-1, gap=0, use_gain_factor=False, debug=False):
+                 timezero=-1, gap=0, use_gain_factor=False, sigmaclip=0, maxclipiter=10, debug=False):
 
-        t0 = datetime.datetime.now()
+        self.debug = debug
+        self.timings = {}
+        self.counts = {}
+        t0 = time.perf_counter()
+        t = t0
 
         # save input data as numpy arrays
         # make sure data is sorted by x values
@@ -270,6 +394,7 @@ class ccgFilter():
         #	self.xp = numpy.array(xp)
         #	self.yp = numpy.array(yp)
         self.np = len(xp)
+        t = self._tick("ingest", t)
 
         # Calculate the average time interval between data points.
         # Set the sampleinterval variable if not set on the command line.
@@ -292,20 +417,19 @@ class ccgFilter():
                 self.sampleinterval = round(avginterval, 0)
             else:
                 self.sampleinterval = avginterval
-            if debug:
-                print("changed sampleinterval to ", self.sampleinterval)
+            self._debug("changed sampleinterval to %s", self.sampleinterval)
         else:
             self.sampleinterval = sampleinterval
 
         self.dinterval = self.sampleinterval / 365.0  # sample interval in decimal years
+        t = self._tick("sampleinterval", t)
 
         # If the data is actually an average over a relatively large time period,
         # such as annual averages, change the number of harmonics to an appropriate value.
         nh = int(365.0 / (self.sampleinterval * 2))
         if nh < numharmonics:
             self.numharm = nh
-            if debug:
-                print("changed numharmonics to ", numharmonics)
+            self._debug("changed numharmonics to %s", nh)
         else:
             self.numharm = numharmonics
 
@@ -315,12 +439,16 @@ class ccgFilter():
         self.numpoly = numpolyterms
         if timezero < 0:
             self.timezero = int(xp[0])
-            if debug:
-                print("changed timezero to ", self.timezero)
+            self._debug("changed timezero to %s", self.timezero)
         else:
             self.timezero = timezero
-        self.debug = debug
         self.numpm = self.numpoly + 2 * self.numharm
+        if self.use_gain_factor:
+            self.numpm += 1
+        self.gap = gap
+        self.sigmaclip = sigmaclip
+        self.maxclipiter = maxclipiter
+        self._filtcache = {}  # filter weights keyed by (fft length, interval, cutoff), reused between refits
 
         # apply filter to data
         self._filter_data(gap)
@@ -329,54 +457,160 @@ class ccgFilter():
         self._compute_deriv()
 
         # standard deviation of residuals about smooth curve
+        self._smooth_resid()
+
+        self.flags = numpy.zeros(self.np, dtype=int)
+        self.nclipped = 0
+        self.clipiter = 0
+        if self.sigmaclip > 0:
+            self._sigma_clip(c, gap)
+
+        self._tick("total", t0)
+        for stage, sec in self.timings.items():
+            self._debug("  %-15s %4d calls %12.6f s", stage, self.counts[stage], sec)
+        for hook in _timing_hooks:
+            hook(self)
+
+    # ------------------------------------------------------------
+    def _tick(self, stage, t, count=1):
+        """ Add the time since t to the timing of stage, and count more calls of it. Returns the current time. """
+
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + now - t
+        self.counts[stage] = self.counts.get(stage, 0) + count
+        return now
+
+    # ------------------------------------------------------------
+    def _debug(self, fmt, *args):
+        """ Pass a line of debug information (fmt % args) to self.debug: printed if it is True,
+        or given to it if it is a function, e.g. a logger's debug method.  Nothing if it is false.
+        """
+
+        if self.debug:
+            line = fmt % args if args else fmt
+            if self.debug is True:
+                print(line)
+            else:
+                self.debug(line)
+
+    # ------------------------------------------------------------
+    def _smooth_resid(self):
+        """ Standard deviation and mean of residuals about smooth curve """
+
+        t = time.perf_counter()
         r = self.yp - self.getSmoothValue(self.xp)
         self.rsd2 = numpy.std(r, ddof=1)
         self.rmean = numpy.mean(r)
-        if self.debug:
-            print("mean, rsd about smooth curve is", self.rmean, self.rsd2)
+        self._debug("mean, rsd about smooth curve is %s %s", self.rmean, self.rsd2)
+        self._tick("smooth_resid", t)
 
-        t1 = datetime.datetime.now()
-        if self.debug:
-            print("Total time elapsed: ", t1 - t0)
+    # ------------------------------------------------------------
+    def _sigma_clip(self, order, gap):
+        """ Iteratively flag points more than sigmaclip * rsd2 from the smooth curve and refit.
+
+        Without a gain factor the function is linear in its parameters, so the normal
+        equations of the full data set are built once and each refit only subtracts
+        (downdates) the rows of newly rejected points and adds back re-admitted ones.
+        With a gain factor the refit falls back to leastsq on the retained points.
+
+        The "sigma_clip" timing is only the clipping itself (building and updating the
+        normal equations, flagging points); the refits add to their own stages.
+        """
+
+        t = time.perf_counter()
+        xall = self.xp
+        yall = self.yp
+        flags = numpy.zeros(xall.size, dtype=bool)
+
+        if not self.use_gain_factor:
+            a = designMatrix(xall - self.timezero, self.numpoly, self.numharm)
+            ata = a.T @ a
+            aty = a.T @ yall
+
+        for it in range(self.maxclipiter):
+            r = numpy.abs(yall - self.getSmoothValue(xall))
+            newflags = r > self.sigmaclip * self.rsd2
+            # points outside the current curve (rejected end points) keep their flag
+            outside = numpy.isnan(r)
+            newflags[outside] = flags[outside]
+
+            if numpy.array_equal(newflags, flags):
+                break
+            if numpy.count_nonzero(~newflags) <= self.numpm + 1:
+                self._debug("  sigma clip stopped, too few points left")
+                break
+
+            if not self.use_gain_factor:
+                rem = newflags & ~flags
+                add = flags & ~newflags
+                ata = ata - a[rem].T @ a[rem] + a[add].T @ a[add]
+                aty = aty - a[rem].T @ yall[rem] + a[add].T @ yall[add]
+                params = numpy.linalg.solve(ata, aty)
+                covar = numpy.linalg.inv(ata)
+            else:
+                params = None
+                covar = None
+
+            flags = newflags
+            self.xp = xall[~flags]
+            self.yp = yall[~flags]
+            self.np = self.xp.size
+            self._tick("sigma_clip", t, count=0)
+            self._filter_data(gap, params, covar)
+            self._compute_deriv()
+            self._smooth_resid()
+            t = time.perf_counter()
+            self.clipiter = it + 1
+            self._debug("  sigma clip pass %d, %d points rejected", self.clipiter, numpy.count_nonzero(flags))
+
+        # flags back in the order of the input data
+        self.flags = numpy.zeros(xall.size, dtype=int)
+        self.flags[order] = flags
+        self.nclipped = int(numpy.count_nonzero(flags))
+        self._tick("sigma_clip", t)
 
     # ------------------------------------------------------------
-    def _filter_data(self, gap):
-        """ Perform the curve fitting/filtering """
+    def _filter_data(self, gap, params=None, covar=None):
+        """ Perform the curve fitting/filtering.
+        If params and covar are given, use them as the function fit instead of calling leastsq.
+        """
 
-        if self.debug:
-            print("=== Inside filter_data. ===")
-            print("  Number of points = %d, Sample Interval = %f days, %f years" % (
-                self.np, self.sampleinterval, self.dinterval))
-            print("  Cutoff 1 = %d, Cutoff 2 = %d" % (self.shortterm, self.longterm))
-            print("  Numpoly = %d, Numharm = %d" % (self.numpoly, self.numharm))
-            print("  Time zero = %f" % self.timezero)
-            print("  First point = %e,%e" % (self.xp[0], self.yp[0]))
-            print("  Last point = %e,%e" % (self.xp[-1], self.yp[-1]))
+        self._debug("=== Inside filter_data. ===")
+        self._debug("  Number of points = %d, Sample Interval = %f days, %f years",
+                    self.np, self.sampleinterval, self.dinterval)
+        self._debug("  Cutoff 1 = %d, Cutoff 2 = %d", self.shortterm, self.longterm)
+        self._debug("  Numpoly = %d, Numharm = %d", self.numpoly, self.numharm)
+        self._debug("  Time zero = %f", self.timezero)
+        self._debug("  First point = %e,%e", self.xp[0], self.yp[0])
+        self._debug("  Last point = %e,%e", self.xp[-1], self.yp[-1])
 
         # Remove the timezero value from the x data so that coefficients will be relative to the timezero date
         work = self.xp - self.timezero
+        t = time.perf_counter()
 
         # Fit the function to the data
-        pm = [1.0] * self.numpm  # initial parameter values set to 1
-        if self.use_gain_factor:  # add amplitude gain factor parameter with initial value of 0
-            pm.append(0)
-            self.numpm += 1
-        self.params, self.covar, info, mesg, ier = optimize.leastsq(errfunc, pm, full_output=1,
-                                                                    args=(work, self.yp, self.numpoly, self.numharm))
-        if self.debug:
-            print("  Finished leastsq")
-            for i in range(self.numpm):
-                print("    param[%d] = %e" % (i, self.params[i]))
-            print("    Covar = ", self.covar)
+        if params is None:
+            pm = [1.0] * (self.numpoly + 2 * self.numharm)  # initial parameter values set to 1
+            if self.use_gain_factor:  # add amplitude gain factor parameter with initial value of 0
+                pm.append(0)
+            self.params, self.covar, info, mesg, ier = scipy.optimize.leastsq(errfunc, pm, full_output=1,
+                                                                              args=(work, self.yp, self.numpoly, self.numharm))
+        else:
+            self.params = params
+            self.covar = covar
+        t = self._tick("leastsq", t)
+        self._debug("  Finished leastsq")
+        for i in range(self.numpm):
+            self._debug("    param[%d] = %e", i, self.params[i])
+        self._debug("    Covar = %s", self.covar)
 
         #  calculate residuals from fit
         self.resid = self.yp - fitFunc(self.params, work, self.numpoly, self.numharm)
         rmean = numpy.mean(self.resid)
         self.rsd1 = numpy.std(self.resid, ddof=1)
         self.chisq = numpy.sum(self.resid * self.resid) / (self.np - self.numpm)  # reduced chi square
-        if self.debug:
-            print("  Finished residuals")
-            print("    rmean = %e, rsd = %e, chisq = %e" % (rmean, self.rsd1, self.chisq))
+        self._debug("  Finished residuals")
+        self._debug("    rmean = %e, rsd = %e, chisq = %e", rmean, self.rsd1, self.chisq)
 
         # from http://docs.scipy.org/doc/scipy/reference/generated/scipy.optimize.leastsq.html#scipy.optimize.leastsq
         # "This matrix must be multiplied by the residual variance to get the covariance of the parameter estimates - see curve_fit."
@@ -387,29 +621,28 @@ class ccgFilter():
         # calculate variance of function fit
         self.funcvar = self._varnce()
         self.polyvar = self._varnce(poly=True)
-        if self.debug:
-            print("  variance is", self._varnce())
-            print("  Function variance is", self.funcvar)
+        self._debug("  Function variance is %s", self.funcvar)
+        t = self._tick("residuals", t)
 
         # fit linear line to ends of residual data
         # subtract this from residuals so ends are ~ near 0
         ca, cb = self._adjustend(work, self.resid, self.longterm)
         resid = self.resid - (ca + cb * work)
-        if self.debug:
-            print("  Finished adjustend")
-            print("    ca = %e, cb = %e" % (ca, cb))
-            print("    x[0] = %e, x[%d] = %e" % (work[0], self.np, work[-1]))
-            print("    resid[0] = %e, resid[%d] = %e" % (resid[0], self.np, resid[-1]))
+        t = self._tick("adjustend", t)
+        self._debug("  Finished adjustend")
+        self._debug("    ca = %e, cb = %e", ca, cb)
+        self._debug("    x[0] = %e, x[%d] = %e", work[0], self.np, work[-1])
+        self._debug("    resid[0] = %e, resid[%d] = %e", resid[0], self.np, resid[-1])
 
         # Interpolate data at evenly spaced intervals (self.sampleinterval)
         self.xinterp, yinterp = self._lin_interp(work, resid, gap)
         self.ninterp = len(self.xinterp)
+        t = self._tick("lin_interp", t)
 
-        if self.debug:
-            print("  Interpolated points.")
-            print("    Number of interpolated points: %d" % (self.ninterp))
-            print("    xinterp[np-1] = %e, x[0] = %e" % (self.xinterp[-1], self.xinterp[0]))
-            print("    yinterp[np-1] = %e, y[0] = %e" % (yinterp[-1], yinterp[0]))
+        self._debug("  Interpolated points.")
+        self._debug("    Number of interpolated points: %d", self.ninterp)
+        self._debug("    xinterp[np-1] = %e, x[0] = %e", self.xinterp[-1], self.xinterp[0])
+        self._debug("    yinterp[np-1] = %e, y[0] = %e", yinterp[-1], yinterp[0])
 
         # do fft on interpolated data
         # we'll zero pad the data to an even power of 2
@@ -420,21 +653,22 @@ class ccgFilter():
         nend = nstart + yinterp.size
         zzz[nstart:nend] = yinterp
 
-        fft = fftpack.rfft(zzz)
+        fft = scipy.fftpack.rfft(zzz)
+        t = self._tick("fft", t)
 
         # do short term filter
-        if self.debug:
-            print("  Do short term filter, cutoff = ", self.shortterm)
+        self._debug("  Do short term filter, cutoff = %s", self.shortterm)
         a = self._freq_filter(fft, self.dinterval, self.shortterm)
-        yfilt = fftpack.irfft(a)
+        yfilt = scipy.fftpack.irfft(a)
         self.smooth = yfilt[nstart:nend] + ca + cb * self.xinterp
+        t = self._tick("filter_short", t)
 
         # do long term filter
-        if self.debug:
-            print("  Do long term filter, cutoff = ", self.longterm)
+        self._debug("  Do long term filter, cutoff = %s", self.longterm)
         a = self._freq_filter(fft, self.dinterval, self.longterm)
-        yfilt = fftpack.irfft(a)
+        yfilt = scipy.fftpack.irfft(a)
         self.trend = yfilt[nstart:nend] + ca + cb * self.xinterp
+        self._tick("filter_long", t)
 
         # add linear fit and timezero back in to interpolated values
         self.yinterp = yinterp + ca + cb * self.xinterp
@@ -453,7 +687,7 @@ class ccgFilter():
 
         z = numpy.where((x <= x[0] + c) | (x >= x[-1] - c))
 
-        slope, intercept, r_value, p_value, std_err = stats.linregress(x[z], y[z])
+        slope, intercept, r_value, p_value, std_err = scipy.stats.linregress(x[z], y[z])
         return intercept, slope
 
     # ------------------------------------------------------------
@@ -489,7 +723,7 @@ class ccgFilter():
         yy.append(ya)
 
         # calculate interpolation values at each x point
-        f = interpolate.interp1d(xx, yy)
+        f = scipy.interpolate.interp1d(xx, yy)
 
         # if a gap setting was not made, use normal linear interpolation
         # to get equally space points.
@@ -527,12 +761,16 @@ class ccgFilter():
             cutoff - cutoff value in days
         """
 
-        n2 = len(fft)
+        n2 = fft.shape[-1]
         cf = cutoff / 365.0  # convert cutoff to years
         cutoff2 = 1.0 / cf  # change to cycles/year
 
-        freq = fftpack.rfftfreq(n2, dinterv)  # get array of frequencies
-        rw = self._vfilt(freq, cutoff2, 6)  # get filter value at frequencies
+        key = (n2, dinterv, cutoff)
+        rw = self._filtcache.get(key)
+        if rw is None:
+            freq = scipy.fftpack.rfftfreq(n2, dinterv)  # get array of frequencies
+            rw = self._vfilt(freq, cutoff2, 6)  # get filter value at frequencies
+            self._filtcache[key] = rw
         filt = fft * rw  # apply filter values to fft
 
         return filt
@@ -588,15 +826,18 @@ class ccgFilter():
         This is the derivative of self.trend + derivative of polynomial part of the function
         """
 
+        t = time.perf_counter()
+
         # Connect trend data points with spline to get derivative at each point
-        tck = interpolate.splrep(self.xinterp, self.trend, s=0.0)
-        self.deriv = interpolate.splev(self.xinterp, tck, der=1)
+        tck = scipy.interpolate.splrep(self.xinterp, self.trend, s=0.0)
+        self.deriv = scipy.interpolate.splev(self.xinterp, tck, der=1)
 
         # compute derivative of polynomial at each interpolated data point
         # we need to reverse order of polynomial coefficients for input into poly1d
         poly = numpy.poly1d(self.params[self.numpoly - 1::-1])
         pd = numpy.polyder(poly)
         self.deriv += pd(self.xinterp - self.timezero)
+        self._tick("deriv", t)
 
     # ------------------------------------------------------------
     def _varnce(self, poly=False):
@@ -649,25 +890,23 @@ class ccgFilter():
         ytemp[int(n0 / 2)] = 1.0
 
         # do fft
-        fft = fftpack.rfft(ytemp)
+        fft = scipy.fftpack.rfft(ytemp)
 
         # do filter
-        if self.debug:
-            print("  In filtvar, do filter, cutoff = ", cutoff, "n0 is ", n0)
+        self._debug("  In filtvar, do filter, cutoff = %s n0 is %s", cutoff, n0)
 
         a = self._freq_filter(fft, self.dinterval, cutoff)
-        weights = fftpack.irfft(a)
+        weights = scipy.fftpack.irfft(a)
 
         # Compute sum of squares of weights
         ssw = numpy.sum(weights * weights)
-        if self.debug:
-            print("ssw =", ssw)
+        self._debug("ssw = %s", ssw)
 
         # calculate residuals from smooth/trend curve
         if which == "short":
-            f = interpolate.interp1d(self.xinterp, self.smooth, bounds_error=False)
+            f = scipy.interpolate.interp1d(self.xinterp, self.smooth, bounds_error=False)
         else:
-            f = interpolate.interp1d(self.xinterp, self.trend, bounds_error=False)
+            f = scipy.interpolate.interp1d(self.xinterp, self.trend, bounds_error=False)
         yp = f(self.xp)
         yy = self.resid - yp
         rmean = numpy.mean(yy)
@@ -679,8 +918,7 @@ class ccgFilter():
         sm = numpy.sum((yy[0:-1] - rmean) * (yy[1:] - rmean))
         cor = sm / (n - 1) / (rsd * rsd)  # equivalent to sm/numpy.sum(numpy.square(yy-rmean))
 
-        if self.debug:
-            print("cor is", cor)
+        self._debug("cor is %s", cor)
 
         # Compute auto covariances
         # r(k) = r(1)^k
@@ -693,8 +931,7 @@ class ccgFilter():
 
         var = rsd * rsd * (ssw + 2 * sm)
 
-        if self.debug:
-            print("sm is", sm, "var is ", var)
+        self._debug("sm is %s var is %s", sm, var)
 
         return var
 
@@ -841,7 +1078,7 @@ class ccgFilter():
         ysmooth = self.getFunctionValue(self.xinterp)
         ysmooth = ysmooth + self.smooth
 
-        f = interpolate.interp1d(self.xinterp, ysmooth, bounds_error=False)
+        f = scipy.interpolate.interp1d(self.xinterp, ysmooth, bounds_error=False)
         yi = f(x)
 
         return yi
@@ -857,7 +1094,7 @@ class ccgFilter():
         ytrend = self.getPolyValue(self.xinterp)
         ytrend = ytrend + self.trend
 
-        f = interpolate.interp1d(self.xinterp, ytrend, bounds_error=False)
+        f = scipy.interpolate.interp1d(self.xinterp, ytrend, bounds_error=False)
         yi = f(x)
 
         return yi
@@ -902,11 +1139,38 @@ class ccgFilter():
         A numpy 1d array with the growth rate values at the given x
         """
 
-        f = interpolate.interp1d(self.xinterp, self.deriv)  # , bounds_error=False)
+        f = scipy.interpolate.interp1d(self.xinterp, self.deriv)  # , bounds_error=False)
         yi = f(x)
 
         return yi
 
+    # ------------------------------------------------------------
+    def getWindowMeans(self, start, end, curve="smooth"):
+        """ Get the average of a curve over time windows, e.g. for samples
+        that integrate over a collection period rather than a single time.
+
+        Input
+        -----
+            start, end - window start and end times, single values, lists or numpy arrays
+            curve - "smooth", "trend" or "growthrate"
+
+        Returns
+        -------
+        A numpy 1d array with the mean of the curve over each window.
+        Windows outside the range of the data are given a Nan.
+        """
+
+        if curve == "smooth":
+            y = self.getFunctionValue(self.xinterp) + self.smooth
+        elif curve == "trend":
+            y = self.getPolyValue(self.xinterp) + self.trend
+        elif curve == "growthrate":
+            y = self.deriv
+        else:
+            raise ValueError("curve must be 'smooth', 'trend' or 'growthrate'")
+
+        return windowMeans(self.xinterp, y, start, end)
+
     # ------------------------------------------------------------
     def getFilterResponse(self, cutoff):
         """ Get the filter response for a range of frequencies.
@@ -948,14 +1212,17 @@ class ccgFilter():
         if xdata is None:
             xdata = self.xinterp
 
+        # calendar year and month of every point at once, rather than a calendarDate call per point
+        dates = calendar_date(xdata)
+        years = (dates.astype('datetime64[Y]').astype(int) + 1970).tolist()
+        months = (dates.astype('datetime64[M]').astype(int) % 12 + 1).tolist()
+
         a = []
         data = []
         tyear = 0
         tmonth = 0
-        for x, y in zip(xdata, ysmooth):
-            dt = self.calendarDate(x)
-
-            if dt.year != tyear or dt.month != tmonth:
+        for year, month, y in zip(years, months, ysmooth):
+            if year != tyear or month != tmonth:
                 if a:
                     if len(a) > 1:
                         mean = numpy.mean(a)
@@ -967,8 +1234,8 @@ class ccgFilter():
                     a = []
 
             a.append(y)
-            tyear = dt.year
-            tmonth = dt.month
+            tyear = year
+            tmonth = month
 
         if a:
             if len(a) > 1:
@@ -977,12 +1244,13 @@ class ccgFilter():
             else:
                 mean = a[0]
                 std = 0.0
-            data.append((dt.year, dt.month, mean, std, len(a)))
+            data.append((tyear, tmonth, mean, std, len(a)))
 
         empty_array = []  # pre-allocate an array where the for loop will put the coefficient outputs
         for i in range(0, len(data)):
             item = data[i]
             empty_array.append(item)
+        import pandas as pd
         Z = pd.DataFrame(empty_array)  # output the results from for loop into dataframe
 
         return Z
@@ -1043,21 +1311,453 @@ class ccgFilter():
 
         return (tcup, tcdown)
 
+    # ------------------------------------------------------------
+    def _interp_weights(self, xfrom, xto):
+        """ Index j and weight t so that linear interpolation of values v at xfrom to xto
+        is (1 - t) * v[j] + t * v[j + 1]
+        """
+
+        j = numpy.searchsorted(xfrom, xto, side="right") - 1
+        j = numpy.clip(j, 0, xfrom.size - 2)
+        t = (xto - xfrom[j]) / (xfrom[j + 1] - xfrom[j])
+
+        return j, t
+
+    # ------------------------------------------------------------
+    def _filter_rows(self, fft, cutoff, nstart, nend):
+        """ Low-pass filter each row of a zero padded rfft, and return the unpadded rows """
+
+        return scipy.fftpack.irfft(self._freq_filter(fft, self.dinterval, cutoff), axis=-1)[..., nstart:nend]
+
+    # ------------------------------------------------------------
+    def select_cutoff(self, candidates, numharmonics=None, criterion="gcv"):
+        """ Choose the short term cutoff (and number of harmonics) by cross validation.
+
+        The smooth curve at the data points is linear in the data, ysmooth = S y, so the
+        leave-one-out residuals are (y - S y) / (1 - S_ii) and the generalized cross
+        validation score is mean((y - S y)^2) / (1 - trace(S)/n)^2, without refitting.
+        S is never formed: its diagonal is built from the pieces of the filter
+        (function fit, end adjustment, interpolation to the fft grid, low-pass filter,
+        interpolation back to the data) in O(n) per candidate, reusing one setup of the
+        interpolation and fft for the whole grid.
+
+        The long term cutoff, sample interval, timezero, number of polynomial terms and gap
+        of this filter are kept fixed.  Not available with the amplitude gain factor,
+        because the function fit is then non-linear.
+
+        Input
+        -----
+            candidates - list of short term cutoff values in days
+            numharmonics - list of numbers of harmonics.  Default is the current numharm.
+                Values larger than the sample interval allows are reduced as in the constructor.
+            criterion - "gcv" or "loo", the score used to pick the best combination
+
+        Returns
+        -------
+        A dict with the best 'cutoff' and 'numharm', and a pandas DataFrame with columns
+        cutoff, numharm, edf (trace of S), rss, gcv, loo for every combination.
+        """
+
+        if self.use_gain_factor:
+            raise ValueError("select_cutoff is not available with use_gain_factor=True")
+        if criterion not in ("gcv", "loo"):
+            raise ValueError("criterion must be 'gcv' or 'loo'")
+        if numharmonics is None:
+            numharmonics = [self.numharm]
+        nh = int(365.0 / (self.sampleinterval * 2))
+        numharmonics = sorted(set(min(h, nh) for h in numharmonics))
+
+        n = self.np
+        work = self.xp - self.timezero
+        xgrid = self.xinterp - self.timezero
+        m = xgrid.size
+
+        # L: linear interpolation from the data (duplicate times averaged) to the grid, as sparse triplets
+        xx, first, counts = numpy.unique(work, return_index=True, return_counts=True)
+        j, t = self._interp_weights(xx, xgrid)
+        jrows = numpy.concatenate((numpy.arange(m), numpy.arange(m)))
+        jcols = numpy.concatenate((j, j + 1))
+        jw = numpy.concatenate((1 - t, t))
+        if self.gap != 0:
+            jw[numpy.tile(xx[j + 1] - xx[j] > self.gap / 365.0, 2)] = 0
+        reps = counts[jcols]
+        lrows = numpy.repeat(jrows, reps)
+        lw = numpy.repeat(jw / counts[jcols], reps)
+        lcols = numpy.repeat(first[jcols], reps) + numpy.arange(reps.sum()) - numpy.repeat(numpy.cumsum(reps) - reps, reps)
+
+        def lmul(v):
+            """ L @ v for v with data points along the first axis """
+            out = numpy.zeros((m,) + v.shape[1:])
+            numpy.add.at(out, lrows, lw.reshape((-1,) + (1,) * (v.ndim - 1)) * v[lcols])
+            return out
+
+        # M: linear interpolation from the grid back to the data points
+        mi, mt = self._interp_weights(xgrid, work)
+
+        def mmul(v):
+            """ M @ v for v with grid points along the first axis """
+            wa = (1 - mt).reshape((-1,) + (1,) * (v.ndim - 1))
+            wb = mt.reshape((-1,) + (1,) * (v.ndim - 1))
+            return wa * v[mi] + wb * v[mi + 1]
+
+        # D: line through the ends of the residuals (see _adjustend), so that ca + cb * x = X @ D @ resid
+        xline = numpy.column_stack((numpy.ones(n), work))
+        xgline = numpy.column_stack((numpy.ones(m), xgrid))
+        dmat = numpy.zeros((2, n))
+        if work[-1] - work[0] >= self.longterm / 365.0:
+            c = self.longterm / 365.0 / 4.0
+            z = numpy.where((work <= work[0] + c) | (work >= work[-1] - c))[0]
+            dmat[:, z] = numpy.linalg.pinv(xline[z])
+
+        # zero padding of the fft, the same as in _filter_data
+        n2 = int(pow(2, ceil(log(m, 2))))
+        nstart = int((n2 - m) / 2)
+        nend = nstart + m
+
+        def padded_fft(rows):
+            zzz = numpy.zeros((rows.shape[0], n2))
+            zzz[:, nstart:nend] = rows
+            return scipy.fftpack.rfft(zzz, axis=-1)
+
+        # impulse response of the filter, for the diagonal of G @ L
+        delta = numpy.zeros(n2)
+        delta[0] = 1.0
+        fdelta = scipy.fftpack.rfft(delta)
+
+        lx = lmul(xline)  # m x 2
+        mxg = mmul(xgline)  # n x 2
+        y = self.yp
+
+        rows = []
+        for numharm in numharmonics:
+            a = designMatrix(work, self.numpoly, numharm)
+            ag = designMatrix(xgrid, self.numpoly, numharm)
+            cinv = numpy.linalg.inv(a.T @ a)
+            theta = cinv @ (a.T @ y)
+            r = y - a @ theta
+            # stack everything that goes through the filter for this numharm, one fft for all cutoffs
+            la = lmul(a)
+            stack = numpy.vstack((lmul(r - xline @ (dmat @ r))[None, :], la.T, lx.T))
+            fstack = padded_fft(stack)
+            fitdiag = numpy.sum((mmul(ag) @ cinv) * a, axis=1)
+            mdr = dmat @ r
+            da = dmat @ a
+
+            for cutoff in candidates:
+                filt = self._filter_rows(fstack, cutoff, nstart, nend)
+                gr = filt[0]
+                gla = filt[1:1 + a.shape[1]].T
+                glx = filt[1 + a.shape[1]:].T
+
+                # smooth curve at the data points
+                ysmooth = mmul(ag @ theta + gr + xgline @ mdr)
+
+                # diagonal of M @ G @ L from the impulse response g of the filter
+                g = scipy.fftpack.irfft(self._freq_filter(fdelta, self.dinterval, cutoff))
+                wa = (1 - mt)[lcols]
+                wb = mt[lcols]
+                contrib = lw * (wa * g[(mi[lcols] - lrows) % n2] + wb * g[(mi[lcols] + 1 - lrows) % n2])
+                dgl = numpy.bincount(lcols, contrib, minlength=n)
+
+                # T = M @ (G @ L @ (I - X @ D) + Xg @ D), then S = M @ Ag @ Cinv @ A.T + T @ (I - A @ Cinv @ A.T)
+                mglx = mmul(glx)
+                tdiag = dgl - numpy.sum(mglx * dmat.T, axis=1) + numpy.sum(mxg * dmat.T, axis=1)
+                ta = mmul(gla) - mglx @ da + mxg @ da
+                sdiag = fitdiag + tdiag - numpy.sum((ta @ cinv) * a, axis=1)
+
+                e = y - ysmooth
+                rss = numpy.sum(e * e)
+                edf = numpy.sum(sdiag)
+                gcv = (rss / n) / pow(1 - edf / n, 2)
+                loo = numpy.mean(numpy.square(e / (1 - sdiag)))
+                rows.append((cutoff, numharm, edf, rss, gcv, loo))
+
+        import pandas as pd
+        table = pd.DataFrame(rows, columns=["cutoff", "numharm", "edf", "rss", "gcv", "loo"])
+        ibest = table[criterion].idxmin()
+        best = {"cutoff": table["cutoff"][ibest].item(), "numharm": int(table["numharm"][ibest])}
+
+        return best, table
+
+    # ------------------------------------------------------------
+    def save(self, filename):
+        """ Save the fitted state of the filter to an uncompressed numpy .npz file.
+        The file holds the function parameters and covariance, the interpolated
+        smooth, trend and derivative curves and the filter settings, which is all
+        that ccgCurve needs to evaluate the curves.  The input data is not saved.
+        """
+
+        numpy.savez(filename,
+                    version=CURVE_FILE_VERSION,
+                    params=self.params,
+                    covar=self.covar,
+                    xinterp=self.xinterp,
+                    smooth=self.smooth,
+                    trend=self.trend,
+                    deriv=self.deriv,
+                    numpoly=self.numpoly,
+                    numharm=self.numharm,
+                    timezero=self.timezero,
+                    shortterm=self.shortterm,
+                    longterm=self.longterm,
+                    sampleinterval=self.sampleinterval,
+                    use_gain_factor=self.use_gain_factor,
+                    rsd1=self.rsd1,
+                    rsd2=self.rsd2,
+                    chisq=self.chisq)
+
     # ------------------------------------------------------------
     def calendarDate(self, decyear):
-        """ Convert decimal date to calendar components """
+        """ Convert decimal date to calendar components (a datetime.datetime).
+        For whole arrays use X_dates.calendar_date, which this calls.
+        """
+
+        return calendar_date(decyear).astype(datetime.datetime)
+
+
+# --------------------------------------------------
+class ccgCurve():
+    """ Read only version of a fitted ccgFilter, loaded from a file written by ccgFilter.save().
+
+    Evaluates the fitted curves with numpy only, without fitting or filtering the data again,
+    so a reference curve can be fit once and then used by any number of scripts, e.g.
+
+        ccgFilter(x, y, cutoff).save('harmonized_curve.npz')
+        ...
+        curve = ccgCurve('harmonized_curve.npz')
+        curve.getTrendValue(dates)
+
+    Input Parameters
+    ----------
+    filename : str
+        .npz file written by ccgFilter.save()
+
+    Attributes
+    ----------
+    params, covar, xinterp, smooth, trend, deriv, numpoly, numharm, timezero,
+    shortterm, longterm, sampleinterval, use_gain_factor, rsd1, rsd2, chisq
+        Same as for ccgFilter
+    ninterp : int
+        number of points in each of xinterp, smooth, trend
+
+    Methods
+    -------
+    getFunctionValue(x), getPolyValue(x), getHarmonicValue(x), getSmoothValue(x),
+    getTrendValue(x), getGrowthRateValue(x), getWindowMeans(start, end, curve="smooth")
+        Same as for ccgFilter.  Values outside the range of the curve are given a Nan.
+    """
+
+    def __init__(self, filename):
+
+        with numpy.load(filename) as f:
+            version = int(f["version"])
+            if version > CURVE_FILE_VERSION:
+                raise ValueError("%s has curve file version %d, this reader supports up to %d"
+                                 % (filename, version, CURVE_FILE_VERSION))
+
+            self.params = f["params"]
+            self.covar = f["covar"]
+            self.xinterp = f["xinterp"]
+            self.smooth = f["smooth"]
+            self.trend = f["trend"]
+            self.deriv = f["deriv"]
+            self.numpoly = int(f["numpoly"])
+            self.numharm = int(f["numharm"])
+            self.timezero = float(f["timezero"])
+            self.shortterm = f["shortterm"].item()
+            self.longterm = f["longterm"].item()
+            self.sampleinterval = float(f["sampleinterval"])
+            self.use_gain_factor = bool(f["use_gain_factor"])
+            self.rsd1 = float(f["rsd1"])
+            self.rsd2 = float(f["rsd2"])
+            self.chisq = float(f["chisq"])
+
+        self.ninterp = len(self.xinterp)
+
+    # ------------------------------------------------------------
+    def _interp(self, x, y):
+        """ linear interpolation of y at times x, nan outside of xinterp """
+
+        return numpy.interp(x, self.xinterp, y, left=numpy.nan, right=numpy.nan)
+
+    # ------------------------------------------------------------
+    def getFunctionValue(self, x):
+        """ Determine the value of the function at time x. """
+
+        return fitFunc(self.params, numpy.asarray(x) - self.timezero, self.numpoly, self.numharm)
+
+    # ------------------------------------------------------------
+    def getPolyValue(self, x):
+        """ Get the values of the polynomial part of the function time x """
+
+        return numpy.polyval(self.params[self.numpoly - 1::-1], numpy.asarray(x) - self.timezero)
+
+    # ------------------------------------------------------------
+    def getHarmonicValue(self, x):
+        """ Get the values of the harmonic part of the function time x """
+
+        return harmonics(self.params, numpy.asarray(x) - self.timezero, self.numpoly, self.numharm)
+
+    # ------------------------------------------------------------
+    def getSmoothValue(self, x):
+        """ Return the 'smoothed' data at time x """
+
+        return self._interp(x, self.getFunctionValue(self.xinterp) + self.smooth)
+
+    # ------------------------------------------------------------
+    def getTrendValue(self, x):
+        """ Return the 'trend' of the data at time x """
 
-        dyr = int(decyear)
-        fyr = decyear - dyr
+        return self._interp(x, self.getPolyValue(self.xinterp) + self.trend)
 
-        if dyr % 4 == 0:
-            nsec = fyr * (366 * 86400)
+    # ------------------------------------------------------------
+    def getGrowthRateValue(self, x):
+        """ Get the values of the derivative of the trend """
+
+        return self._interp(x, self.deriv)
+
+    # ------------------------------------------------------------
+    def getWindowMeans(self, start, end, curve="smooth"):
+        """ Get the average of a curve over time windows, see ccgFilter.getWindowMeans """
+
+        return ccgFilter.getWindowMeans(self, start, end, curve)
+
+
+# --------------------------------------------------
+def setFilterCache(maxsize=FILTER_CACHE_SIZE):
+    """ Set the size of the in-process cache used by cachedFilter (FILTER_CACHE_SIZE fitted filters
+    by default).  maxsize = 0 turns the cache off.  Changing the size clears the cache and its counters.
+    """
+
+    _filter_cache.clear()
+    _filter_cache_info["maxsize"] = int(maxsize)
+    _filter_cache_info["hits"] = 0
+    _filter_cache_info["misses"] = 0
+
+
+# --------------------------------------------------
+def filterCacheInfo():
+    """ Return a dict with the hits, misses, maxsize and current size of the cachedFilter cache """
+
+    info = dict(_filter_cache_info)
+    info["size"] = len(_filter_cache)
+    return info
+
+
+# --------------------------------------------------
+def _filterKey(xp, yp, *args, **kwargs):
+    """ Hash of the data and settings of a ccgFilter(xp, yp, *args, **kwargs) call.
+
+    The arguments are bound to the ccgFilter signature with the defaults filled in, so
+    ccgFilter(x, y, 667) and ccgFilter(x, y, shortterm=667, longterm=667) give the same key.
+    Arrays are hashed by their values as floats, every argument with its length in front,
+    so different splits of the same numbers can't give the same bytes.
+    """
+
+    bound = inspect.signature(ccgFilter).bind(xp, yp, *args, **kwargs)
+    bound.apply_defaults()
+    h = hashlib.blake2b(digest_size=16)
+    for name, value in bound.arguments.items():
+        if isinstance(value, numpy.generic):
+            value = value.item()
+        if numpy.ndim(value) > 0:
+            data = numpy.ascontiguousarray(value, dtype=float)
+            data = b"%d:" % data.size + data.tobytes()
         else:
-            nsec = fyr * (365 * 86400)
+            data = repr(value).encode()
+        h.update(b"%s=%d:" % (name.encode(), len(data)))
+        h.update(data)
+    return h.digest()
+
+
+# --------------------------------------------------
+def cachedFilter(xp, yp, *args, **kwargs):
+    """ Same as ccgFilter(xp, yp, *args, **kwargs), but return the already fitted filter if the
+    same data and settings were fit before in this process.
+
+    The key is a hash of the x and y values and the settings (see _filterKey), so the same
+    series fit from different scripts or DataFrames is only fit once.  The cache holds the
+    FILTER_CACHE_SIZE most recently used filters; setFilterCache changes that, or turns it off.
+    Filters returned from the cache are shared, so they must not be modified by the caller.
+    """
 
-        nsec = round(nsec, 0)
+    maxsize = _filter_cache_info["maxsize"]
+    if maxsize <= 0:
+        return ccgFilter(xp, yp, *args, **kwargs)
 
-        dt = datetime.datetime(dyr, 1, 1) + datetime.timedelta(seconds=nsec)
+    key = _filterKey(xp, yp, *args, **kwargs)
+
+    filt = _filter_cache.get(key)
+    if filt is not None:
+        _filter_cache.move_to_end(key)
+        _filter_cache_info["hits"] += 1
+        return filt
+
+    _filter_cache_info["misses"] += 1
+    filt = ccgFilter(xp, yp, *args, **kwargs)
+    _filter_cache[key] = filt
+    while len(_filter_cache) > maxsize:
+        _filter_cache.popitem(last=False)
+
+    return filt
+
+
+# --------------------------------------------------
+def addTimingHook(hook):
+    """ Call hook(filt) with every ccgFilter after it is fit, e.g. a TimingCollector.
+    The stage timings of the fit are in filt.timings and filt.counts.
+    """
+
+    _timing_hooks.append(hook)
+
+
+# --------------------------------------------------
+def removeTimingHook(hook):
+    """ Stop calling a hook added with addTimingHook """
+
+    _timing_hooks.remove(hook)
+
+
+# --------------------------------------------------
+class TimingCollector():
+    """ Sum the per stage timings of many ccgFilter fits, e.g. over a Monte Carlo run.
+
+        collector = TimingCollector()
+        addTimingHook(collector)
+        ... run the fits ...
+        removeTimingHook(collector)
+        print(collector.summary())
+
+    Attributes
+    ----------
+    nfits : int
+        Number of fits collected
+    timings : dict
+        Total seconds spent in each stage over all fits
+    counts : dict
+        Total number of times each stage was run
+    """
+
+    def __init__(self):
+        self.nfits = 0
+        self.timings = {}
+        self.counts = {}
+
+    def __call__(self, filt):
+        self.nfits += 1
+        for stage, sec in filt.timings.items():
+            self.timings[stage] = self.timings.get(stage, 0.0) + sec
+            self.counts[stage] = self.counts.get(stage, 0) + filt.counts[stage]
+
+    def summary(self):
+        """ Return a pandas DataFrame with calls, total seconds, mean seconds per fit
+        and fraction of the total time for each stage
+        """
 
-        return dt
+        total = self.timings.get("total", 0.0)
+        rows = []
+        for stage, sec in self.timings.items():
+            rows.append((stage, self.counts[stage], sec, sec / max(self.nfits, 1), sec / total if total > 0 else numpy.nan))
 
+        import pandas as pd
+        return pd.DataFrame(rows, columns=["stage", "calls", "seconds", "seconds_per_fit", "fraction"])
@@ -1,17 +1,18 @@
 import numpy as np
-from X_miller_curve_algorithm import ccgFilter
+from X_miller_curve_algorithm import cachedFilter, ccgFilter
 import pandas as pd
-from PyAstronomy import pyasl
-from tabulate import tabulate
+from X_dates import decimal_year
+from X_radiocarbon import f14c_to_delta14c
+# tabulate is only needed by basic_analysis, so it is imported there; importing this module for the conversions or
+# the Monte Carlo functions doesn't need it installed.
 
 """
 This function will convert FM to D14C. 
 """
 def fm_to_d14c(fm, fm_err, date):
     # D14C = 1000*(fm - 1)   # first, find D14C (without the age correction)
-    age_corr = np.exp((1950 - date) / 8267)
-    Del14C = 1000 * ((fm*age_corr) - 1)
-    Del14C_err = 1000 * fm_err
+    Del14C = f14c_to_delta14c(fm, date)
+    Del14C_err = 1000 * fm_err  # no age correction on the error (f14c_to_delta14c would apply it)
     return Del14C, Del14C_err
 
 
@@ -22,19 +23,15 @@ so many different forms.
 Arguments: 
 x = column of dates in the form dd/mm/yyyy
 Outputs: 
-array = column of dates in the form yyyy.decimal 
+array = column of dates in the form yyyy.decimal (a numpy array, NaN where a date is missing)
+The conversion used to be done one date at a time by PyAstronomy (pyasl.decimalYear); it is now done on the whole 
+column at once by decimal_year in X_dates.py, which gives the same numbers (see there). 
 To see an example, uncomment the following lines of code directly below the function definition: 
 """
 
 
 def long_date_to_decimal_date(x):
-    array = []  # define an empty array in which the data will be stored
-    for i in range(0, len(x)):  # initialize the for loop to run the length of our dataset (x)
-        j = x[i]  # assign j: grab the i'th value from our dataset (x)
-        decy = pyasl.decimalYear(j)  # The heavy lifting is done via this Py-astronomy package
-        decy = float(decy)  # change to a float - this may be required for appending data to the array
-        array.append(decy)  # append it all together into a useful column of data
-    return array  # return the new data
+    return decimal_year(x)
 
 
 # df = pd.read_excel(r'H:\The Science\Datasets\my_functions_examples'
@@ -91,6 +88,9 @@ cutoff: for the CCGCRV algoritm, lower numbers smooth less, and higher numbers s
     See hyperlink above for more details. 
 n: how many iterations do you want to run? When writing code, keep this low. Once code is solid, increase to 10,000. 
 
+The fits of the unperturbed data go through cachedFilter, so they are only done once per run. 
+setFilterCache(maxsize) from X_miller_curve_algorithm changes how many fits are kept (0 turns it off). 
+
 ### If you want to see this function in action, refer to "MonteCarlo_Explained.py"
 https://github.com/christianlewis091/radiocarbon_intercomparison/blob/dev/interlab_comparison/MonteCarlo_Explained.py
 
@@ -139,12 +139,15 @@ def monte_carlo_randomization_smooth(x_init, fake_x, y_init, y_error, cutoff, n)
     # Second for-loop: smooth the randomized data using John Miller's CCGCRV.
 
     # Create an initial, trended array on which later arrays that are created will stack
-    template_array = ccgFilter(x_init, new_array[0], cutoff).getSmoothValue(fake_x)
+    template_array = cachedFilter(x_init, new_array[0], cutoff).getSmoothValue(fake_x)
 
     # this for smooths each row of the randomized array from above, and stacks it up
     for k in range(0, len(new_array)):
         row = new_array[k]  # grab the first row of the data
-        smooth = ccgFilter(x_init, row, cutoff).getSmoothValue(fake_x)  # outputs smooth values at my desired times, x
+        # row 0 is the data itself, which the template above just fit; the randomized rows never repeat, so they
+        # are fit directly instead of filling the cache
+        fit = cachedFilter if k == 0 else ccgFilter
+        smooth = fit(x_init, row, cutoff).getSmoothValue(fake_x)  # outputs smooth values at my desired times, x
         template_array = np.vstack((template_array, smooth))
 
     # over time I have had to go between horizontal and vertical stacking of the data as I learn more about programming.
@@ -213,12 +216,15 @@ def monte_carlo_randomization_trend(x_init, fake_x, y_init, y_error, cutoff, n):
     # Second for-loop: smooth the randomized data using John Miller's CCGCRV.
 
     # Create an initial, trended array on which later arrays that are created will stack
-    template_array = ccgFilter(x_init, new_array[0], cutoff).getTrendValue(fake_x)
+    template_array = cachedFilter(x_init, new_array[0], cutoff).getTrendValue(fake_x)
 
     # this for smooths each row of the randomized array from above, and stacks it up
     for k in range(0, len(new_array)):
         row = new_array[k]  # grab the first row of the data
-        smooth = ccgFilter(x_init, row, cutoff).getTrendValue(fake_x)  # outputs smooth values at my desired times, x
+        # row 0 is the data itself, which the template above just fit; the randomized rows never repeat, so they
+        # are fit directly instead of filling the cache
+        fit = cachedFilter if k == 0 else ccgFilter
+        smooth = fit(x_init, row, cutoff).getTrendValue(fake_x)  # outputs smooth values at my desired times, x
         template_array = np.vstack((template_array, smooth))
 
     # over time I have had to go between horizontal and vertical stacking of the data as I learn more about programming.
@@ -255,6 +261,7 @@ RETIRED FUNCTIONS NO LONGER IN USE
 """
 
 def basic_analysis(x, y, name1, name2):
+    from tabulate import tabulate
     # compute data for individual datasets
 
     x_mean = np.average(x)
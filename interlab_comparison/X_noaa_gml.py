@@ -0,0 +1,76 @@
+r"""
+Streaming reader for NOAA GML in-situ files (e.g. co2_brw_surface-insitu_1_ccgg_DailyData.csv / HourlyData.txt).
+
+X_BarrowCO2Data.py used to read the whole file with pd.read_csv and only then keep 2000 - 2011 and drop the flagged
+(-999.99) values. That's fine for the daily file (~4k rows in filtered_csv_BarrowCO2), but the hourly products are
+~100 times bigger. read_gml_insitu reads the file in chunks, parses only the columns it needs, filters each chunk as it
+goes, and stops at the end of the year window (the files are in time order). What's kept is packed straight into one
+float64 array with the columns (time_decimal, value, std_dev), ready for ccgFilter:
+
+data = read_gml_insitu(r'H:\The Science\Datasets\co2_brw_surface-insitu_1_ccgg_DailyData.csv', years=(2000, 2011))
+filt = ccgFilter(data[:, 0], data[:, 1])
+
+Memory use is one chunk plus the rows that are kept, however long the file is.
+Comma-separated (.csv) and whitespace-separated (.txt) files are both read; the '#' header lines are skipped.
+"""
+
+import numpy as np
+import pandas as pd
+
+GML_COLUMNS = ['year', 'time_decimal', 'value', 'value_std_dev', 'qcflag']
+
+
+def iter_gml_chunks(path, years=None, qcflag=None, min_value=0, chunksize=100000, stop_early=True):
+    """
+    Yield a float64 array (time_decimal, value, std_dev) for each chunk of the file, after filtering.
+
+    years: (first, last) years to keep, inclusive. None keeps every year.
+    qcflag: None doesn't look at the flags. Otherwise only rows whose qcflag starts with it are kept: '.' keeps
+        everything that wasn't rejected, '..' also drops the selection flags (see the GML file headers).
+    min_value: rows with value <= min_value are dropped (the missing value is -999.99). None keeps them.
+    chunksize: rows parsed at a time.
+    stop_early: stop reading at the first chunk that is entirely after the year window.
+    """
+    usecols = GML_COLUMNS if qcflag is not None else GML_COLUMNS[:-1]
+    dtypes = {'year': np.int32, 'time_decimal': np.float64, 'value': np.float64, 'value_std_dev': np.float64,
+              'qcflag': str}
+    sep = r'\s+' if str(path).endswith('.txt') else ','
+    reader = pd.read_csv(path, sep=sep, comment='#', usecols=usecols, dtype={c: dtypes[c] for c in usecols},
+                         chunksize=chunksize)
+    with reader:
+        for chunk in reader:
+            year = chunk['year'].to_numpy()
+            keep = np.ones(len(chunk), dtype=bool)
+            if years is not None:
+                keep &= (year >= years[0]) & (year <= years[1])
+            if min_value is not None:
+                keep &= chunk['value'].to_numpy() > min_value
+            if qcflag is not None:
+                keep &= chunk['qcflag'].str.startswith(qcflag, na=False).to_numpy()
+
+            out = np.empty((int(keep.sum()), 3))
+            out[:, 0] = chunk['time_decimal'].to_numpy()[keep]
+            out[:, 1] = chunk['value'].to_numpy()[keep]
+            out[:, 2] = chunk['value_std_dev'].to_numpy()[keep]
+            yield out
+
+            if stop_early and years is not None and len(year) and year.min() > years[1]:
+                break
+
+
+def read_gml_insitu(path, years=None, qcflag=None, min_value=0, chunksize=100000, stop_early=True):
+    """
+    Read a NOAA GML in-situ file into one float64 array with columns (time_decimal, value, std_dev).
+    The arguments are described in iter_gml_chunks. The defaults keep every year and drop only missing values,
+    which is what X_BarrowCO2Data.py did.
+    """
+    data = np.empty((0, 3))
+    n = 0
+    for block in iter_gml_chunks(path, years, qcflag, min_value, chunksize, stop_early):
+        if n + len(block) > len(data):
+            grown = np.empty((max(2 * len(data), n + len(block)), 3))  # grow geometrically, copying only what's kept
+            grown[:n] = data[:n]
+            data = grown
+        data[n:n + len(block)] = block
+        n += len(block)
+    return np.ascontiguousarray(data[:n])
@@ -0,0 +1,111 @@
+"""
+Piecewise-constant offsets (one offset and error per time period), applied to a whole table at once.
+
+The C_*_cleanup.py scripts used to cut each Heidelberg record into h0 ... h6 with a boolean .loc per period, add
+offset1 ... offset6 and propagate error1 ... error6 on each piece, and then glue the pieces back with a chain of
+pd.merge(how='outer'). Besides being slow, the strict inequalities (1991 < Decimal_date < 1994) meant that a point
+dated exactly 1991.0, 1994.0, ... was in no piece, and was silently dropped.
+
+An OffsetTable is the list of periods (label, start, end, offset, error), with the rule for the bounds written out:
+    closed='left'     start <= date < end   (the default: a point on a bound belongs to the period that starts there)
+    closed='right'    start < date <= end
+    closed='both'     start <= date <= end  (a point on a shared bound goes to the later period)
+    closed='neither'  start < date < end    (the old slicing; points on a bound are in no period)
+Each date is found with one np.searchsorted on the period starts, so correcting n points is O(n log k) for k periods,
+for any number of sites in the same table, with no merges. Periods must be in order and must not overlap; gaps
+between them are allowed (points in a gap, like points before the first or after the last period, are in none).
+Use -np.inf / np.inf as a start / end for a period that is open on that side.
+
+Example:
+table = OffsetTable(PERIODS).open_ended(start=True)    # everything before 1991 is in h1
+heidelberg = table.apply(heidelberg, 'D14C', 'weightedstderr_D14C', 'D14C_1', 'weightedstderr_D14C_1')
+"""
+
+import numpy as np
+import pandas as pd
+from X_radiocarbon import add_offset
+
+CLOSED = ('left', 'right', 'both', 'neither')
+
+
+class OffsetTable:
+    """ rows: (label, start, end, offset, error) of each period, in order. closed: which bounds are in the period """
+
+    def __init__(self, rows, closed='left'):
+        if closed not in CLOSED:
+            raise ValueError('closed must be one of %s, not %r' % (', '.join(CLOSED), closed))
+        self.rows = [tuple(r) for r in rows]
+        self.closed = closed
+        if not self.rows:
+            raise ValueError('an offset table needs at least one period')
+        self.labels = np.array([r[0] for r in self.rows], dtype=object)
+        self.starts = np.array([r[1] for r in self.rows], dtype=np.float64)
+        self.ends = np.array([r[2] for r in self.rows], dtype=np.float64)
+        self.offsets = np.array([r[3] for r in self.rows], dtype=np.float64)
+        self.errors = np.array([r[4] for r in self.rows], dtype=np.float64)
+        if np.any(self.ends <= self.starts):
+            raise ValueError('every period must end after it starts')
+        if np.any(self.starts[1:] < self.ends[:-1]):
+            raise ValueError('the periods must be in order and must not overlap')
+
+    def __repr__(self):
+        return 'OffsetTable(%r, closed=%r)' % (self.rows, self.closed)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def open_ended(self, start=False, end=False):
+        """ A copy with the first period starting at -inf (start=True) and/or the last one ending at +inf (end=True) """
+        rows = list(self.rows)
+        if start:
+            rows[0] = (rows[0][0], -np.inf) + rows[0][2:]
+        if end:
+            rows[-1] = rows[-1][:2] + (np.inf,) + rows[-1][3:]
+        return OffsetTable(rows, self.closed)
+
+    def locate(self, dates):
+        """ The row number of the period each date is in (an int array), -1 where it is in none (or is NaN) """
+        x = np.asarray(dates, dtype=np.float64)
+        side = 'right' if self.closed in ('left', 'both') else 'left'
+        idx = np.searchsorted(self.starts, x, side=side) - 1
+        found = idx >= 0
+        end = self.ends[np.where(found, idx, 0)]
+        found &= (x <= end) if self.closed in ('right', 'both') else (x < end)
+        return np.where(found, idx, -1)
+
+    def lookup(self, dates):
+        """ (offset, error, label) of each date; NaN, NaN, None where a date is in no period """
+        idx = self.locate(dates)
+        found = idx >= 0
+        safe = np.where(found, idx, 0)
+        offset = np.where(found, self.offsets[safe], np.nan)
+        error = np.where(found, self.errors[safe], np.nan)
+        label = np.where(found, self.labels[safe], None)
+        return offset, error, label
+
+    def apply(self, df, value_column, error_column, out_value, out_error, date_column='Decimal_date',
+              offset_column=None, offset_error_column=None, label_column=None, keep_outside=False):
+        """
+        Add the offset of its period to value_column of every row of df (error propagated in quadrature from
+        error_column), into new columns out_value and out_error. The offset, its error and the period label are also
+        saved if offset_column, offset_error_column, label_column are given.
+        Rows in no period are dropped (as the old slicing did), or kept with NaN if keep_outside=True. Returns a new
+        DataFrame in the same row order, with a fresh 0 ... n-1 index.
+        """
+        offset, error, label = self.lookup(df[date_column])
+        keep = np.ones(len(df), dtype=bool) if keep_outside else ~np.isnan(offset)
+        out = df.loc[keep].reset_index(drop=True)
+        offset, error, label = offset[keep], error[keep], label[keep]
+        if offset_column is not None:
+            out[offset_column] = offset
+        if offset_error_column is not None:
+            out[offset_error_column] = error
+        if label_column is not None:
+            out[label_column] = label
+        out[out_value], out[out_error] = add_offset(out[value_column], out[error_column], offset, error)
+        return out
+
+    def to_frame(self):
+        """ The table as a DataFrame, for printing or saving next to the corrected data """
+        return pd.DataFrame({'label': self.labels, 'start': self.starts, 'end': self.ends, 'offset': self.offsets,
+                             'error': self.errors})
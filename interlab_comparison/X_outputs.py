@@ -0,0 +1,206 @@
+"""
+Saving the intermediate results that the scripts pass to each other (CapeGrim_offset, harmonized_dataset, ...).
+
+These used to be written with to_excel, which is slow to write and even slower to read back, and loses the dtypes
+(dates, ints with missing values, ...) on the way. Now the canonical copy of each output is a Parquet file:
+    save_output(df, 'CapeGrim_offset.xlsx') writes CapeGrim_offset.parquet (dtypes and index kept exactly), and
+    load_output('CapeGrim_offset.xlsx') reads it back.
+Scripts keep using the .xlsx names they always used, and the catalog (datasets.json) points the intermediate
+datasets at the .parquet files. If only the old .xlsx exists (the run that made it pre-dates this), that is read
+instead.
+
+The Excel copy is now only for people to look at, and is off by default. Turn it on for a run with the environment
+variable RADIOCARBON_EXCEL_EXPORT=1, per call with save_output(..., excel=True), or afterwards with
+python X_outputs.py CapeGrim_offset.parquet harmonized_dataset.parquet ...
+
+Columns that mix numbers, text and dates are split into typed columns on writing and put back together on reading
+(see split_mixed in X_dataset_cache.py), so they come back as they were saved.
+
+A script with several outputs can save them all at the end in one go. The Parquet files are written straight away;
+the Excel copies, if any, are written from them in separate processes (forked, where possible; threads elsewhere):
+with OutputBatch() as out:
+    out.save(df, 'MCQ_offset.xlsx')
+    out.save(all_offset_corrected_heid, 'Heidelberg_OffsetCorrections.xlsx')
+"""
+
+import json
+import multiprocessing
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import pandas as pd
+from X_dataset_cache import mixed_read_columns, restore_mixed, split_mixed
+
+PARQUET = '.parquet'
+MIXED_KEY = b'radiocarbon.mixed'  # Parquet metadata: {column: [kinds]} of the columns split by split_mixed
+
+
+def excel_export_default():
+    """ Whether Excel copies are written when save_output isn't told, from RADIOCARBON_EXCEL_EXPORT (default off) """
+    return os.environ.get('RADIOCARBON_EXCEL_EXPORT', '0').lower() not in ('0', '', 'false', 'no')
+
+
+def output_paths(path):
+    """ (parquet, excel) file names for an output called path, with or without an extension """
+    stem = os.path.splitext(path)[0]
+    return stem + PARQUET, stem + '.xlsx'
+
+
+def readable_path(path):
+    """
+    The file to read for an output: the Parquet file if it exists, otherwise the Excel file from older runs,
+    if that exists. Returns path unchanged if neither exists.
+    """
+    parquet, excel = output_paths(path)
+    if os.path.exists(parquet):
+        return parquet
+    if os.path.exists(excel):
+        return excel
+    return path
+
+
+def _parquet_safe(df):
+    """
+    Parquet needs one type per column, but our frames often have text mixed into number columns (e.g. flags, notes).
+    Those columns are split with X_dataset_cache.split_mixed, like in the dataset cache, but here the index is kept.
+    Returns the Arrow table to write, with the split columns noted in its metadata.
+    """
+    import pyarrow as pa
+
+    df = df.copy()
+    df.columns = [str(c) for c in df.columns]
+    df, mixed = split_mixed(df)
+    table = pa.Table.from_pandas(df)
+    metadata = dict(table.schema.metadata or {})
+    metadata[MIXED_KEY] = json.dumps(mixed).encode()
+    return table.replace_schema_metadata(metadata)
+
+
+def _write_parquet(df, path):
+    """ Write the Parquet file of an output; False (with a warning) if pyarrow isn't there to do it """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        warnings.warn('pyarrow is not installed, writing %s as Excel only' % output_paths(path)[1])
+        return False
+    pq.write_table(_parquet_safe(df), output_paths(path)[0])
+    return True
+
+
+def _write(df, path, excel):
+    """ Write one output, returning how long it took """
+    t0 = time.perf_counter()
+    if not _write_parquet(df, path) or excel:
+        df.to_excel(output_paths(path)[1])
+    return time.perf_counter() - t0
+
+
+def read_parquet_output(path, columns=None):
+    """ Read a Parquet file written by save_output, putting split mixed columns back together """
+    import pyarrow.parquet as pq
+
+    mixed = json.loads((pq.read_schema(path).metadata or {}).get(MIXED_KEY, b'{}'))
+    read, mixed = mixed_read_columns(columns, mixed)
+    return restore_mixed(pd.read_parquet(path, columns=read), mixed)
+
+
+def save_output(df, path, excel=None):
+    """
+    Save an intermediate result. path is the file name the script used to write with to_excel
+    (e.g. 'CapeGrim_offset.xlsx'); the data goes to the .parquet file of the same name, and to the .xlsx as well
+    if excel=True (default: RADIOCARBON_EXCEL_EXPORT). Returns the seconds it took.
+    """
+    if excel is None:
+        excel = excel_export_default()
+    return _write(df, path, excel)
+
+
+def load_output(path, columns=None):
+    """ Read an intermediate result saved by save_output (or an older .xlsx of the same name) """
+    path = readable_path(path)
+    if path.endswith(PARQUET):
+        return read_parquet_output(path, columns=columns)
+    from X_dataset_cache import read_excel_cached
+    return read_excel_cached(path, columns=columns)
+
+
+def export_excel(path):
+    """ Write the Excel copy of a saved output, for people to look at """
+    parquet, excel_path = output_paths(path)
+    read_parquet_output(parquet).to_excel(excel_path)
+    return excel_path
+
+
+def _timed_export(path):
+    """ export_excel, returning how long it took. Module level so that it can be sent to a process pool. """
+    t0 = time.perf_counter()
+    export_excel(path)
+    return time.perf_counter() - t0
+
+
+class OutputBatch:
+    """
+    Collects outputs with save(df, path, excel=None) and writes them all at once when flush() is called, or at the end
+    of a "with OutputBatch() as out:" block (unless the block raised). The Parquet files are written in this process
+    (handing whole DataFrames to workers would cost more than it saves); Excel copies are then made from them by a
+    pool of workers, which only get the file names. max_workers: default one per Excel copy. verbose: print the time
+    each file took.
+    """
+
+    def __init__(self, max_workers=None, verbose=True):
+        self.max_workers = max_workers
+        self.verbose = verbose
+        self.pending = []
+        self.timings = {}
+
+    def save(self, df, path, excel=None):
+        if excel is None:
+            excel = excel_export_default()
+        self.pending.append((df, path, excel))
+
+    def flush(self):
+        if not self.pending:
+            return self.timings
+        t0 = time.perf_counter()
+        exports = []
+        for df, path, excel in self.pending:
+            t1 = time.perf_counter()
+            if _write_parquet(df, path):
+                if excel:
+                    exports.append(path)
+            else:
+                df.to_excel(output_paths(path)[1])
+            self.timings[path] = time.perf_counter() - t1
+        if exports:
+            workers = self.max_workers or min(len(exports), os.cpu_count() or 1)
+            if 'fork' in multiprocessing.get_all_start_methods() and workers > 1:
+                pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+            else:
+                # spawned processes would re-run the calling script from the top, so threads are used instead
+                pool = ThreadPoolExecutor(max_workers=workers)
+            with pool:
+                futures = [(path, pool.submit(_timed_export, path)) for path in exports]
+                for path, future in futures:
+                    self.timings[path] += future.result()
+        if self.verbose:
+            for df, path, excel in self.pending:
+                print('saved %-40s %7.3f s' % (output_paths(path)[0], self.timings[path]))
+        if self.verbose:
+            print('saved %d outputs in %.3f s' % (len(self.pending), time.perf_counter() - t0))
+        self.pending = []
+        return self.timings
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        return False
+
+
+if __name__ == '__main__':
+    for name in sys.argv[1:]:
+        print('wrote', export_excel(name))
@@ -0,0 +1,359 @@
+"""
+A small "make" for the scripts in this project.
+
+The project is really a pipeline: the C_*_cleanup.py scripts apply the Heidelberg offsets to each site,
+B_CGO_BHD_harmonization.py merges Cape Grim with Baring Head, C_SOAR_TreeRingCleanup.py uses the harmonized data,
+and so on, all passing files to each other. Each script is declared below as a Stage with the files it reads
+(inputs: dataset names from datasets.json, or file names) and the files it writes (outputs). A stage depends on
+another if it reads one of its outputs.
+
+A stage is only re-run when something it depends on has changed, i.e. when any of these differ from its last
+successful run:
+    - the script, or any of our own modules it imports (X_my_functions.py, X_miller_curve_algorithm.py, ...)
+    - the contents of its inputs (hashed, so re-saving an identical file doesn't count as a change)
+    - the catalog entry of its inputs (e.g. a different skiprows)
+or when one of its outputs is missing. Because inputs are compared by content, a re-run stage whose outputs come out
+the same doesn't trigger the stages after it. Stages that don't depend on each other (e.g. the Cape Grim and Neumayer
+cleanups) run at the same time, each in its own python process.
+
+What was run and when is kept in .pipeline_state (along with the output of each script, in <stage>.log).
+Deleting it just means everything is re-run next time.
+
+From the command line:
+python X_pipeline.py                       # bring everything up to date
+python X_pipeline.py soar_cleanup -j 4     # only what soar_cleanup needs, 4 stages at a time
+python X_pipeline.py --dry-run             # show what would run
+python X_pipeline.py capegrim_cleanup --force
+"""
+
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from X_dataset_cache import file_hash
+from X_dataset_catalog import get_catalog
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STATE_FOLDER = '.pipeline_state'
+
+
+class Stage:
+    """
+    One script of the pipeline.
+
+    name: short name used on the command line
+    script: the python file, relative to the project folder
+    inputs: what the script reads; dataset names from the catalog, or file names relative to the project folder
+    outputs: files the script writes, relative to the project folder
+    """
+    def __init__(self, name, script, inputs=(), outputs=()):
+        self.name = name
+        self.script = script
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+
+    def __repr__(self):
+        return "Stage(%r, %r)" % (self.name, self.script)
+
+
+STAGES = [
+    # every run of the intercomparison is added to results.sqlite (see X_results_store.py; leave
+    # RADIOCARBON_RESULTS_DB unset when running the pipeline, or the stage "finishes without writing" it)
+    Stage('heidelberg_intercomparison', 'A_heidelberg_intercomparison.py',
+          inputs=['heidelberg_cape_grim', 'bhd_14co2'], outputs=['rolling_offsets.parquet', 'results.sqlite']),
+    Stage('ansto_intercomparison', 'A_ANSTO_intercomparison.py', inputs=['ansto_intercomparison']),
+    Stage('sio_llnl_rrl_intercomparison', 'A_SIO&LLNL_RRL_intercomparison.py',
+          inputs=['llnl_wheel_comparisons', 'rrl_nwt_fari']),
+    Stage('montecarlo_explained', 'A_MonteCarlo_Explained.py', inputs=['bhd_14co2']),
+    Stage('capegrim_cleanup', 'C_CapeGrim_cleanup.py', inputs=['heidelberg_cape_grim'],
+          outputs=['CapeGrim_offset.parquet']),
+    Stage('neumayer_cleanup', 'C_NeumayerCleanup.py', inputs=['heidelberg_neumayer'],
+          outputs=['Neumayer_offset.parquet']),
+    # the Macquarie cleanup also combines all three sites at the end, so it needs the other two cleanups first
+    Stage('mcq_cleanup', 'C_Maquarie_cleanup.py', inputs=['heidelberg_mqa', 'capegrim_offset', 'neumayer_offset'],
+          outputs=['MCQ_offset.parquet', 'Heidelberg_OffsetCorrections.parquet']),
+    Stage('intercomparisons_summary', 'A_intercomparisons_summary.py', inputs=['capegrim_offset']),
+    Stage('offset_analysis', 'offset_anaylsis.py', inputs=['heidelberg_offset_corrections']),
+    Stage('harmonization', 'B_CGO_BHD_harmonization.py',
+          inputs=['capegrim_offset', 'bhd_14co2'],
+          outputs=['harmonized_dataset.parquet', 'harmonized_summer.parquet', 'harmonized_season_means.parquet']),
+    Stage('soar_cleanup', 'C_SOAR_TreeRingCleanup.py',
+          inputs=['soar_tree_rings', 'chile_tree_rings', 'harmonized_dataset', 'harmonized_summer'],
+          outputs=['SOARTreeRingData_CBL_flags.parquet', 'SOARTreeRingData_CBL_cleaned.parquet']),
+    Stage('depolholz_intercomparison', 'A_DePolHolz_intercomparison.py',
+          inputs=['soar_tree_rings_cleaned', 'chile_tree_rings']),
+    Stage('graven_offsets', 'Graven_cleanup_offsetcalc.py',
+          inputs=['graven_southpole', 'graven_palmer', 'graven_maunaloa', 'graven_kumukahi', 'graven_barrow',
+                  'graven_samoa'],
+          outputs=['Graven_OffsetCorrections.parquet']),
+]
+
+
+def _imported_modules(source):
+    """ Names of the top-level modules imported anywhere in source """
+    names = set()
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split('.')[0])
+    return names
+
+
+def code_files(script, folder=HERE):
+    """ The script and every module from folder that it imports, directly or indirectly """
+    found = []
+    todo = [os.path.join(folder, script)]
+    while todo:
+        path = todo.pop()
+        if path in found:
+            continue
+        found.append(path)
+        with open(path, encoding='utf-8') as f:
+            source = f.read()
+        for module in sorted(_imported_modules(source)):
+            module_path = os.path.join(folder, module + '.py')
+            if os.path.exists(module_path):
+                todo.append(module_path)
+    return sorted(found)
+
+
+class Pipeline:
+    """ The stages, how they depend on each other, and the record of their last successful runs """
+
+    def __init__(self, stages=STAGES, folder=HERE, catalog=None, state_dir=None):
+        self.folder = folder
+        self.catalog = get_catalog() if catalog is None else catalog
+        self.state_dir = os.path.join(folder, STATE_FOLDER) if state_dir is None else state_dir
+        self.stages = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError("Two stages are called '%s'" % stage.name)
+            self.stages[stage.name] = stage
+
+        producer = {}
+        for stage in stages:
+            for output in stage.outputs:
+                path = self.output_path(output)
+                if path in producer:
+                    raise ValueError("%s is written by both '%s' and '%s'" % (output, producer[path], stage.name))
+                producer[path] = stage.name
+        self.deps = {stage.name: sorted({producer[self.input_path(i)] for i in stage.inputs
+                                         if self.input_path(i) in producer} - {stage.name})
+                     for stage in stages}
+        self.order = self._topological_order()
+
+    def input_path(self, item):
+        """ Path of an input: a catalog dataset, or a file in the project folder """
+        if item in self.catalog.specs:
+            return os.path.normpath(self.catalog.dataset(item).path)
+        return os.path.normpath(os.path.join(self.folder, item))
+
+    def output_path(self, item):
+        return os.path.normpath(os.path.join(self.folder, item))
+
+    def _topological_order(self):
+        order, state = [], {}
+
+        def visit(name, chain):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError('The stages depend on each other in a loop: %s' % ' -> '.join(chain + [name]))
+            state[name] = 'visiting'
+            for dep in self.deps[name]:
+                visit(dep, chain + [name])
+            state[name] = 'done'
+            order.append(name)
+
+        for name in self.stages:
+            visit(name, [])
+        return order
+
+    def needed(self, targets=None):
+        """ The targets and everything they depend on, in the order they have to run """
+        if not targets:
+            return list(self.order)
+        unknown = [t for t in targets if t not in self.stages]
+        if unknown:
+            raise KeyError("Unknown stage(s) %s, choose from %s" % (unknown, self.order))
+        keep, todo = set(), list(targets)
+        while todo:
+            name = todo.pop()
+            if name not in keep:
+                keep.add(name)
+                todo.extend(self.deps[name])
+        return [name for name in self.order if name in keep]
+
+    # record of the last successful run of a stage
+    def _stamp_path(self, name):
+        return os.path.join(self.state_dir, name + '.json')
+
+    def _read_stamp(self, name):
+        try:
+            with open(self._stamp_path(name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _hash(self, path, old):
+        """ sha1 of a file, reusing the one in the old stamp if the modification time and size are unchanged """
+        st = os.stat(path)
+        if old and old[0] == st.st_mtime_ns and old[1] == st.st_size:
+            return old
+        return [st.st_mtime_ns, st.st_size, file_hash(path)]
+
+    def signature(self, name):
+        """ Everything that decides whether a stage has to be re-run. Raises FileNotFoundError for a missing input. """
+        stage = self.stages[name]
+        old = self._read_stamp(name) or {}
+        old_files = old.get('files', {})
+        files = {}
+        for path in code_files(stage.script, self.folder):
+            files[path] = self._hash(path, old_files.get(path))
+        for item in stage.inputs:
+            path = self.input_path(item)
+            if not os.path.exists(path):
+                raise FileNotFoundError("'%s' needs %s, which doesn't exist" % (name, path))
+            files[path] = self._hash(path, old_files.get(path))
+        catalog = {item: self.catalog.specs[item] for item in stage.inputs if item in self.catalog.specs}
+        return {'files': files, 'catalog': catalog}
+
+    def is_current(self, name):
+        """ True if the stage's outputs exist and nothing it depends on changed since its last successful run """
+        stage = self.stages[name]
+        new = self.signature(name)  # first, so that a missing input is reported even if the stage never ran
+        if not all(os.path.exists(self.output_path(o)) for o in stage.outputs):
+            return False
+        old = self._read_stamp(name)
+        if old is None:
+            return False
+        same_files = {p: h[2] for p, h in old['files'].items()} == {p: h[2] for p, h in new['files'].items()}
+        if same_files and old['files'] != new['files']:
+            self._write_stamp(name, new, old.get('seconds'))  # only modification times changed: remember the new ones
+        return same_files and old['catalog'] == new['catalog']
+
+    def _write_stamp(self, name, signature, seconds):
+        os.makedirs(self.state_dir, exist_ok=True)
+        with open(self._stamp_path(name), 'w') as f:
+            json.dump(dict(signature, seconds=seconds, finished=time.strftime('%Y-%m-%d %H:%M:%S')), f, indent=1)
+
+    def _run_stage(self, name):
+        """ Run one stage's script in its own python process. Returns (ok, seconds, message). """
+        stage = self.stages[name]
+        signature = self.signature(name)  # taken before running, so changes made while it runs are seen next time
+        os.makedirs(self.state_dir, exist_ok=True)
+        env = dict(os.environ, MPLBACKEND='Agg')  # no plot windows
+        t0 = time.perf_counter()
+        with open(os.path.join(self.state_dir, name + '.log'), 'w') as log:
+            result = subprocess.run([sys.executable, stage.script], cwd=self.folder, env=env,
+                                    stdout=log, stderr=subprocess.STDOUT)
+        seconds = time.perf_counter() - t0
+        if result.returncode != 0:
+            return False, seconds, 'exited with code %d, see %s' % (result.returncode,
+                                                                   os.path.join(STATE_FOLDER, name + '.log'))
+        missing = [o for o in stage.outputs if not os.path.exists(self.output_path(o))]
+        if missing:
+            return False, seconds, 'finished without writing %s' % missing
+        self._write_stamp(name, signature, seconds)
+        return True, seconds, ''
+
+    def run(self, targets=None, jobs=None, force=False, dry_run=False):
+        """
+        Bring the targets (default: every stage) up to date, running up to jobs stages at once
+        (default: number of CPUs). force=True re-runs the targets themselves even if they are up to date.
+        dry_run=True only reports what would run. Returns a dict of stage name -> status:
+        'up to date', 'ran', 'would run', 'failed' or 'skipped' (something it depends on failed).
+        """
+        names = self.needed(targets)
+        forced = set(names if not targets else targets) if force else set()
+        jobs = jobs or os.cpu_count() or 1
+        status = {}
+        checked = {}  # stale() of each stage: its inputs are final once everything it depends on has finished
+
+        def stale(name):
+            if name in checked:
+                return checked[name]
+            if name in forced:
+                checked[name] = True
+                return True
+            try:
+                checked[name] = not self.is_current(name)
+            except FileNotFoundError as e:
+                status[name] = 'failed'
+                print('[failed]     %-28s %s' % (name, e))
+                checked[name] = None
+            return checked[name]
+
+        if dry_run:
+            for name in names:
+                if any(status.get(d) in ('failed', 'skipped') for d in self.deps[name]):
+                    status[name] = 'skipped'
+                elif any(status.get(d) == 'would run' for d in self.deps[name]):
+                    status[name] = 'would run'  # assume the upstream outputs change
+                else:
+                    s = stale(name)
+                    if s is not None:
+                        status[name] = 'would run' if s else 'up to date'
+                if status[name] != 'failed':
+                    print('[%s]%s %s' % (status[name], ' ' * (10 - len(status[name])), name))
+            return status
+
+        t0 = time.perf_counter()
+        running = {}
+        with ThreadPoolExecutor(max_workers=jobs) as pool:  # each thread just waits on its own python process
+            while len(status) < len(names):
+                for name in names:
+                    if name in status or name in running.values():
+                        continue
+                    dep_status = [status.get(d) for d in self.deps[name]]
+                    if any(s in ('failed', 'skipped') for s in dep_status):
+                        status[name] = 'skipped'
+                        print('[skipped]    %-28s something it needs failed' % name)
+                    elif all(s in ('up to date', 'ran') for s in dep_status):
+                        s = stale(name)
+                        if s is None:
+                            continue
+                        if not s:
+                            status[name] = 'up to date'
+                            print('[up to date] %s' % name)
+                        elif len(running) < jobs:
+                            print('[running]    %s' % name)
+                            running[pool.submit(self._run_stage, name)] = name
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    ok, seconds, message = future.result()
+                    status[name] = 'ran' if ok else 'failed'
+                    print('[%s]%s %-28s %7.1f s  %s' % (status[name], ' ' * (10 - len(status[name])), name,
+                                                         seconds, message))
+        print('pipeline finished in %.1f s' % (time.perf_counter() - t0))
+        return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the stages of the radiocarbon intercomparison that are out of date')
+    parser.add_argument('targets', nargs='*', help='stages to bring up to date (default: all)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='stages to run at once (default: number of CPUs)')
+    parser.add_argument('--force', action='store_true', help='re-run the targets even if they are up to date')
+    parser.add_argument('--dry-run', action='store_true', help="only show what would run")
+    parser.add_argument('--list', action='store_true', help='list the stages and what they depend on')
+    args = parser.parse_args(argv)
+
+    pipeline = Pipeline()
+    if args.list:
+        for name in pipeline.order:
+            print('%-28s %-36s after: %s' % (name, pipeline.stages[name].script, ', '.join(pipeline.deps[name]) or '-'))
+        return 0
+    status = pipeline.run(args.targets, jobs=args.jobs, force=args.force, dry_run=args.dry_run)
+    return 1 if any(s in ('failed', 'skipped') for s in status.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Radiocarbon unit conversions and error propagation, for whole arrays at once.
+
+These used to be written out wherever they were needed: fm_to_d14c in X_my_functions.py, the FM back-calculation in
+the harmonization (age_corr = np.exp((1950 - x) / 8267)), and np.sqrt(err**2 + offset_err**2) for every offset in the
+C_*_cleanup.py scripts. They are all here now, written like numpy ufuncs:
+    - arguments broadcast, so one call converts a whole column, a table, or a 2-D Monte Carlo ensemble
+      (iterations x points) against one row of dates
+    - out= (and err_out=) write the result into an existing array instead of making a new one, so a big ensemble can
+      be converted in place: f14c_to_delta14c(ens, dates, out=ens)
+    - where an uncertainty is given, (value, error) is returned; otherwise just the value.
+The formulas do the same operations in the same order as the code they replace, so the numbers are unchanged.
+
+F14C: fraction modern. D14C: 1000 * (F14C - 1), per mil, not corrected for decay.
+Delta14C (the "D14C" columns of our datasets): 1000 * (F14C * exp((1950 - date) / 8267) - 1), per mil, corrected
+    for decay between 1950 and the sample date (date: decimal year, e.g. DEC_DECAY_CORR of the Baring Head record).
+
+Example:
+d14c, d14c_err = f14c_to_delta14c(df['F14C'], df['Decimal_date'], df['F14C_err'])
+d14c_1, d14c_1_err = add_offset(df['D14C'], df['D14C_err'], offset1, error1)
+"""
+
+import numpy as np
+
+MEAN_LIFE = 8267  # years, the mean life of 14C from the Cambridge half-life (5730 / ln 2)
+REFERENCE_YEAR = 1950
+
+
+def _array(x):
+    """ pandas columns as numpy arrays (so nothing is aligned on the index), anything else as it is """
+    return x.to_numpy() if hasattr(x, 'to_numpy') else x
+
+
+def _buf(x):
+    """ x, to be written over by the next step, if it is an array (the result for single numbers is a number) """
+    return x if isinstance(x, np.ndarray) else None
+
+
+def age_correction(date, out=None):
+    """ exp((1950 - date) / 8267): the factor from F14C to the 14C/12C of the sample at its date """
+    out = np.subtract(REFERENCE_YEAR, _array(date), out=out, dtype=np.float64)
+    out = np.divide(out, MEAN_LIFE, out=_buf(out))
+    return np.exp(out, out=_buf(out))
+
+
+def f14c_to_delta14c(f14c, date, f14c_err=None, out=None, err_out=None):
+    """ Delta14C (per mil) of F14C measured on samples from date (decimal years), and its error if f14c_err is given """
+    corr = age_correction(date)
+    out = np.multiply(_array(f14c), corr, out=out, dtype=np.float64)
+    out = np.subtract(out, 1, out=_buf(out))
+    out = np.multiply(out, 1000, out=_buf(out))
+    if f14c_err is None:
+        return out
+    err_out = np.multiply(_array(f14c_err), corr, out=err_out, dtype=np.float64)
+    return out, np.multiply(err_out, 1000, out=_buf(err_out))
+
+
+def delta14c_to_f14c(delta14c, date, delta14c_err=None, out=None, err_out=None):
+    """ F14C of Delta14C (per mil) values of samples from date (decimal years), and its error if delta14c_err is given """
+    corr = age_correction(date)
+    out = np.divide(_array(delta14c), 1000, out=out, dtype=np.float64)
+    out = np.add(out, 1, out=_buf(out))
+    out = np.divide(out, corr, out=_buf(out))
+    if delta14c_err is None:
+        return out
+    err_out = np.divide(_array(delta14c_err), 1000, out=err_out, dtype=np.float64)
+    return out, np.divide(err_out, corr, out=_buf(err_out))
+
+
+def f14c_to_d14c(f14c, f14c_err=None, out=None, err_out=None):
+    """ D14C = 1000 * (F14C - 1) (per mil, no decay correction), and its error if f14c_err is given """
+    out = np.subtract(_array(f14c), 1, out=out, dtype=np.float64)
+    out = np.multiply(out, 1000, out=_buf(out))
+    if f14c_err is None:
+        return out
+    return out, np.multiply(_array(f14c_err), 1000, out=err_out, dtype=np.float64)
+
+
+def d14c_to_f14c(d14c, d14c_err=None, out=None, err_out=None):
+    """ F14C = D14C / 1000 + 1, the inverse of f14c_to_d14c """
+    out = np.divide(_array(d14c), 1000, out=out, dtype=np.float64)
+    out = np.add(out, 1, out=_buf(out))
+    if d14c_err is None:
+        return out
+    return out, np.divide(_array(d14c_err), 1000, out=err_out, dtype=np.float64)
+
+
+def quadrature(a, b, out=None):
+    """ sqrt(a**2 + b**2): the error of a sum or difference of two values with independent errors a and b """
+    out = np.add(np.square(_array(a), dtype=np.float64), np.square(_array(b), dtype=np.float64), out=out)
+    return np.sqrt(out, out=_buf(out))
+
+
+def add_offset(value, value_err, offset, offset_err, out=None, err_out=None):
+    """
+    (value + offset, sqrt(value_err**2 + offset_err**2)): an offset correction and its error.
+    offset and offset_err can be single numbers (a fixed offset) or arrays (e.g. a smoothed offset curve).
+    """
+    out = np.add(_array(value), _array(offset), out=out, dtype=np.float64)
+    return out, quadrature(value_err, offset_err, out=err_out)
@@ -0,0 +1,250 @@
+"""
+A small database of the statistics the intercomparison scripts compute, so runs can be compared without grepping.
+
+A_heidelberg_intercomparison.py used to only print its paired t-tests, and we kept the results by piping them into
+output.txt (25k lines by now) and output_10000*.txt, then searched those to see what changed between runs.
+Now each run is saved as rows in a SQLite file (results.sqlite next to the scripts, or RADIOCARBON_RESULTS_DB):
+    runs          one row per run: script, start/end time, n, cutoff, seed, code version, other parameters (JSON)
+    period_stats  one row per (run, period, fit): t statistic, p-value, degrees of freedom, mean and standard error of
+                  the differences, number of points
+    timings       one row per (run, name): seconds, e.g. the ccgFilter stages summed over the Monte Carlo run
+period_stats is indexed by run and by period, so questions like "how did 1991 - 1994 change between n=1000 and
+n=10000" are a single indexed query. SQLite comes with python, so there is nothing to install.
+
+Recording a run:
+store = ResultsStore()
+with store.run('A_heidelberg_intercomparison.py', n=n, cutoff=cutoff, periods=PERIODS) as run:
+    run.add_ttest('1986 - 1991', 'smooth', stats.ttest_rel(bhd, heid), difference_in_means(bhd, heid), len(bhd))
+    run.add_timing('total', 12.3)
+
+Looking at results, in python or from the command line:
+store.runs()                      python X_results_store.py runs
+store.stats(period='1991 - 1994') python X_results_store.py period "1991 - 1994"
+store.diff_runs(3, 5)             python X_results_store.py diff 3 5
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    script TEXT NOT NULL,
+    started TEXT NOT NULL,
+    finished TEXT,
+    n INTEGER,
+    cutoff REAL,
+    seed INTEGER,
+    code_version TEXT,
+    params TEXT
+);
+CREATE TABLE IF NOT EXISTS period_stats (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    period TEXT NOT NULL,
+    fit TEXT NOT NULL,
+    statistic REAL,
+    pvalue REAL,
+    dof REAL,
+    mean_diff REAL,
+    mean_diff_err REAL,
+    n_points INTEGER,
+    PRIMARY KEY (run_id, period, fit)
+);
+CREATE INDEX IF NOT EXISTS period_stats_by_period ON period_stats (period, fit, run_id);
+CREATE TABLE IF NOT EXISTS timings (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    seconds REAL,
+    calls INTEGER,
+    PRIMARY KEY (run_id, name)
+);
+"""
+
+STAT_COLUMNS = ['statistic', 'pvalue', 'dof', 'mean_diff', 'mean_diff_err', 'n_points']
+
+
+def default_db_path():
+    return os.environ.get('RADIOCARBON_RESULTS_DB', os.path.join(HERE, 'results.sqlite'))
+
+
+def code_version(script=None):
+    """
+    The git commit of the project (with "-dirty" if there are uncommitted changes), or if git isn't available,
+    "sha1:" and the hash of the script.
+    """
+    try:
+        out = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=HERE, capture_output=True, text=True,
+                             timeout=10)
+        if out.returncode == 0 and out.stdout.strip():
+            return out.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        pass
+    if script is not None and os.path.exists(os.path.join(HERE, script)):
+        with open(os.path.join(HERE, script), 'rb') as f:
+            return 'sha1:' + hashlib.sha1(f.read()).hexdigest()
+    return None
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec='seconds')
+
+
+class Run:
+    """ One run being recorded, returned by ResultsStore.run. Rows are committed when the with-block ends. """
+
+    def __init__(self, store, run_id):
+        self.store = store
+        self.run_id = run_id
+
+    def add_stat(self, period, fit, statistic=None, pvalue=None, dof=None, mean_diff=None, mean_diff_err=None,
+                 n_points=None):
+        """ Save the statistics of one period and fit (e.g. 'smooth' or 'trend'); saving it again replaces it """
+        self.store.conn.execute('INSERT OR REPLACE INTO period_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                (self.run_id, period, fit, _float(statistic), _float(pvalue), _float(dof),
+                                 _float(mean_diff), _float(mean_diff_err), n_points))
+
+    def add_ttest(self, period, fit, ttest, d_means=(None, None), n_points=None):
+        """
+        Save a scipy.stats.ttest_rel result, and the (mean, standard error) from difference_in_means.
+        For a paired test the degrees of freedom are n_points - 1 (newer scipy versions also give ttest.df).
+        """
+        dof = getattr(ttest, 'df', None)
+        if dof is None and n_points is not None:
+            dof = n_points - 1
+        self.add_stat(period, fit, ttest.statistic, ttest.pvalue, dof, d_means[0], d_means[1], n_points)
+
+    def add_timing(self, name, seconds, calls=None):
+        self.store.conn.execute('INSERT OR REPLACE INTO timings VALUES (?, ?, ?, ?)',
+                                (self.run_id, name, float(seconds), calls))
+
+    def add_filter_timings(self, collector, prefix='ccgFilter.'):
+        """ Save the stage timings of a X_miller_curve_algorithm.TimingCollector, as 'ccgFilter.<stage>' """
+        for stage, sec in collector.timings.items():
+            self.add_timing(prefix + stage, sec, collector.counts.get(stage))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.store.conn.execute('UPDATE runs SET finished = ? WHERE run_id = ?', (_now(), self.run_id))
+            self.store.conn.commit()
+        else:
+            # nothing from a run that crashed is kept
+            self.store.conn.rollback()
+        return False
+
+
+def _float(x):
+    return None if x is None else float(x)
+
+
+class ResultsStore:
+    """ The results database. path: the SQLite file (default: results.sqlite, or RADIOCARBON_RESULTS_DB) """
+
+    def __init__(self, path=None):
+        self.path = path or default_db_path()
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def run(self, script, n=None, cutoff=None, seed=None, version=None, **params):
+        """
+        Start recording a run; use it as "with store.run(...) as run:". Extra keyword arguments (e.g. periods) are
+        saved as JSON in runs.params. version defaults to code_version(script).
+        """
+        if version is None:
+            version = code_version(script)
+        cur = self.conn.execute(
+            'INSERT INTO runs (script, started, n, cutoff, seed, code_version, params) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (script, _now(), n, _float(cutoff), seed, version, json.dumps(params, default=str)))
+        return Run(self, cur.lastrowid)
+
+    def _query(self, sql, args=()):
+        return pd.read_sql_query(sql, self.conn, params=args)
+
+    def runs(self, script=None):
+        """ The runs, newest last """
+        if script is None:
+            return self._query('SELECT * FROM runs ORDER BY run_id')
+        return self._query('SELECT * FROM runs WHERE script = ? ORDER BY run_id', (script,))
+
+    def stats(self, run_id=None, period=None, fit=None):
+        """ period_stats rows (with n and cutoff of their run), for one run and/or period and/or fit """
+        where, args = [], []
+        for column, value in (('s.run_id', run_id), ('s.period', period), ('s.fit', fit)):
+            if value is not None:
+                where.append(column + ' = ?')
+                args.append(value)
+        sql = ('SELECT s.*, r.n, r.cutoff, r.started FROM period_stats s JOIN runs r ON r.run_id = s.run_id'
+               + (' WHERE ' + ' AND '.join(where) if where else '') + ' ORDER BY s.run_id, s.period, s.fit')
+        return self._query(sql, args)
+
+    def timings(self, run_id):
+        return self._query('SELECT name, seconds, calls FROM timings WHERE run_id = ? ORDER BY name', (run_id,))
+
+    def diff_runs(self, a, b, columns=('statistic', 'pvalue', 'mean_diff', 'mean_diff_err')):
+        """
+        Compare two runs period by period: the columns of each run (suffixed _a and _b) and their change (b - a).
+        Periods only in one of the runs are kept, with NaN for the other.
+        """
+        keep = ['period', 'fit'] + list(columns)
+        left = self.stats(run_id=a)[keep]
+        right = self.stats(run_id=b)[keep]
+        diff = pd.merge(left, right, on=['period', 'fit'], how='outer', suffixes=('_a', '_b'))
+        for c in columns:
+            diff[c + '_change'] = diff[c + '_b'] - diff[c + '_a']
+        return diff.sort_values(['fit', 'period']).reset_index(drop=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Look at the saved statistics of the intercomparison runs')
+    parser.add_argument('--db', default=None, help='results database (default: %s)' % default_db_path())
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('runs', help='list the runs')
+    show = sub.add_parser('show', help='statistics and timings of one run')
+    show.add_argument('run_id', type=int)
+    period = sub.add_parser('period', help='one period over all runs')
+    period.add_argument('period')
+    period.add_argument('--fit', default=None)
+    diff = sub.add_parser('diff', help='compare two runs')
+    diff.add_argument('a', type=int)
+    diff.add_argument('b', type=int)
+    args = parser.parse_args(argv)
+
+    with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.max_rows', None), \
+            ResultsStore(args.db) as store:
+        if args.command == 'runs':
+            print(store.runs().to_string(index=False))
+        elif args.command == 'show':
+            print(store.stats(run_id=args.run_id).to_string(index=False))
+            print()
+            print(store.timings(args.run_id).to_string(index=False))
+        elif args.command == 'period':
+            print(store.stats(period=args.period, fit=args.fit).to_string(index=False))
+        else:
+            print(store.diff_runs(args.a, args.b).to_string(index=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+The offset between two smoothed records over every time window at once, from cumulative sums.
+
+A_heidelberg_intercomparison.py compares Baring Head and Cape Grim over five periods picked by hand (1986 - 1991,
+1991 - 1994, 2006 - 2016, 2006 - 2009, 2012 - 2016), each with its own Monte Carlo smoothing and paired t-test.
+Here both records are smoothed once, on one common grid, and the statistics of the difference d = y1 - y2 are worked
+out for every window length and every start on the grid. With cumulative sums of d, d**2 and the Monte Carlo
+variances, the sum over any window is one subtraction, so the whole (window x time) surface costs about as much as a
+single pass over the records, and any period the data allow can be looked at without running anything again.
+
+For each window (all points of the grid from its start to start + length) there is:
+    mean      the mean difference (as difference_in_means)
+    stderr    standard deviation of the differences / sqrt(points) (as difference_in_means)
+    mc_err    the error of the mean from the Monte Carlo stdevs of both records, sqrt(sum(err1**2 + err2**2)) / points
+              (assumes independent points, which neighbouring points of a smooth curve are not, so it's a lower bound)
+    t, p      the paired t-test of the two records over the window (the same as scipy.stats.ttest_rel), two-sided
+    points    how many grid points are in the window
+A window with a NaN in it (e.g. a gap taken out of one record, or beyond the end of a smoothed curve) gets NaN.
+
+Example:
+grid = np.linspace(1987, 2016, 349)
+surface = rolling_offsets(grid, bhd_mean, bhd_stdev, cgo_mean, cgo_stdev, windows=np.arange(2, 11))  # 2 - 10 years
+surface.period(1991, 1994)       # the statistics of one period
+surface.frame()                  # everything, one row per (window, start)
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def _cumsum(y):
+    """ cumulative sum with a 0 in front, so that the sum of y[i:j] is c[j] - c[i] """
+    c = np.zeros(len(y) + 1)
+    np.cumsum(y, out=c[1:])
+    return c
+
+
+class RollingOffsets:
+    """
+    The statistics of every window: 2-D arrays (one row per window length, one column per start point of the grid),
+    mean, stderr, mc_err, t, p and points. windows: the window lengths in years, x: the grid.
+    starts / ends / centres: the dates each window covers (NaN where the window runs past the end of the grid).
+    """
+
+    def __init__(self, x, windows, sizes, stats):
+        self.x = x
+        self.windows = windows
+        self.sizes = sizes
+        for name, value in stats.items():
+            setattr(self, name, value)
+        end = np.arange(len(x))[None, :] + sizes[:, None] - 1
+        fits = end < len(x)
+        self.starts = np.where(fits, x[None, :], np.nan)
+        self.ends = np.where(fits, x[np.minimum(end, len(x) - 1)], np.nan)
+        self.centres = (self.starts + self.ends) / 2
+
+    def frame(self, dropna=True):
+        """ Long table of the surface: one row per (window, start) with its dates and statistics """
+        shape = self.mean.shape
+        df = pd.DataFrame({'window': np.repeat(self.windows, shape[1]), 'start': self.starts.ravel(),
+                           'end': self.ends.ravel(), 'centre': self.centres.ravel(), 'points': self.points.ravel(),
+                           'mean': self.mean.ravel(), 'stderr': self.stderr.ravel(), 'mc_err': self.mc_err.ravel(),
+                           't': self.t.ravel(), 'p': self.p.ravel()})
+        return df.dropna(subset=['mean']).reset_index(drop=True) if dropna else df
+
+    def period(self, start, end):
+        """ The statistics of the window closest to start - end (same length, nearest start): a Series """
+        row = int(np.argmin(np.abs(self.windows - (end - start))))
+        col = int(np.argmin(np.abs(self.x - start)))
+        return pd.Series({'window': self.windows[row], 'start': self.starts[row, col], 'end': self.ends[row, col],
+                          'points': self.points[row, col], 'mean': self.mean[row, col],
+                          'stderr': self.stderr[row, col], 'mc_err': self.mc_err[row, col], 't': self.t[row, col],
+                          'p': self.p[row, col]})
+
+
+def rolling_offsets(x, y1, y1_err, y2, y2_err, windows, min_points=3):
+    """
+    Statistics of y1 - y2 over every window (length in years from windows) and start on the grid x, which must be
+    evenly spaced and increasing. y1_err, y2_err: the Monte Carlo stdevs of each record at x. Windows with fewer than
+    min_points grid points are left out. Returns a RollingOffsets.
+    """
+    from scipy import stats
+
+    x = np.asarray(x, dtype=np.float64)
+    step = np.diff(x)
+    if len(x) < 2 or np.any(step <= 0) or not np.allclose(step, step[0]):
+        raise ValueError('x has to be an evenly spaced, increasing grid')
+    step = step[0]
+    windows = np.asarray(windows, dtype=np.float64)
+    sizes = np.floor(windows / step + 1e-9).astype(np.int64) + 1  # grid points from start to start + window
+    keep = (sizes >= min_points) & (sizes <= len(x))
+    windows, sizes = windows[keep], sizes[keep]
+
+    d = np.asarray(y1, dtype=np.float64) - np.asarray(y2, dtype=np.float64)
+    var = np.square(np.asarray(y1_err, dtype=np.float64)) + np.square(np.asarray(y2_err, dtype=np.float64))
+    bad = np.isnan(d) | np.isnan(var)
+    centred = np.where(bad, 0, d - np.nanmean(d))  # centring first keeps sum(d**2) - n * mean**2 accurate
+    c_bad, c_d, c_d2, c_var = (_cumsum(bad.astype(np.float64)), _cumsum(centred), _cumsum(np.square(centred)),
+                               _cumsum(np.where(bad, 0, var)))
+
+    start = np.arange(len(x))[None, :]
+    end = start + sizes[:, None]
+    fits = end <= len(x)
+    end = np.minimum(end, len(x))
+    m = sizes[:, None].astype(np.float64)
+    complete = fits & (c_bad[end] - c_bad[start] == 0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        centred_mean = (c_d[end] - c_d[start]) / m
+        ss = np.maximum(c_d2[end] - c_d2[start] - m * np.square(centred_mean), 0)  # sum of squared deviations
+        mean = centred_mean + np.nanmean(d)
+        stderr = np.sqrt(ss / m) / np.sqrt(m)
+        t = mean / (np.sqrt(ss / (m - 1)) / np.sqrt(m))
+        p = 2 * stats.t.sf(np.abs(t), m - 1)
+        mc_err = np.sqrt(c_var[end] - c_var[start]) / m
+    nan = ~complete
+    out = {'mean': mean, 'stderr': stderr, 'mc_err': mc_err, 't': t, 'p': p}
+    for value in out.values():
+        value[nan] = np.nan
+    out['points'] = np.where(complete, m, np.nan)
+    return RollingOffsets(x, windows, sizes, out)
@@ -0,0 +1,95 @@
+"""
+Seasons of decimal-date records: which month and day of the year each point is in, which season it belongs to, and
+seasonal means, for whole columns at once.
+
+The growing season in the Southern Hemisphere (November to February, as in Rachel's thesis) crosses the year-line, so
+"yearly" averages of it can't just group on the calendar year. Here every point gets a season year: with a season
+starting in November, November and December 1990 and January and February 1991 all belong to season 1991 (the year
+the season ends in, label='end'; the SOAR tree rings are dated 1 January, e.g. 1991.00274, which is in that season),
+or to season 1990 with label='start'.
+
+date_parts(x): year, month, day of the year (1 - 366) and fraction of the year of decimal dates x
+season_year(x, start_month=11): the season each date belongs to
+in_season(x, months=SH_GROWING_SEASON): which dates are in the given months
+seasonal_stats(df, ['D14C_offsetcorrected', 'F14C']): mean, standard deviation and count of the growing-season data
+    of each season year, in one groupby, ready to compare with the tree ring of that year
+
+Example:
+summer = seasonal_stats(harmonized, ['D14C_offsetcorrected', 'F14C'])
+summer.loc[1991, 'D14C_offsetcorrected_mean']
+"""
+
+import numpy as np
+import pandas as pd
+from X_dates import calendar_date
+
+SH_GROWING_SEASON = (11, 12, 1, 2)  # months of the Southern Hemisphere growing season, in order
+
+
+def date_parts(decimal_dates):
+    """
+    DataFrame with the year, month, day_of_year (1 = 1 January) and fraction (of the year) of decimal dates.
+    year, month and day_of_year are nullable integers (Int64): missing (NaN) dates give <NA>, and fraction NaN.
+    """
+    x = np.atleast_1d(np.asarray(decimal_dates, dtype=np.float64))
+    dates = calendar_date(x)
+    missing = np.isnat(dates)  # NaT would turn into nonsense numbers (year -9223372036854773838) below
+    years = dates.astype('datetime64[Y]')
+
+    def masked(values):
+        return pd.arrays.IntegerArray(np.where(missing, 0, values).astype(np.int64), missing.copy())
+
+    return pd.DataFrame({'year': masked(years.astype(np.int64) + 1970),
+                         'month': masked(dates.astype('datetime64[M]').astype(np.int64) % 12 + 1),
+                         'day_of_year': masked((dates.astype('datetime64[D]') - years).astype(np.int64) + 1),
+                         'fraction': x - np.floor(x)})
+
+
+def season_year(decimal_dates, start_month=SH_GROWING_SEASON[0], label='end'):
+    """
+    The season year of each decimal date, for seasons starting on the first of start_month.
+    label='end': a season is named after the year it ends in (Nov 1990 - Oct 1991 is 1991), 'start': the year it
+    starts in (1990). With start_month=1 both are the calendar year.
+    Returns a nullable integer (Int64) array, <NA> for missing dates.
+    """
+    if label not in ('end', 'start'):
+        raise ValueError("label must be 'end' or 'start', not %r" % (label,))
+    parts = date_parts(decimal_dates)
+    if start_month == 1:
+        return parts['year'].array
+    if label == 'end':
+        return (parts['year'] + (parts['month'] >= start_month).astype('Int64')).array
+    return (parts['year'] - (parts['month'] < start_month).astype('Int64')).array
+
+
+def in_season(decimal_dates, months=SH_GROWING_SEASON):
+    """ Boolean array: which decimal dates fall in the given calendar months (False for missing dates) """
+    return date_parts(decimal_dates)['month'].isin(months).to_numpy(dtype=bool)
+
+
+def seasonal_stats(df, value_columns, date_column='Decimal_date', months=SH_GROWING_SEASON, start_month=None,
+                   label='end'):
+    """
+    Mean, standard deviation and number of points of value_columns for each season year, using only the rows of df
+    whose date is in months. The seasons start in the first of months unless start_month is given.
+    Returns a DataFrame indexed by season_year with columns <column>_mean, <column>_std, <column>_count for each
+    value column, and first_date / last_date (the decimal dates of the first and last point used).
+    Rows without a date are left out.
+    """
+    if isinstance(value_columns, str):
+        value_columns = [value_columns]
+    if start_month is None:
+        start_month = months[0]
+    x = df[date_column].to_numpy(dtype=np.float64)
+    keep = in_season(x, months)  # False for missing dates, so they are never grouped as a season
+    data = df.loc[keep, value_columns].copy()
+    data['first_date'] = x[keep]
+    data['last_date'] = x[keep]
+    seasons = pd.Series(season_year(x[keep], start_month, label), index=data.index, name='season_year')
+
+    agg = {c: ['mean', 'std', 'count'] for c in value_columns}
+    agg['first_date'] = ['min']
+    agg['last_date'] = ['max']
+    stats = data.groupby(seasons).agg(agg)
+    stats.columns = ['%s_%s' % (c, s) if c not in ('first_date', 'last_date') else c for c, s in stats.columns]
+    return stats
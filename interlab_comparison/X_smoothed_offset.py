@@ -0,0 +1,154 @@
+"""
+The smoothed Heidelberg - RRL offset curve, computed once on a dense grid and saved, then read off at any dates.
+
+C_CapeGrim_cleanup.py, C_Maquarie_cleanup.py, C_NeumayerCleanup.py and A_heidelberg_intercomparison.py each ran
+monte_carlo_randomization_trend (n CCGCRV fits) on the 12 offset points, only to evaluate it at their own dates.
+The curve doesn't depend on those dates, so now the Monte Carlo is run once on a uniform grid covering the offset
+points (1/48 year apart by default), the mean and standard deviation at each grid point are saved, and every script
+reads its dates off the saved curve by linear interpolation:
+    offset_summary = smoothed_offset(offset_points()).summary(heidelberg['Decimal_date'])
+summary() returns the same "Means" / "stdevs" DataFrame as monte_carlo_randomization_trend(...)[2].
+
+Interpolation check: the Monte Carlo is evaluated at every grid point, and the curve interpolated from every other
+point (twice the step) is compared with the points in between. The largest difference, for the mean and for the
+standard deviation, has to be below tolerance (0.005 per mil by default, more than 10 times smaller than the smallest
+nonzero offset error), or building the curve fails; the saved curve, at the full resolution, is closer still.
+
+The curve is saved (Parquet, with a .json of how it was made) in the ".smoothed_offsets" folder next to the scripts,
+or in RADIOCARBON_CACHE_DIR if that is set, under a name made from the offset points, cutoff, n, step, RADIOCARBON_SEED
+and the code that computes it (X_miller_curve_algorithm.py and X_my_functions.py), so a change to any of them makes a
+new curve instead of reusing one made the old way. Scripts that use the same offset points (Cape Grim and the intercomparison, with offset_points()) share one curve; MCQ and Neumayer
+stretch the first and last point to their own records (CCGCRV gives NaN outside the points), so each has its own.
+Deleting the folder, or refresh=True, makes the curves again. Like CCGCRV, dates outside the offset points give NaN.
+"""
+
+import datetime
+import functools
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from X_dataset_cache import file_hash
+from X_heidelberg_offsets import cutoff as CUTOFF, n as N
+from X_outputs import load_output, save_output
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FOLDER = '.smoothed_offsets'
+GRID_STEP = 1 / 48  # years
+TOLERANCE = 0.005  # per mil
+CODE = ['X_miller_curve_algorithm.py', 'X_my_functions.py']  # the Monte Carlo smoothing
+
+
+def _folder():
+    return os.environ.get('RADIOCARBON_CACHE_DIR', os.path.join(HERE, FOLDER))
+
+
+@functools.lru_cache(maxsize=None)
+def _code_hash():
+    """ sha1 of the CODE files, read once per process """
+    return {name: file_hash(os.path.join(HERE, name)) for name in CODE}
+
+
+def _seed():
+    return os.environ.get('RADIOCARBON_SEED')
+
+
+def _key(points, cutoff, n, step):
+    """ Name of the saved curve: it changes whenever anything the curve is made from changes """
+    data = [points[c].astype(np.float64).tolist() for c in ('offset_xs', 'offset_ys', 'offset_errs')]
+    code = sorted(_code_hash().items())
+    return hashlib.sha1(repr((data, float(cutoff), int(n), float(step), _seed(), code)).encode()).hexdigest()[:12]
+
+
+def _grid(points, step):
+    """ Uniform grid from the first to the last offset point (both included), step years apart or a bit less """
+    start, end = float(np.min(points['offset_xs'])), float(np.max(points['offset_xs']))
+    size = int(np.ceil((end - start) / step)) + 1
+    size += 1 - size % 2  # odd, so that every other point still starts and ends on the first and last offset point
+    return np.linspace(start, end, size)
+
+
+class SmoothedOffset:
+    """ A saved smoothed offset curve: grid (DataFrame with x, Means, stdevs) and meta (how it was made) """
+
+    def __init__(self, grid, meta):
+        self.grid = grid
+        self.meta = meta
+
+    @property
+    def max_interp_error(self):
+        return self.meta['max_interp_error']
+
+    def at(self, dates):
+        """ (mean, stdev) of the smoothed offset at dates, as arrays; NaN outside the grid """
+        x = np.asarray(dates, dtype=np.float64)
+        gx = self.grid['x'].to_numpy()
+        mean = np.interp(x, gx, self.grid['Means'].to_numpy(), left=np.nan, right=np.nan)
+        stdev = np.interp(x, gx, self.grid['stdevs'].to_numpy(), left=np.nan, right=np.nan)
+        return mean, stdev
+
+    def summary(self, dates):
+        """ DataFrame of "Means" and "stdevs" at dates, like monte_carlo_randomization_trend(...)[2] """
+        mean, stdev = self.at(dates)
+        return pd.DataFrame({"Means": mean, "stdevs": stdev})
+
+
+def build_smoothed_offset(points, cutoff=CUTOFF, n=N, step=GRID_STEP, tolerance=TOLERANCE):
+    """
+    Run the Monte Carlo smoothing of the offset points (DataFrame with offset_xs, offset_ys, offset_errs) on the grid,
+    check the interpolation error, save the curve and return it as a SmoothedOffset.
+    """
+    from X_my_functions import monte_carlo_randomization_trend
+
+    x = _grid(points, step)
+    summary = monte_carlo_randomization_trend(points['offset_xs'], x, points['offset_ys'], points['offset_errs'],
+                                              cutoff, n)[2]
+    mean, stdev = summary['Means'].to_numpy(), summary['stdevs'].to_numpy()
+
+    errors = []
+    for y in (mean, stdev):
+        between = np.interp(x[1::2], x[::2], y[::2])
+        errors.append(float(np.nanmax(np.abs(between - y[1::2]))))
+    if max(errors) > tolerance:
+        raise ValueError('the smoothed offset changes too fast for a grid step of %g years: interpolation error '
+                         '%.3g (mean) / %.3g (stdev) per mil, tolerance %g; use a smaller step'
+                         % (step, errors[0], errors[1], tolerance))
+
+    grid = pd.DataFrame({'x': x, 'Means': mean, 'stdevs': stdev})
+    meta = {'offset_xs': points['offset_xs'].tolist(), 'offset_ys': points['offset_ys'].tolist(),
+            'offset_errs': points['offset_errs'].tolist(), 'cutoff': cutoff, 'n': n, 'step': step,
+            'grid_points': len(x), 'max_interp_error': max(errors), 'tolerance': tolerance,
+            'seed': _seed(), 'code': _code_hash(),
+            'made': datetime.datetime.now().isoformat(timespec='seconds')}
+    folder = _folder()
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, 'smoothed_offset.%s' % _key(points, cutoff, n, step))
+    # scripts running at the same time (e.g. from X_pipeline.py) can make the same curve: each writes its own files
+    # and moves them into place, so nobody reads a half-written one
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    save_output(grid, tmp + '.parquet', excel=False)
+    with open(tmp + '.json', 'w') as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp + '.parquet', path + '.parquet')
+    os.replace(tmp + '.json', path + '.json')
+    return SmoothedOffset(grid, meta)
+
+
+def smoothed_offset(points=None, cutoff=CUTOFF, n=N, step=GRID_STEP, tolerance=TOLERANCE, refresh=False):
+    """
+    The smoothed offset curve of points (default: offset_points()), read from its saved file, or made (and saved)
+    first if there isn't one, or refresh=True.
+    """
+    if points is None:
+        from X_heidelberg_offsets import offset_points
+        points = offset_points()
+    points = pd.DataFrame({c: np.asarray(points[c], dtype=np.float64)
+                           for c in ('offset_xs', 'offset_ys', 'offset_errs')})
+    path = os.path.join(_folder(), 'smoothed_offset.%s' % _key(points, cutoff, n, step))
+    if not refresh and os.path.exists(path + '.parquet') and os.path.exists(path + '.json'):
+        with open(path + '.json') as f:
+            meta = json.load(f)
+        if meta['max_interp_error'] <= tolerance:
+            return SmoothedOffset(load_output(path + '.parquet'), meta)
+    return build_smoothed_offset(points, cutoff, n, step, tolerance)
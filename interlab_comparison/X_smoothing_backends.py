@@ -0,0 +1,177 @@
+"""
+Common interface for the curve smoothers in this project, so they can be swapped and compared.
+
+There are two smoothers:
+    "ccgcrv": John Miller's port of the NOAA CCGCRV filter, X_miller_curve_algorithm.ccgFilter (the one we use)
+    "cbl": my own polynomial + FFT low-pass curve fit, X_cbl_curve_fitting_algorithm.cbl_curve_fit
+
+Each is wrapped as a backend class with the same methods:
+    fit(x, y) -> a fitted curve with smooth(x), trend(x) and growth_rate(x)
+    fit_many(x, Y) -> one fitted curve per row of Y (all rows share the same x), e.g. Monte Carlo members
+
+Backends are registered by name with @register_backend, so new engines only need a class here.
+compare_backends runs every backend on the same datasets and reports the error against a reference curve
+(for example NOAA's own ccgcrv output) along with how many fits per second each backend manages.
+This replaces comparing the smoothers by hand in X_BaringHeadData.py and X_BarrowCO2Data.py.
+
+Example:
+datasets = {'barrow': (date, co2)}
+reference = {'barrow': (noaa_x, noaa_smooth)}
+print(compare_backends(datasets, reference, curve='smooth'))
+"""
+
+import time
+import numpy as np
+import pandas as pd
+from X_miller_curve_algorithm import ccgFilter
+from X_cbl_curve_fitting_algorithm import cbl_curve_fit
+
+BACKENDS = {}
+
+
+def register_backend(name):
+    """ Class decorator that registers a smoothing backend under name """
+    def decorator(cls):
+        cls.name = name
+        BACKENDS[name] = cls
+        return cls
+    return decorator
+
+
+def get_backend(name, **settings):
+    """ Create the backend registered under name, with its settings (e.g. shortterm=80, longterm=667) """
+    if name not in BACKENDS:
+        raise KeyError("Unknown smoothing backend '%s', choose from %s" % (name, sorted(BACKENDS)))
+    return BACKENDS[name](**settings)
+
+
+class SmoothingBackend:
+    """
+    Base class of the backends. Subclasses implement fit(x, y), returning an object with
+    smooth(x), trend(x) and growth_rate(x). fit_many loops over the rows of Y unless a backend can do better.
+    """
+    name = None
+
+    def __init__(self, shortterm=80, longterm=667):
+        self.shortterm = shortterm
+        self.longterm = longterm
+
+    def fit(self, x, y):
+        raise NotImplementedError
+
+    def fit_many(self, x, Y):
+        return [self.fit(x, row) for row in np.atleast_2d(Y)]
+
+
+class CcgcrvCurve:
+    """ Fitted ccgFilter seen through the backend interface """
+    def __init__(self, filt):
+        self.filt = filt
+
+    def smooth(self, x):
+        return self.filt.getSmoothValue(x)
+
+    def trend(self, x):
+        return self.filt.getTrendValue(x)
+
+    def growth_rate(self, x):
+        return self.filt.getGrowthRateValue(x)
+
+
+@register_backend("ccgcrv")
+class CcgcrvBackend(SmoothingBackend):
+    """ NOAA CCGCRV (Thoning et al., 1989) via ccgFilter """
+    def fit(self, x, y):
+        filt = ccgFilter(np.asarray(x, dtype=float), np.asarray(y, dtype=float),
+                         shortterm=self.shortterm, longterm=self.longterm)
+        return CcgcrvCurve(filt)
+
+
+class CblCurve:
+    """ cbl_curve_fit output, which only exists at the data x values; other times are linearly interpolated """
+    def __init__(self, x, smooth, trend):
+        order = np.argsort(x)
+        self.x = x[order]
+        self._smooth = smooth[order]
+        self._trend = trend[order]
+
+    def _interp(self, x, y):
+        return np.interp(x, self.x, y, left=np.nan, right=np.nan)
+
+    def smooth(self, x):
+        return self._interp(x, self._smooth)
+
+    def trend(self, x):
+        return self._interp(x, self._trend)
+
+    def growth_rate(self, x):
+        # repeated dates would make np.gradient divide by a zero step; average the trend at each date first
+        ux, which = np.unique(self.x, return_inverse=True)
+        if len(ux) < 2:
+            return np.full(np.shape(x), np.nan)
+        trend = np.bincount(which, weights=self._trend) / np.bincount(which)
+        return np.interp(x, ux, np.gradient(trend, ux), left=np.nan, right=np.nan)
+
+
+@register_backend("cbl")
+class CblBackend(SmoothingBackend):
+    """ cbl_curve_fit: cubic polynomial + low-pass FFT filter, run at the short and long term cutoffs """
+    def fit(self, x, y):
+        return self.fit_many(x, np.asarray(y, dtype=float)[None, :])[0]
+
+    def fit_many(self, x, Y):
+        # every row is fit in the same Vandermonde solve and FFT
+        x = np.asarray(x, dtype=float)
+        Y = np.atleast_2d(np.asarray(Y, dtype=float))
+        smooth = cbl_curve_fit(x, Y, self.shortterm)
+        trend = cbl_curve_fit(x, Y, self.longterm)
+        return [CblCurve(x, s, t) for s, t in zip(smooth, trend)]
+
+
+def compare_backends(datasets, reference=None, backends=None, curve='smooth', repeat=3, **settings):
+    """
+    Run each backend on each dataset and compare to a reference curve.
+
+    datasets: dict of name -> (x, y)
+    reference: dict of name -> (x_ref, y_ref), e.g. NOAA ccgcrv output for that dataset. If a dataset has no
+        reference, the "ccgcrv" backend is used as the reference for it.
+    backends: list of backend names, default is every registered backend
+    curve: 'smooth', 'trend' or 'growth_rate'
+    repeat: number of times each fit is timed (the fastest is kept)
+    settings: passed to every backend, e.g. shortterm=80, longterm=667
+
+    Returns a DataFrame with one row per backend and dataset: rmse and max_abs_err against the reference (NaN if no
+    point could be compared), the number of reference points compared, seconds per fit and fits per second.
+    """
+    if reference is None:
+        reference = {}
+    if backends is None:
+        backends = sorted(BACKENDS)
+
+    rows = []
+    for dname, (x, y) in datasets.items():
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if dname in reference:
+            x_ref, y_ref = (np.asarray(a, dtype=float) for a in reference[dname])
+        else:
+            x_ref = np.unique(x)
+            y_ref = getattr(get_backend("ccgcrv", **settings).fit(x, y), curve)(x_ref)
+
+        for bname in backends:
+            backend = get_backend(bname, **settings)
+            best = np.inf
+            for i in range(repeat):
+                t0 = time.perf_counter()
+                fitted = backend.fit(x, y)
+                best = min(best, time.perf_counter() - t0)
+            err = getattr(fitted, curve)(x_ref) - y_ref
+            ok = ~np.isnan(err)
+            if ok.any():
+                rmse, max_abs_err = np.sqrt(np.mean(err[ok] ** 2)), np.max(np.abs(err[ok]))
+            else:  # nothing to compare (e.g. the reference is outside the fitted range)
+                rmse = max_abs_err = np.nan
+            rows.append((bname, dname, rmse, max_abs_err, int(ok.sum()), best, 1 / best))
+
+    return pd.DataFrame(rows, columns=['backend', 'dataset', 'rmse', 'max_abs_err', 'n_compared',
+                                       'seconds_per_fit', 'fits_per_second'])
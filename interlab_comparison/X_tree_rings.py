@@ -0,0 +1,78 @@
+"""
+Helper functions for checking the SOAR tree-ring data, used by C_SOAR_TreeRingCleanup.py.
+
+They were defined inside that script, so any other script wanting them had to import (and so run) the whole cleanup.
+
+tree_ring_count_verification(data, element): the rows of data whose 'Ring code' contains element, e.g. 'T1' for
+    tree 1 or 'C3' for core 3. The Ring Codes look like 'T1-C3-XXYY', which are hard to index otherwise.
+postbomb_offset_validation(df1, df2, name): compares two cores from the same site (merged on DecimalDate) for
+    offsets that can't be validated with the bomb peak. Saves a plot of the residuals from the mean of the two cores
+    in plot_dir, named name.png, and returns the residuals and means.
+
+matplotlib and seaborn are only imported when a plot is made, so importing this module stays cheap.
+"""
+
+import numpy as np
+import pandas as pd
+
+PLOT_DIR = 'C:/Users/clewis/IdeaProjects/GNS/radiocarbon_intercomparison/interlab_comparison/plots/SOAR_tree_rings'
+
+
+def tree_ring_count_verification(data, element):
+    data = data.reset_index(drop=True)  # reset the index or you get type-setting errors
+    empty_array = []  # create an empty array. We will dump our sorted data in here
+    for i in range(0, len(data)):  # initialize a for-loop the length of the site's dataset
+        row = data.iloc[i]  # grab the i'th row
+        cell = row['Ring code']  # grab the column of data from that row
+        if element in cell:  # if what we're looking for is in there, append it to the array
+            empty_array.append(row)
+    data_new = pd.DataFrame(empty_array)  # take the array and put into a Pandas Dataframe.
+    return data_new
+
+
+# this function formats the datasets and produces a plot to check offsets that can't be validated with the bomb peak
+def postbomb_offset_validation(df1, df2, name, plot_dir=PLOT_DIR):
+    merged = pd.merge(df1, df2, on='DecimalDate')
+    # initialize some empty arrays for later:
+    means = []
+    means_err = []
+    stdev = []
+    residual1 = []
+    residual2 = []
+
+    for i in range(0, len(merged)):
+        row = merged.iloc[i]  # grab the i'th row
+        averages = (row['F14C_x'] + row['F14C_y']) / 2  # find the average of the two ring cores
+        averages_err = np.sqrt((row['F14Cerr_x']) ** 2 + (row['F14Cerr_y']) ** 2) / 2  # find the error of the average
+        means.append(averages)  # append the average to its array
+        means_err.append(averages_err)  # append the propogated averages errors to their array
+
+        res1 = row['F14C_x'] - averages
+        residual1.append(res1)
+        res1_error = np.sqrt(row['F14Cerr_x'] ** 2 + averages_err ** 2)
+
+        res2 = row['F14C_y'] - averages
+        residual2.append(res2)
+        res2_error = np.sqrt(row['F14Cerr_y'] ** 2 + averages_err ** 2)
+
+    newdf = pd.DataFrame({"residual1": residual1, "res1_err": res1_error,
+                          "residual2": residual2, "res2_err": res2_error,
+                          "means": means, "means_err": means_err})
+
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+    colors2 = sns.color_palette("mako", 6)
+    plt.errorbar(merged['DecimalDate'], newdf['residual1'], label='residual 1', yerr=newdf['res1_err'], fmt='o',
+                 color=colors2[1], ecolor=colors2[1], elinewidth=1, capsize=2)
+    plt.errorbar(merged['DecimalDate'], newdf['residual2'], label='residual 2', yerr=newdf['res2_err'], fmt='D',
+                 color=colors2[3], ecolor=colors2[3], elinewidth=1, capsize=2)
+    # plt.errorbar(merged['DecimalDate'], newdf['means'], label='mean', yerr=newdf['means_err'], fmt='o',
+    #              color=colors[3], ecolor=colors[3], elinewidth=1, capsize=2)
+    plt.legend(fontsize=7.5)
+    plt.title('')
+    plt.xlabel('Date', fontsize=14)
+    plt.ylabel('Residual', fontsize=14)  # label the y axis
+    plt.savefig('{0}/{1}.png'.format(plot_dir, name), dpi=300, bbox_inches="tight")
+    plt.close()
+
+    return newdf
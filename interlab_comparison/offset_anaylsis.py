@@ -1,11 +1,13 @@
 import matplotlib as mpl
 import numpy as np
 import pandas as pd
+from X_dataset_catalog import load_dataset
 import seaborn as sns
 from X_my_functions import long_date_to_decimal_date
 from scipy import stats
 
-df = pd.read_excel(r'C:\Users\clewis\IdeaProjects\GNS\radiocarbon_intercomparison\Interlab_comparison\Heidelberg_OffsetCorrections.xlsx')
+df = load_dataset('heidelberg_offset_corrections', columns=['#location', 'D14C_1', 'D14C_2', 'D14C_2_err', 'D14C_2_err_test'],
+                  canonical=False)
 cgo = df.loc[(df['#location']) == 'CGO']
 neu = df.loc[(df['#location']) == 'Macquarie_Isl.']
 mcq = df.loc[(df['#location']) == 'NMY']